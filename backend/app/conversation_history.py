@@ -0,0 +1,59 @@
+from collections import deque
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+from app.position_digest import TokenCounter
+
+ROLES = ("user", "assistant", "system")
+
+class ConversationHistory:
+    """
+    The most recent messages of a discussion, bounded by turns and tokens.
+
+    Messages are kept as (role index, content, token count) tuples rather
+    than dicts. Once there are more than `max_turns` user messages, or the
+    messages add up to more than `max_tokens`, the oldest are dropped and
+    counted in `dropped`. The latest message is always kept.
+    """
+    def __init__(self, max_turns: Optional[int] = 50, max_tokens: Optional[int] = 8000, counter: Optional[TokenCounter] = None):
+        self.max_turns = max_turns
+        self.max_tokens = max_tokens
+        self.counter = counter or TokenCounter()
+        self.messages: Deque[Tuple[int, str, int]] = deque()
+        self.user_messages = 0
+        self.tokens = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def __iter__(self) -> Iterator[Dict[str, str]]:
+        for role, content, _ in self.messages:
+            yield {"role": ROLES[role], "content": content}
+
+    def __getitem__(self, index: int) -> Dict[str, str]:
+        role, content, _ = self.messages[index]
+        return {"role": ROLES[role], "content": content}
+
+    def _over_budget(self) -> bool:
+        if self.max_turns is not None and self.user_messages > self.max_turns:
+            return True
+        return self.max_tokens is not None and self.tokens > self.max_tokens
+
+    def append(self, message: Dict[str, str]) -> None:
+        role = ROLES.index(message["role"])
+        content = message["content"]
+        tokens = self.counter.count(content)
+        self.messages.append((role, content, tokens))
+        self.tokens += tokens
+        self.user_messages += role == 0
+        while len(self.messages) > 1 and self._over_budget():
+            role, _, tokens = self.messages.popleft()
+            self.tokens -= tokens
+            self.user_messages -= role == 0
+            self.dropped += 1
+
+    def extend(self, messages: Iterable[Dict[str, str]]) -> None:
+        for message in messages:
+            self.append(message)
+
+    def to_list(self) -> List[Dict[str, str]]:
+        return list(self)
@@ -1,18 +1,44 @@
-import random
-from openai import OpenAI
-from typing import Dict, List, Tuple, Optional
-import os
+import asyncio
+import json
+from openai import AsyncOpenAI, OpenAI
+from typing import Any, Awaitable, Dict, List, Tuple, Optional
+from app.prompt_registry import PROMPT_DIR, PromptRegistry, prompts as shared_prompts
+from app.llm_gateway import get_gateway
+from app.llm_scheduler import llm_work
+from app.metrics import timed
+from app.response_cache import ResponseCache, async_cached_completion, cached_completion
+
+# Prompt directory -> its registry, shared by every graph using that directory
+_registries: Dict[str, PromptRegistry] = {}
 
 class DialecticalGraph:
     PROMPT_FILES = {
-        "thesis": "thesis_prompt.txt",
-        "antithesis": "antithesis_prompt.txt",
-        "synthesis": "synthesis_prompt.txt",
-        "view_identity": "view_identity_prompt.txt",
-        "nonsense": "nonsense_prompt.txt"
+        "thesis": ("thesis_prompt.txt", {"num_responses", "question"}),
+        "antithesis": ("antithesis_prompt.txt", {"num_responses", "thesis"}),
+        "synthesis": ("synthesis_prompt.txt", {"num_responses", "thesis", "antithesis"}),
+        "view_identity": ("view_identity_prompt.txt", {"synthesis"}),
+        "nonsense": ("nonsense_prompt.txt", {"synthesis"})
+    }
+    SYSTEM_ROLES = {
+        "thesis": "You are a philosophical inquirer generating thesis statements.",
+        "antithesis": "You are a critical philosopher generating objections to thesis statements.",
+        "synthesis": "You are a dialectical philosopher generating synthetic positions.",
+        "view_identity": "You are an analyst identifying the philosophical viewpoint of statements.",
+        "nonsense": "You are a philosophical critic evaluating statements for meaningfulness.",
+        "batch": "You are a philosophical analyst answering several independent requests about statements."
     }
-    def __init__(self, api_key: str, central_question: str, prompt_dir: str = "./prompts", num_responses: int = 3):
-        self.client = OpenAI(api_key=api_key)
+    MAX_SYNTHESES = 8
+    client_class = OpenAI
+
+    def __init__(self, api_key: str, central_question: str, prompt_dir: str = PROMPT_DIR, num_responses: int = 3, build: bool = True, batch_size: Optional[int] = None, response_cache: Optional[ResponseCache] = None):
+        """
+        Args:
+            batch_size: When set, view identity and nonsense checks are sent up to
+                batch_size requests per call instead of one call per check
+            response_cache: Optional cache for repeated completion requests
+        """
+        self.client = get_gateway(api_key).client_for(self.client_class)
+        self.response_cache = response_cache
         self.graph: Dict[str, Dict[str, any]] = {}
         self.central_question = central_question
         self.graph[self.central_question] = {
@@ -21,26 +47,23 @@ class DialecticalGraph:
             "children": []
         }
         self.num_responses = num_responses
+        self.batch_size = batch_size
         self.prompt_dir = prompt_dir
         self.prompts = self._load_prompts()
-        self.initialize_graph()
+        if build:
+            self.initialize_graph()
         
-    def _load_prompts(self) -> Dict[str, str]:
-        """Load all prompt templates from files"""
-        prompts = {}
-        try:
-            for prompt_type, filename in self.PROMPT_FILES.items():
-                file_path = os.path.join(self.prompt_dir, filename)
-                with open(file_path, 'r') as file:
-                    prompts[prompt_type] = file.read().strip()
-            return prompts
-        except Exception as e:
-            raise Exception(f"Error loading prompts: {e}")
+    def _load_prompts(self) -> PromptRegistry:
+        """The shared registry for this prompt directory, loaded and validated by the first graph to use it"""
+        if self.prompt_dir not in _registries:
+            _registries[self.prompt_dir] = PromptRegistry(self.prompt_dir, self.PROMPT_FILES)
+        return _registries[self.prompt_dir]
 
     def generate_completion(self, prompt: str, system_role: str, max_tokens: int = 150) -> str:
         """Generate a completion with error handling"""
         try:
-            response = self.client.chat.completions.create(
+            content = cached_completion(
+                self.client, self.response_cache, "dialectical",
                 model="gpt-4-0125-preview",
                 messages=[
                     {"role": "system", "content": system_role},
@@ -48,80 +71,155 @@ class DialecticalGraph:
                 ],
                 max_tokens=max_tokens
             )
-            return response.choices[0].message.content.strip()
+            return content.strip()
         except Exception as e:
             raise Exception(f"Error in API call: {e}")
 
-    def generate_theses(self) -> List[str]:
-        """Generate N thesis responses to the central question"""
-        system_role = "You are a philosophical inquirer generating thesis statements."
-        prompt = self.prompts["thesis"].format(
+    @staticmethod
+    def _split_lines(response: str, limit: int) -> List[str]:
+        """One item per non-empty line, at most limit items"""
+        return [line.strip() for line in response.split('\n') if line.strip()][:limit]
+
+    def _theses_prompt(self) -> str:
+        return self.prompts.render(
+            "thesis",
             num_responses=self.num_responses,
             question=self.central_question
         )
 
+    def _antitheses_prompt(self, thesis: str) -> str:
+        return self.prompts.render(
+            "antithesis",
+            num_responses=self.num_responses,
+            thesis=thesis
+        )
+
+    def _syntheses_prompt(self, thesis: str, antithesis: str) -> str:
+        return self.prompts.render(
+            "synthesis",
+            num_responses=self.num_responses,
+            thesis=thesis,
+            antithesis=antithesis
+        )
+
+    @timed("theses")
+    def generate_theses(self) -> List[str]:
+        """Generate N thesis responses to the central question"""
         try:
-            response = self.generate_completion(prompt, system_role)
-            theses = [thesis.strip() for thesis in response.split('\n') if thesis.strip()]
-            return theses[:self.num_responses]  # Ensure we only return requested number
+            response = self.generate_completion(self._theses_prompt(), self.SYSTEM_ROLES["thesis"])
+            return self._split_lines(response, self.num_responses)  # Ensure we only return requested number
         except Exception as e:
             raise Exception(f"Error generating theses: {e}")
 
+    @timed("antitheses")
     def generate_antitheses(self, thesis: str) -> List[str]:
         """Generate N antitheses for a given thesis"""
-        system_role = "You are a critical philosopher generating objections to thesis statements."
-        prompt = self.prompts["antithesis"].format(
-            num_responses=self.num_responses,
-            thesis=thesis
-        )
-
         try:
-            response = self.generate_completion(prompt, system_role)
-            antitheses = [antithesis.strip() for antithesis in response.split('\n') if antithesis.strip()]
-            return antitheses[:self.num_responses]
+            response = self.generate_completion(self._antitheses_prompt(thesis), self.SYSTEM_ROLES["antithesis"])
+            return self._split_lines(response, self.num_responses)
         except Exception as e:
             raise Exception(f"Error generating antitheses: {e}")
 
+    @timed("syntheses")
     def generate_syntheses(self, thesis: str, antithesis: str) -> List[str]:
         """Generate N syntheses from a thesis-antithesis pair"""
-        system_role = "You are a dialectical philosopher generating synthetic positions."
-        prompt = self.prompts["synthesis"].format(
-            num_responses=self.num_responses,
-            thesis=thesis,
-            antithesis=antithesis
-        )
-
         try:
-            response = self.generate_completion(prompt, system_role, max_tokens=300)
-            syntheses = [synthesis.strip() for synthesis in response.split('\n') if synthesis.strip()]
-            return syntheses[:8]  # Ensure we only return 8 syntheses
+            response = self.generate_completion(self._syntheses_prompt(thesis, antithesis), self.SYSTEM_ROLES["synthesis"], max_tokens=300)
+            return self._split_lines(response, self.MAX_SYNTHESES)  # Ensure we only return 8 syntheses
         except Exception as e:
             raise Exception(f"Error generating syntheses: {e}")
 
+    @timed("view_identity")
     def generate_view_identity(self, synthesis: str) -> bool:
         """Generate a view identity analysis for a synthesis"""
-        system_role = "You are an analyst identifying the philosophical viewpoint of statements."
-        prompt = self.prompts["view_identity"].format(
+        prompt = self.prompts.render(
+            "view_identity",
             synthesis=synthesis
         )
 
         try:
-            return self.generate_completion(prompt, system_role, max_tokens=50)
+            return self.generate_completion(prompt, self.SYSTEM_ROLES["view_identity"], max_tokens=50)
         except Exception as e:
             raise Exception(f"Error generating view identity: {e}. Not Boolean")
 
+    @timed("nonsense_check")
     def generate_nonsense_check(self, synthesis: str) -> bool:
         """Check if a synthesis is meaningful or nonsense"""
-        system_role = "You are a philosophical critic evaluating statements for meaningfulness."
-        prompt = self.prompts["nonsense"].format(
+        prompt = self.prompts.render(
+            "nonsense",
             synthesis=synthesis
         )
 
         try:
-            return self.generate_completion(prompt, system_role, max_tokens=50)
+            return self.generate_completion(prompt, self.SYSTEM_ROLES["nonsense"], max_tokens=50)
         except Exception as e:
             raise Exception(f"Error generating nonsense check: {e}. Not Boolean")
 
+    def _check_requests(self, syntheses: List[str]) -> List[Tuple[str, str]]:
+        """The (check type, rendered prompt) pairs for every check of these syntheses"""
+        return [
+            (check, self.prompts.render(check, synthesis=synthesis))
+            for synthesis in syntheses
+            for check in ("view_identity", "nonsense")
+        ]
+
+    @staticmethod
+    def _batch_prompt(requests: List[Tuple[str, str]]) -> str:
+        return shared_prompts.render(
+            "batch_requests",
+            count=len(requests),
+            requests="\n\n".join(f"Request {i}:\n{prompt}" for i, (_, prompt) in enumerate(requests, 1))
+        )
+
+    @staticmethod
+    def _parse_batch(response: str, count: int) -> List[Optional[str]]:
+        """Per-item answers from a batched response; None for items that could not be parsed"""
+        try:
+            items = json.loads(response[response.index('['):response.rindex(']') + 1])
+        except ValueError:
+            return [None] * count
+        if not isinstance(items, list):
+            return [None] * count
+        return [
+            items[i].strip() if i < len(items) and isinstance(items[i], str) and items[i].strip() else None
+            for i in range(count)
+        ]
+
+    def _batches(self, requests: List[Tuple[str, str]]) -> List[List[Tuple[str, str]]]:
+        return [requests[i:i + self.batch_size] for i in range(0, len(requests), self.batch_size)]
+
+    def _single_check(self, check: str, prompt: str) -> str:
+        try:
+            return self.generate_completion(prompt, self.SYSTEM_ROLES[check], max_tokens=50)
+        except Exception as e:
+            raise Exception(f"Error generating {check} check: {e}")
+
+    def _run_batch(self, batch: List[Tuple[str, str]]) -> List[Optional[str]]:
+        try:
+            response = self.generate_completion(self._batch_prompt(batch), self.SYSTEM_ROLES["batch"], max_tokens=50 * len(batch) + 20)
+        except Exception as e:
+            print(f"Batched check failed, falling back to single requests: {e}")
+            return [None] * len(batch)
+        return self._parse_batch(response, len(batch))
+
+    @timed("synthesis_checks")
+    def generate_checks(self, syntheses: List[str]) -> List[Tuple[Any, Any]]:
+        """
+        (view_identity, nonsense_check) for each synthesis. With batch_size set,
+        checks are sent in batches and only items whose answer could not be
+        parsed are retried one request at a time.
+        """
+        requests = self._check_requests(syntheses)
+        if self.batch_size:
+            answers = [answer for batch in self._batches(requests) for answer in self._run_batch(batch)]
+        else:
+            answers = [None] * len(requests)
+        answers = [
+            answer if answer is not None else self._single_check(check, prompt)
+            for answer, (check, prompt) in zip(answers, requests)
+        ]
+        return list(zip(answers[0::2], answers[1::2]))
+
     def add_node(self, content: str, node_type: str, parent_id: Optional[str] = None) -> str:
         """Add a new node to the graph and return its ID"""
         node_id = f"{node_type}_{len(self.graph)}"
@@ -134,6 +232,7 @@ class DialecticalGraph:
             self.graph[parent_id]["children"].append(node_id)
         return node_id
 
+    @timed("build_dialectical_graph")
     def initialize_graph(self) -> None:
         """Initialize the complete dialectical graph"""
         try:
@@ -149,13 +248,12 @@ class DialecticalGraph:
                     
                     # Generate syntheses for each thesis-antithesis pair
                     syntheses = self.generate_syntheses(thesis, antithesis)
-                    for synthesis in syntheses:
+                    
+                    # Generate additional analyses for each synthesis
+                    checks = self.generate_checks(syntheses)
+                    for synthesis, (view_identity, nonsense_check) in zip(syntheses, checks):
                         synthesis_id = self.add_node(synthesis, "synthesis", antithesis_id)
                         
-                        # Generate additional analyses for each synthesis
-                        view_identity = self.generate_view_identity(synthesis)
-                        nonsense_check = self.generate_nonsense_check(synthesis)
-                        
                         # Add analyses as properties of the synthesis node
                         self.graph[synthesis_id]["view_identity"] = view_identity
                         self.graph[synthesis_id]["nonsense_check"] = nonsense_check
@@ -163,6 +261,21 @@ class DialecticalGraph:
         except Exception as e:
             raise Exception(f"Error initializing graph: {e}")
 
+    def _add_tree(self, tree: List[Tuple[str, List[Tuple[str, List[Tuple[str, Any, Any]]]]]]) -> None:
+        """
+        Insert generated (thesis, [(antithesis, [(synthesis, view_identity, nonsense_check)])])
+        results depth-first, the order initialize_graph adds them, so node ids
+        do not depend on the order in which concurrent requests completed.
+        """
+        for thesis, antitheses in tree:
+            thesis_id = self.add_node(thesis, "thesis", self.central_question)
+            for antithesis, syntheses in antitheses:
+                antithesis_id = self.add_node(antithesis, "antithesis", thesis_id)
+                for synthesis, view_identity, nonsense_check in syntheses:
+                    synthesis_id = self.add_node(synthesis, "synthesis", antithesis_id)
+                    self.graph[synthesis_id]["view_identity"] = view_identity
+                    self.graph[synthesis_id]["nonsense_check"] = nonsense_check
+
     def get_node_content(self, node_id: str) -> Dict:
         """Retrieve the content and metadata for a node"""
         if node_id not in self.graph:
@@ -173,4 +286,154 @@ class DialecticalGraph:
         """Get the children of a node"""
         if node_id not in self.graph:
             raise ValueError(f"Node {node_id} not found in graph")
-        return self.graph[node_id]["children"]
\ No newline at end of file
+        return self.graph[node_id]["children"]
+
+
+async def _gather_or_cancel(*aws: Awaitable) -> List[Any]:
+    """gather() that cancels the remaining work as soon as one awaitable fails"""
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+class AsyncDialecticalGraph(DialecticalGraph):
+    """
+    DialecticalGraph built as a dependency-driven async pipeline.
+
+    Each thesis fans out its antitheses as soon as it exists, each pair fans
+    out its syntheses, and both checks for a synthesis run together, all on
+    AsyncOpenAI and bounded by a global max_concurrency. Results are inserted
+    in the same depth-first order as the sequential build, so node ids are
+    deterministic. Build it with `await AsyncDialecticalGraph.build_async(...)`.
+    """
+    client_class = AsyncOpenAI
+
+    def __init__(self, api_key: str, central_question: str, prompt_dir: str = PROMPT_DIR, num_responses: int = 3, max_concurrency: int = 8, build: bool = False, batch_size: Optional[int] = None, response_cache: Optional[ResponseCache] = None):
+        # The synchronous build path cannot run here; building is always awaited
+        super().__init__(api_key, central_question, prompt_dir=prompt_dir, num_responses=num_responses, build=False, batch_size=batch_size, response_cache=response_cache)
+        self.max_concurrency = max_concurrency
+        self._limiter = asyncio.Semaphore(max_concurrency)
+
+    @classmethod
+    async def build_async(cls, api_key: str, central_question: str, prompt_dir: str = PROMPT_DIR, num_responses: int = 3, max_concurrency: int = 8, batch_size: Optional[int] = None, response_cache: Optional[ResponseCache] = None) -> "AsyncDialecticalGraph":
+        dialectical_graph = cls(api_key, central_question, prompt_dir=prompt_dir, num_responses=num_responses, max_concurrency=max_concurrency, batch_size=batch_size, response_cache=response_cache)
+        # A bulk build; interactive turns go first unless the caller says otherwise
+        with llm_work("background", keep_existing=True):
+            await dialectical_graph.initialize_graph()
+        return dialectical_graph
+
+    async def generate_completion(self, prompt: str, system_role: str, max_tokens: int = 150) -> str:
+        """Generate a completion with error handling, within the global concurrency limit"""
+        try:
+            async with self._limiter:
+                content = await async_cached_completion(
+                    self.client, self.response_cache, "dialectical",
+                    model="gpt-4-0125-preview",
+                    messages=[
+                        {"role": "system", "content": system_role},
+                        {"role": "user", "content": prompt}
+                    ],
+                    max_tokens=max_tokens
+                )
+            return content.strip()
+        except Exception as e:
+            raise Exception(f"Error in API call: {e}")
+
+    @timed("theses")
+    async def generate_theses(self) -> List[str]:
+        try:
+            response = await self.generate_completion(self._theses_prompt(), self.SYSTEM_ROLES["thesis"])
+            return self._split_lines(response, self.num_responses)
+        except Exception as e:
+            raise Exception(f"Error generating theses: {e}")
+
+    @timed("antitheses")
+    async def generate_antitheses(self, thesis: str) -> List[str]:
+        try:
+            response = await self.generate_completion(self._antitheses_prompt(thesis), self.SYSTEM_ROLES["antithesis"])
+            return self._split_lines(response, self.num_responses)
+        except Exception as e:
+            raise Exception(f"Error generating antitheses: {e}")
+
+    @timed("syntheses")
+    async def generate_syntheses(self, thesis: str, antithesis: str) -> List[str]:
+        try:
+            response = await self.generate_completion(self._syntheses_prompt(thesis, antithesis), self.SYSTEM_ROLES["synthesis"], max_tokens=300)
+            return self._split_lines(response, self.MAX_SYNTHESES)
+        except Exception as e:
+            raise Exception(f"Error generating syntheses: {e}")
+
+    @timed("view_identity")
+    async def generate_view_identity(self, synthesis: str) -> str:
+        prompt = self.prompts.render("view_identity", synthesis=synthesis)
+        try:
+            return await self.generate_completion(prompt, self.SYSTEM_ROLES["view_identity"], max_tokens=50)
+        except Exception as e:
+            raise Exception(f"Error generating view identity: {e}. Not Boolean")
+
+    @timed("nonsense_check")
+    async def generate_nonsense_check(self, synthesis: str) -> str:
+        prompt = self.prompts.render("nonsense", synthesis=synthesis)
+        try:
+            return await self.generate_completion(prompt, self.SYSTEM_ROLES["nonsense"], max_tokens=50)
+        except Exception as e:
+            raise Exception(f"Error generating nonsense check: {e}. Not Boolean")
+
+    async def _single_check(self, check: str, prompt: str) -> str:
+        try:
+            return await self.generate_completion(prompt, self.SYSTEM_ROLES[check], max_tokens=50)
+        except Exception as e:
+            raise Exception(f"Error generating {check} check: {e}")
+
+    async def _run_batch(self, batch: List[Tuple[str, str]]) -> List[Optional[str]]:
+        try:
+            response = await self.generate_completion(self._batch_prompt(batch), self.SYSTEM_ROLES["batch"], max_tokens=50 * len(batch) + 20)
+        except Exception as e:
+            print(f"Batched check failed, falling back to single requests: {e}")
+            return [None] * len(batch)
+        return self._parse_batch(response, len(batch))
+
+    @timed("synthesis_checks")
+    async def generate_checks(self, syntheses: List[str]) -> List[Tuple[Any, Any]]:
+        """Every check (or batch of checks) for these syntheses runs concurrently"""
+        requests = self._check_requests(syntheses)
+        if self.batch_size:
+            batches = await _gather_or_cancel(*(self._run_batch(batch) for batch in self._batches(requests)))
+            answers = [answer for batch in batches for answer in batch]
+        else:
+            answers = [None] * len(requests)
+
+        async def resolve(answer: Optional[str], check: str, prompt: str) -> str:
+            return answer if answer is not None else await self._single_check(check, prompt)
+
+        answers = await _gather_or_cancel(*(
+            resolve(answer, check, prompt) for answer, (check, prompt) in zip(answers, requests)
+        ))
+        return list(zip(answers[0::2], answers[1::2]))
+
+    async def _expand_pair(self, thesis: str, antithesis: str) -> Tuple[str, List[Tuple[str, Any, Any]]]:
+        syntheses = await self.generate_syntheses(thesis, antithesis)
+        checks = await self.generate_checks(syntheses)
+        return antithesis, [
+            (synthesis, view_identity, nonsense_check)
+            for synthesis, (view_identity, nonsense_check) in zip(syntheses, checks)
+        ]
+
+    async def _expand_thesis(self, thesis: str) -> Tuple[str, List]:
+        antitheses = await self.generate_antitheses(thesis)
+        return thesis, await _gather_or_cancel(*(self._expand_pair(thesis, antithesis) for antithesis in antitheses))
+
+    @timed("build_dialectical_graph")
+    async def initialize_graph(self) -> None:
+        """Initialize the complete dialectical graph, running independent requests concurrently"""
+        try:
+            theses = await self.generate_theses()
+            tree = await _gather_or_cancel(*(self._expand_thesis(thesis) for thesis in theses))
+            self._add_tree(tree)
+        except Exception as e:
+            raise Exception(f"Error initializing graph: {e}")
@@ -0,0 +1,159 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional
+from app.graph_core import GraphCore
+
+# Bump when the stored graph encoding changes so old rows are never decoded
+GRAPH_FORMAT = 2
+
+def normalize_question(question: str) -> str:
+    """Case- and whitespace-insensitive form of a question used for cache keys"""
+    return " ".join(question.lower().split())
+
+class CachedGraph:
+    """A finished graph shared between sessions. Treat `core` as read-only; sessions fork it"""
+    def __init__(self, central_question: str, core: GraphCore, created_at: Optional[float] = None):
+        self.central_question = central_question
+        self.core = core
+        self.created_at = time.time() if created_at is None else created_at
+        # Built lazily by QuestionGraph.from_cached and shared by its sessions
+        self.similarity_index = None
+
+class GraphCache:
+    """
+    Disk-backed cache of finished question graphs, shared across sessions.
+
+    Entries are keyed by the normalised central question plus the generation
+    parameters, expire after `ttl` seconds and are evicted least-recently-used
+    beyond `max_entries`. Concurrent requests for the same key share a single
+    build. Decoded graphs are kept in memory so sessions share one base
+    GraphCore and fork it copy-on-write (see QuestionGraph.from_cached).
+    """
+    def __init__(self, path: str = "graph_cache.sqlite3", max_entries: int = 256, ttl: float = 7 * 24 * 3600, max_memory_entries: int = 32):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_memory_entries = max_memory_entries
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._memory: "OrderedDict[str, CachedGraph]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS graphs ("
+                "key TEXT PRIMARY KEY, central_question TEXT NOT NULL, graph TEXT NOT NULL, "
+                "created_at REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+
+    @staticmethod
+    def make_key(central_question: str, **params) -> str:
+        payload = json.dumps({"question": normalize_question(central_question), "params": params, "format": GRAPH_FORMAT}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _load(self, key: str) -> Optional[CachedGraph]:
+        now = time.time()
+        with self._lock, self._db:
+            row = self._db.execute(
+                "SELECT central_question, graph, created_at FROM graphs WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[2] > self.ttl:
+                self._db.execute("DELETE FROM graphs WHERE key = ?", (key,))
+                return None
+            self._db.execute("UPDATE graphs SET last_used = ? WHERE key = ?", (now, key))
+        return CachedGraph(row[0], GraphCore.from_dict(json.loads(row[1])), created_at=row[2])
+
+    def _store(self, key: str, cached: CachedGraph) -> None:
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO graphs (key, central_question, graph, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, cached.central_question, json.dumps(cached.core.to_dict()), cached.created_at, now)
+            )
+            self._db.execute("DELETE FROM graphs WHERE created_at < ?", (now - self.ttl,))
+            self._db.execute(
+                "DELETE FROM graphs WHERE key NOT IN (SELECT key FROM graphs ORDER BY last_used DESC LIMIT ?)",
+                (self.max_entries,)
+            )
+
+    def _remember(self, key: str, cached: CachedGraph) -> None:
+        self._memory[key] = cached
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def is_expired(self, cached: CachedGraph) -> bool:
+        return time.time() - cached.created_at > self.ttl
+
+    async def get(self, central_question: str, **params) -> Optional[CachedGraph]:
+        key = self.make_key(central_question, **params)
+        if key in self._memory:
+            if not self.is_expired(self._memory[key]):
+                self._memory.move_to_end(key)
+                return self._memory[key]
+            # Expired in memory too; _load drops the row
+            del self._memory[key]
+        cached = await asyncio.to_thread(self._load, key)
+        if cached is not None:
+            self._remember(key, cached)
+        return cached
+
+    async def get_or_build(self, central_question: str, build: Callable[[], Awaitable["QuestionGraph"]], num_nodes: int, **params) -> CachedGraph:
+        """
+        Return the cached graph for this question and parameters, building it
+        with `build` on a miss. Only graphs that reached num_nodes are stored.
+        """
+        key = self.make_key(central_question, num_nodes=num_nodes, **params)
+        while True:
+            cached = await self.get(central_question, num_nodes=num_nodes, **params)
+            if cached is not None:
+                self.hits += 1
+                return cached
+
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                break
+            try:
+                # Another session is already building this graph; share its result
+                cached = await asyncio.shield(inflight)
+                self.coalesced += 1
+                return cached
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise
+                # The build we were waiting on was abandoned; try again
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            question_graph = await build()
+            cached = CachedGraph(question_graph.central_question, question_graph.core.fork())
+            if len(cached.core) >= num_nodes:
+                await asyncio.to_thread(self._store, key, cached)
+                self._remember(key, cached)
+            future.set_result(cached)
+            return cached
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else was waiting
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,168 @@
+import random
+import sys
+from array import array
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+class GraphCore:
+    """
+    Compact storage for a question graph.
+
+    Nodes are integer ids in insertion order. Question text is interned and
+    stored once; adjacency is a parent array plus a tuple of child ids per
+    node. The nodes that can still take children (counting reserved slots)
+    are tracked incrementally, so picking a random expandable node and parent
+    or children lookups are all O(1).
+
+    fork() returns a copy-on-write clone that shares storage with the
+    original until either of them is written to.
+    """
+    __slots__ = ("max_children", "texts", "summaries", "parents", "children", "pending", "index", "expandable", "expandable_pos", "_shared")
+
+    def __init__(self, root: str, root_summary: str = "", max_children: int = 3):
+        self.max_children = max_children
+        self.texts: List[str] = []
+        self.summaries: List[str] = []
+        self.parents = array('l')
+        self.children: List[Tuple[int, ...]] = []
+        self.pending = array('l')  # Child slots reserved by in-flight requests
+        self.index: Dict[str, int] = {}
+        self.expandable: List[int] = []
+        self.expandable_pos: Dict[int, int] = {}
+        self._shared = False
+        self._append(root, root_summary, -1)
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def __contains__(self, text: str) -> bool:
+        return text in self.index
+
+    def _own(self) -> None:
+        """Copy shared storage before the first write"""
+        if not self._shared:
+            return
+        self.texts = list(self.texts)
+        self.summaries = list(self.summaries)
+        self.parents = array('l', self.parents)
+        self.children = list(self.children)
+        self.pending = array('l', self.pending)
+        self.index = dict(self.index)
+        self.expandable = list(self.expandable)
+        self.expandable_pos = dict(self.expandable_pos)
+        self._shared = False
+
+    def _refresh_expandable(self, node_id: int) -> None:
+        eligible = len(self.children[node_id]) + self.pending[node_id] < self.max_children
+        if eligible and node_id not in self.expandable_pos:
+            self.expandable_pos[node_id] = len(self.expandable)
+            self.expandable.append(node_id)
+        elif not eligible and node_id in self.expandable_pos:
+            # Swap-remove keeps removal O(1)
+            position = self.expandable_pos.pop(node_id)
+            last = self.expandable.pop()
+            if last != node_id:
+                self.expandable[position] = last
+                self.expandable_pos[last] = position
+
+    def _append(self, text: str, summary: str, parent_id: int) -> int:
+        node_id = len(self.texts)
+        text = sys.intern(text)
+        self.texts.append(text)
+        self.summaries.append(summary)
+        self.parents.append(parent_id)
+        self.children.append(())
+        self.pending.append(0)
+        self.index[text] = node_id
+        self._refresh_expandable(node_id)
+        return node_id
+
+    def add(self, text: str, summary: str, parent_id: int) -> int:
+        """Add a child node and return its id. Callers check duplicates and capacity"""
+        self._own()
+        node_id = self._append(text, summary, parent_id)
+        self.children[parent_id] = self.children[parent_id] + (node_id,)
+        self._refresh_expandable(parent_id)
+        return node_id
+
+    def id_of(self, text: str) -> Optional[int]:
+        return self.index.get(text)
+
+    def parent_of(self, node_id: int) -> Optional[int]:
+        parent_id = self.parents[node_id]
+        return None if parent_id < 0 else parent_id
+
+    def children_of(self, node_id: int) -> Tuple[int, ...]:
+        return self.children[node_id]
+
+    def has_capacity(self, node_id: int) -> bool:
+        return len(self.children[node_id]) < self.max_children
+
+    def has_free_slot(self, node_id: int) -> bool:
+        """Whether the node can take another child, counting reserved slots"""
+        return node_id in self.expandable_pos
+
+    def random_expandable(self, rng: random.Random = random) -> Optional[int]:
+        if not self.expandable:
+            return None
+        return rng.choice(self.expandable)
+
+    def reserve(self, node_id: int) -> None:
+        """Hold a child slot for a request in flight"""
+        self._own()
+        self.pending[node_id] += 1
+        self._refresh_expandable(node_id)
+
+    def release(self, node_id: int) -> None:
+        self._own()
+        self.pending[node_id] -= 1
+        self._refresh_expandable(node_id)
+
+    def fork(self) -> "GraphCore":
+        clone = object.__new__(GraphCore)
+        for slot in self.__slots__:
+            setattr(clone, slot, getattr(self, slot))
+        self._shared = clone._shared = True
+        return clone
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "max_children": self.max_children,
+            "texts": self.texts,
+            "summaries": self.summaries,
+            "parents": self.parents.tolist()
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "GraphCore":
+        core = cls(data["texts"][0], data["summaries"][0], data["max_children"])
+        for text, summary, parent_id in zip(data["texts"][1:], data["summaries"][1:], data["parents"][1:]):
+            core.add(text, summary, parent_id)
+        return core
+
+class GraphView(Mapping):
+    """
+    Read-only dict-of-dicts view of a GraphCore, in the original
+    {question: {"summary": ..., "questions": [...]}} shape.
+    """
+    __slots__ = ("core",)
+
+    def __init__(self, core: GraphCore):
+        self.core = core
+
+    def __getitem__(self, question: str) -> Dict[str, Any]:
+        node_id = self.core.index[question]
+        texts = self.core.texts
+        return {
+            "summary": self.core.summaries[node_id],
+            "questions": [texts[child_id] for child_id in self.core.children[node_id]]
+        }
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.core.texts)
+
+    def __len__(self) -> int:
+        return len(self.core.texts)
+
+    def __contains__(self, question: object) -> bool:
+        return question in self.core.index
@@ -0,0 +1,137 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, NamedTuple, Optional
+from app.graph_cache import CachedGraph, GraphCache, normalize_question
+from app.question_graph import QuestionGraph
+
+class PoolEntry(NamedTuple):
+    graph: QuestionGraph
+    key: str  # Graph cache key it was built under
+    built_at: float  # When the cached graph it was forked from was built
+
+class GraphPrewarmer:
+    """
+    Background warm pool of ready session graphs for a fixed list of seed questions.
+
+    Each seed question is built once into the shared GraphCache and the pool
+    keeps `pool_size` session graphs forked from it, so a session opening a
+    seed question takes one without waiting. Taking a graph wakes the
+    refiller. Refills wait while `is_busy()` reports live turns and builds
+    that need LLM calls are spaced at least `min_interval` seconds apart, so
+    prewarming never competes with users.
+
+    Pooled graphs past the graph cache's TTL, or built under a different
+    cache key (e.g. after a model or prompt change), are discarded rather
+    than handed out.
+    """
+    def __init__(
+        self,
+        graph_cache: GraphCache,
+        seed_questions: Iterable[str],
+        build: Callable[[str], Awaitable[QuestionGraph]],
+        open_session: Callable[[CachedGraph], QuestionGraph],
+        num_nodes: int,
+        pool_size: int = 2,
+        min_interval: float = 5.0,
+        is_busy: Callable[[], bool] = lambda: False,
+        busy_poll: float = 0.5,
+        cache_params: Callable[[], Dict[str, Any]] = dict
+    ):
+        """
+        Args:
+            build: Builds a graph for a question on a cache miss
+            open_session: Turns a cached graph into a session graph
+            cache_params: Current extra GraphCache key parameters, matching the ones live sessions use
+        """
+        self.graph_cache = graph_cache
+        self.build = build
+        self.open_session = open_session
+        self.num_nodes = num_nodes
+        self.pool_size = pool_size
+        self.min_interval = min_interval
+        self.is_busy = is_busy
+        self.busy_poll = busy_poll
+        self.cache_params = cache_params
+        self.seed_questions: Dict[str, str] = {normalize_question(question): question for question in seed_questions}
+        self.pools: Dict[str, Deque[PoolEntry]] = {key: deque() for key in self.seed_questions}
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.builds = 0
+        self._wanted = asyncio.Event()
+        self._last_build = float("-inf")
+
+    def take(self, question: str) -> Optional[QuestionGraph]:
+        """A ready session graph for a seed question, or None on a miss or for other questions"""
+        pool = self.pools.get(normalize_question(question))
+        if pool is None:
+            return None
+        self._wanted.set()
+        self._discard_stale(normalize_question(question))
+        if not pool:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return pool.popleft().graph
+
+    def _params(self) -> Dict[str, Any]:
+        return dict(num_nodes=self.num_nodes, **self.cache_params())
+
+    def _discard_stale(self, key: str) -> None:
+        """Drop pooled graphs that have outlived the cache TTL or were built under another cache key"""
+        pool = self.pools[key]
+        current_key = self.graph_cache.make_key(self.seed_questions[key], **self._params())
+        now = time.time()
+        fresh = [entry for entry in pool if entry.key == current_key and now - entry.built_at <= self.graph_cache.ttl]
+        if len(fresh) < len(pool):
+            self.expired += len(pool) - len(fresh)
+            pool.clear()
+            pool.extend(fresh)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "builds": self.builds,
+            "expired": self.expired,
+            "ready": {question: len(self.pools[key]) for key, question in self.seed_questions.items()}
+        }
+
+    async def _wait_for_quiet(self, needs_build: bool) -> None:
+        while self.is_busy():
+            await asyncio.sleep(self.busy_poll)
+        if needs_build:
+            delay = self._last_build + self.min_interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                # Users may have started a turn while we waited
+                await self._wait_for_quiet(needs_build=False)
+
+    async def _fill(self, key: str) -> None:
+        question = self.seed_questions[key]
+        pool = self.pools[key]
+        params = self._params()
+        cache_key = self.graph_cache.make_key(question, **params)
+        needs_build = await self.graph_cache.get(question, **params) is None
+        await self._wait_for_quiet(needs_build)
+        if needs_build:
+            self._last_build = time.monotonic()
+            self.builds += 1
+        cached = await self.graph_cache.get_or_build(question, lambda: self.build(question), **params)
+        while len(pool) < self.pool_size:
+            pool.append(PoolEntry(self.open_session(cached), cache_key, cached.created_at))
+
+    async def run(self) -> None:
+        """Keep every pool full; run as a background task"""
+        while True:
+            self._wanted.clear()
+            for key, pool in self.pools.items():
+                self._discard_stale(key)
+                if len(pool) >= self.pool_size:
+                    continue
+                try:
+                    await self._fill(key)
+                except Exception as e:
+                    print(f"Error prewarming graph for '{self.seed_questions[key]}': {e}")
+            await self._wanted.wait()
@@ -0,0 +1,364 @@
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple, Type
+
+import httpx
+from openai import APIConnectionError, APIStatusError, AsyncOpenAI, OpenAI
+
+from app.llm_scheduler import LLMScheduler
+from app.llm_transport import AsyncRecordingClient, AsyncReplayClient, CompletionRecorder, Recording, RecordingClient, ReplayClient
+from app.metrics import metrics
+from app.position_digest import TokenCounter
+
+# Requests and tokens per minute, per model. None by default, so calls are
+# only limited by the account's own quota (429s are retried); set
+# LLM_RATE_LIMITS to match it, e.g. '{"gpt-4o": {"rpm": 5000, "tpm": 800000}}'
+DEFAULT_LIMITS: Dict[str, Dict[str, int]] = {}
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at `per_minute` units per minute.
+
+    reserve() always takes the units and returns how long the caller must
+    wait before using them, so the same bucket serves threads and coroutines
+    and waiting callers are served in arrival order.
+    """
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        with self._lock:
+            self._refill()
+            self.level -= amount
+            return 0.0 if self.level >= 0 else -self.level / self.rate
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` units (at most the capacity) are available, without taking them"""
+        with self._lock:
+            self._refill()
+            return max(0.0, min(amount, self.capacity) - self.level) / self.rate
+
+    def adjust(self, amount: float) -> None:
+        """Charge (or refund, if negative) the difference between an estimate and actual use"""
+        with self._lock:
+            self._refill()
+            self.level = min(self.capacity, self.level - amount)
+
+class _Completions:
+    def __init__(self, create: Callable[..., Any]):
+        self.create = create
+
+class _Chat:
+    def __init__(self, create: Callable[..., Any]):
+        self.completions = _Completions(create)
+
+class HeldStream:
+    """
+    A streamed response that keeps its scheduler slot until it has been read
+    to the end or closed, so long streamed replies count against the
+    in-flight cap for as long as they are open
+    """
+    def __init__(self, stream: Any, release: Callable[[], None]):
+        self.stream = stream
+        self._release: Optional[Callable[[], None]] = release
+
+    def _done(self) -> None:
+        if self._release is not None:
+            release, self._release = self._release, None
+            release()
+
+    async def __aiter__(self) -> AsyncIterator[Any]:
+        try:
+            async for chunk in self.stream:
+                yield chunk
+        finally:
+            self._done()
+
+    async def close(self) -> None:
+        self._done()
+        close = getattr(self.stream, "close", None) or getattr(self.stream, "aclose", None)
+        if close is not None:
+            await close()
+
+class GatewayClient:
+    """Drop-in for an OpenAI client's chat.completions.create, routed through a gateway"""
+    def __init__(self, gateway: "LLMGateway", client: Any):
+        self.gateway = gateway
+        self.raw = client
+        self.chat = _Chat(self._create)
+
+    def _create(self, **request) -> Any:
+        return self.gateway.call(self.raw, request)
+
+class AsyncGatewayClient(GatewayClient):
+    async def _create(self, **request) -> Any:
+        return await self.gateway.acall(self.raw, request)
+
+class LLMGateway:
+    """
+    Process-wide access point for chat completions.
+
+    Every QuestionGraph, DialecticalGraph and PhilosophicalDiscussionBot gets
+    its client from here (see get_gateway), so all sessions share one
+    keep-alive connection pool per client type. Requests pass per-model
+    token buckets for requests and tokens per minute, and rate-limit,
+    timeout, connection and 5xx errors are retried with full-jitter
+    exponential backoff, waiting at least as long as Retry-After asks.
+    Async calls are admitted by an LLMScheduler, which caps how many are in
+    flight (a stream until it is read or closed) and lets interactive work
+    go ahead of setup and background work when slots or the rate limit run
+    short; a retry queues again. Sync calls, made from worker threads by the
+    CLI and the synchronous graph builds, are exempt from the scheduler:
+    they take their share of the token buckets directly and wait in their
+    own thread.
+
+    Hooks observe traffic: request_hooks(request) before each attempt,
+    response_hooks(request, response, seconds) after a success and
+    retry_hooks(request, error, attempt, delay) before a retry.
+
+    Beneath the gateway, completions can be recorded to a file (`record`)
+    or replayed from one (`replay`) instead of calling the API, for
+    repeatable offline runs; see app.llm_transport.
+    """
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        limits: Optional[Dict[str, Dict[str, int]]] = None,
+        max_retries: int = 4,
+        backoff_base: float = 0.5,
+        backoff_max: float = 20.0,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        timeout: float = 60.0,
+        max_inflight: Optional[int] = 64,
+        starvation_after: Optional[float] = 10.0,
+        record: Optional[CompletionRecorder] = None,
+        replay: Optional[Recording] = None,
+        replay_latency_scale: float = 1.0
+    ):
+        """
+        Args:
+            base_url: API base URL, e.g. a local mock server; defaults to OpenAI's
+            limits: Model -> {"rpm": ..., "tpm": ...}; models not listed are not limited (default: none)
+            max_inflight: Async requests in flight at once; None for no cap
+            starvation_after: Seconds after which a queued call goes first whatever its work class
+            record: Recorder every completion is written to
+            replay: Recording to serve completions from, with no API access
+            replay_latency_scale: Factor on replayed latencies; 0 replays without waiting
+        """
+        self.api_key = api_key
+        self.base_url = base_url
+        self.limits = DEFAULT_LIMITS if limits is None else limits
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.pool_limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive_connections)
+        self.timeout = timeout
+        self.request_hooks: List[Callable[[Dict[str, Any]], None]] = []
+        self.response_hooks: List[Callable[[Dict[str, Any], Any, float], None]] = []
+        self.retry_hooks: List[Callable[[Dict[str, Any], Exception, int, float], None]] = []
+        self.token_counter = TokenCounter()
+        self._buckets: Dict[str, Tuple[TokenBucket, TokenBucket]] = {}
+        self.record = record
+        self.replay = replay
+        self.replay_latency_scale = replay_latency_scale
+        self._clients: Dict[Type, GatewayClient] = {}
+        self._lock = threading.Lock()
+        self.scheduler = LLMScheduler(
+            self._estimate_tokens,
+            self._admission_delay,
+            self._reserve,
+            max_inflight=max_inflight,
+            starvation_after=starvation_after
+        )
+
+    def client_for(self, client_class: Type) -> GatewayClient:
+        """The shared gateway client wrapping one client_class instance"""
+        with self._lock:
+            if client_class not in self._clients:
+                if self.replay is not None:
+                    # No API client at all; every completion comes from the recording
+                    is_async = issubclass(client_class, AsyncOpenAI)
+                    client = (AsyncReplayClient if is_async else ReplayClient)(self.replay, self.replay_latency_scale)
+                else:
+                    kwargs: Dict[str, Any] = {"api_key": self.api_key, "base_url": self.base_url, "max_retries": 0}
+                    if issubclass(client_class, AsyncOpenAI):
+                        kwargs["http_client"] = httpx.AsyncClient(limits=self.pool_limits, timeout=self.timeout)
+                    elif issubclass(client_class, OpenAI):
+                        kwargs["http_client"] = httpx.Client(limits=self.pool_limits, timeout=self.timeout)
+                    client = client_class(**kwargs)
+                    # AsyncOpenAI's create is a plain function returning a coroutine
+                    is_async = issubclass(client_class, AsyncOpenAI) or asyncio.iscoroutinefunction(client.chat.completions.create)
+                    if self.record is not None:
+                        client = (AsyncRecordingClient if is_async else RecordingClient)(client, self.record)
+                wrapper = AsyncGatewayClient if is_async else GatewayClient
+                self._clients[client_class] = wrapper(self, client)
+            return self._clients[client_class]
+
+    def _buckets_for(self, model: str) -> Optional[Tuple[TokenBucket, TokenBucket]]:
+        limit = self.limits.get(model)
+        if limit is None:
+            return None
+        with self._lock:
+            if model not in self._buckets:
+                self._buckets[model] = (TokenBucket(limit["rpm"]), TokenBucket(limit["tpm"]))
+            return self._buckets[model]
+
+    def _estimate_tokens(self, request: Dict[str, Any]) -> int:
+        prompt = sum(self.token_counter.count(message.get("content") or "") for message in request.get("messages", []))
+        return prompt + (request.get("max_tokens") or 0)
+
+    def _admit(self, request: Dict[str, Any]) -> Tuple[float, int]:
+        """Take this request's share of its model's buckets. Returns (seconds to wait, tokens charged)"""
+        buckets = self._buckets_for(request.get("model", ""))
+        if buckets is None:
+            return 0.0, 0
+        estimate = self._estimate_tokens(request)
+        return max(buckets[0].reserve(1), buckets[1].reserve(estimate)), estimate
+
+    def _admission_delay(self, request: Dict[str, Any], estimate: int) -> float:
+        """Seconds until the model's buckets have room for this request"""
+        buckets = self._buckets_for(request.get("model", ""))
+        if buckets is None:
+            return 0.0
+        return max(buckets[0].wait_time(1), buckets[1].wait_time(estimate))
+
+    def _reserve(self, request: Dict[str, Any], estimate: int) -> None:
+        buckets = self._buckets_for(request.get("model", ""))
+        if buckets is not None:
+            buckets[0].reserve(1)
+            buckets[1].reserve(estimate)
+
+    def _settle(self, request: Dict[str, Any], response: Any, estimate: int) -> None:
+        buckets = self._buckets_for(request.get("model", ""))
+        usage = getattr(response, "usage", None)
+        if buckets is not None and usage is not None and getattr(usage, "total_tokens", None) is not None:
+            buckets[1].adjust(usage.total_tokens - estimate)
+
+    @staticmethod
+    def _retry_after(error: Exception) -> Optional[float]:
+        response = getattr(error, "response", None)
+        if response is None:
+            return None
+        headers = response.headers
+        try:
+            if "retry-after-ms" in headers:
+                return float(headers["retry-after-ms"]) / 1000
+            if "retry-after" in headers:
+                return float(headers["retry-after"])
+        except ValueError:
+            return None
+        return None
+
+    def _retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        """Seconds to wait before retrying, or None if the error is not retryable"""
+        if attempt >= self.max_retries:
+            return None
+        if isinstance(error, APIStatusError):
+            if error.status_code not in RETRYABLE_STATUS:
+                return None
+        elif not isinstance(error, APIConnectionError):
+            return None
+        backoff = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        retry_after = self._retry_after(error)
+        return max(backoff, retry_after) if retry_after is not None else backoff
+
+    def _notify(self, hooks: List[Callable], *args) -> None:
+        for hook in hooks:
+            try:
+                hook(*args)
+            except Exception as e:
+                print(f"Error in gateway hook: {e}")
+
+    def call(self, client: Any, request: Dict[str, Any]) -> Any:
+        """A sync completion; rate limited and retried, but not scheduled (see the class docstring)"""
+        attempt = 0
+        while True:
+            wait, estimate = self._admit(request)
+            if wait:
+                time.sleep(wait)
+            self._notify(self.request_hooks, request)
+            started = time.monotonic()
+            try:
+                response = client.chat.completions.create(**request)
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                attempt += 1
+                self._notify(self.retry_hooks, request, e, attempt, delay)
+                time.sleep(delay)
+                continue
+            self._settle(request, response, estimate)
+            self._notify(self.response_hooks, request, response, time.monotonic() - started)
+            return response
+
+    async def acall(self, client: Any, request: Dict[str, Any]) -> Any:
+        attempt = 0
+        while True:
+            estimate = await self.scheduler.acquire(request)
+            held = False
+            try:
+                self._notify(self.request_hooks, request)
+                started = time.monotonic()
+                try:
+                    response = await client.chat.completions.create(**request)
+                except Exception as e:
+                    delay = self._retry_delay(e, attempt)
+                    if delay is None:
+                        raise
+                    attempt += 1
+                    self._notify(self.retry_hooks, request, e, attempt, delay)
+                else:
+                    self._settle(request, response, estimate)
+                    self._notify(self.response_hooks, request, response, time.monotonic() - started)
+                    if request.get("stream"):
+                        held = True
+                        return HeldStream(response, self.scheduler.release)
+                    return response
+            finally:
+                # The slot is not held through the backoff
+                if not held:
+                    self.scheduler.release()
+            await asyncio.sleep(delay)
+
+_gateways: Dict[Optional[str], LLMGateway] = {}
+_gateways_lock = threading.Lock()
+
+def get_gateway(api_key: Optional[str] = None) -> LLMGateway:
+    """The process-wide gateway for an API key, configured from the environment on first use"""
+    with _gateways_lock:
+        if api_key not in _gateways:
+            limits = json.loads(os.environ["LLM_RATE_LIMITS"]) if os.getenv("LLM_RATE_LIMITS") else None
+            # LLM_RECORD=path records every completion; LLM_REPLAY=path serves them back offline
+            record = CompletionRecorder(os.environ["LLM_RECORD"]) if os.getenv("LLM_RECORD") else None
+            replay = Recording(os.environ["LLM_REPLAY"], strict=os.getenv("LLM_REPLAY_STRICT", "0") == "1") if os.getenv("LLM_REPLAY") else None
+            _gateways[api_key] = LLMGateway(
+                api_key=api_key,
+                base_url=os.getenv("LLM_BASE_URL") or None,
+                limits=limits,
+                max_retries=int(os.getenv("LLM_MAX_RETRIES", "4")),
+                max_inflight=int(os.getenv("LLM_MAX_INFLIGHT", "64")) or None,
+                starvation_after=float(os.getenv("LLM_STARVATION_SECONDS", "10")) or None,
+                record=record,
+                replay=replay,
+                replay_latency_scale=float(os.getenv("LLM_REPLAY_LATENCY_SCALE", "1"))
+            )
+            metrics.instrument(_gateways[api_key])
+        return _gateways[api_key]
@@ -0,0 +1,230 @@
+import asyncio
+import contextvars
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Set, Union
+
+from app.metrics import metrics
+
+# Most urgent first. Lower classes only go ahead of higher ones once starved
+WORK_CLASSES = ("interactive", "setup", "background")
+
+class WorkTag:
+    """Work class and owning client of the LLM calls made under it (see llm_work)"""
+    __slots__ = ("work_class", "client_id", "queued")
+
+    def __init__(self, work_class: str, client_id: Optional[str] = None):
+        if work_class not in WORK_CLASSES:
+            raise ValueError(f"Unknown work class '{work_class}'")
+        self.work_class = work_class
+        self.client_id = client_id
+        self.queued: Set["_Waiter"] = set()
+
+    def promote(self, work_class: str) -> None:
+        """Move this work up to a more urgent class, including calls already queued"""
+        if WORK_CLASSES.index(work_class) >= WORK_CLASSES.index(self.work_class):
+            return
+        self.work_class = work_class
+        for waiter in list(self.queued):
+            waiter.scheduler._requeue(waiter)
+
+_current_work: contextvars.ContextVar[Optional[WorkTag]] = contextvars.ContextVar("current_llm_work", default=None)
+
+def current_work() -> Optional[WorkTag]:
+    return _current_work.get()
+
+@contextmanager
+def llm_work(work: Union[str, WorkTag], client_id: Optional[str] = None, keep_existing: bool = False) -> Iterator[WorkTag]:
+    """
+    Schedule the LLM calls made in this block, and in tasks started from it,
+    as `work` (a work class or an existing tag). The client defaults to the
+    enclosing block's; with keep_existing an enclosing tag wins.
+    """
+    current = _current_work.get()
+    if keep_existing and current is not None:
+        yield current
+        return
+    if isinstance(work, WorkTag):
+        tag = work
+    else:
+        tag = WorkTag(work, client_id if client_id is not None else (current.client_id if current is not None else None))
+    token = _current_work.set(tag)
+    try:
+        yield tag
+    finally:
+        _current_work.reset(token)
+
+class _Waiter:
+    __slots__ = ("scheduler", "tag", "work_class", "client_id", "request", "estimate", "future", "enqueued")
+
+    def __init__(self, scheduler: "LLMScheduler", tag: Optional[WorkTag], request: Dict[str, Any], estimate: int, future: asyncio.Future):
+        self.scheduler = scheduler
+        self.tag = tag
+        self.work_class = WORK_CLASSES.index(tag.work_class) if tag is not None else 0
+        self.client_id = tag.client_id if tag is not None else None
+        self.request = request
+        self.estimate = estimate
+        self.future = future
+        self.enqueued = time.monotonic()
+
+class LLMScheduler:
+    """
+    Decides which waiting async LLM call goes next when in-flight slots or
+    the rate limit run short.
+
+    A call needs one of `max_inflight` slots and room in its model's rate
+    limit (`ready_in` seconds from now; `reserve` then takes it). Whenever
+    either frees up, the next call comes from the most urgent work class
+    with calls waiting, round robin across the clients queued in that class
+    and oldest first per client. A call that has waited longer than
+    `starvation_after` seconds goes first whatever its class, so background
+    work slows down under interactive load but never stops.
+    """
+    def __init__(
+        self,
+        estimate: Callable[[Dict[str, Any]], int],
+        ready_in: Callable[[Dict[str, Any], int], float],
+        reserve: Callable[[Dict[str, Any], int], None],
+        max_inflight: Optional[int] = 64,
+        starvation_after: Optional[float] = 10.0
+    ):
+        self.estimate = estimate
+        self.ready_in = ready_in
+        self.reserve = reserve
+        self.max_inflight = max_inflight
+        self.starvation_after = starvation_after
+        # Per work class: client -> its waiting calls, in round robin order
+        self.queues: List["OrderedDict[Optional[str], Deque[_Waiter]]"] = [OrderedDict() for _ in WORK_CLASSES]
+        self.queued = 0
+        self.inflight = 0
+        self.granted = [0] * len(WORK_CLASSES)
+        self.starved = [0] * len(WORK_CLASSES)
+        self.waits: List[Deque[float]] = [deque(maxlen=1000) for _ in WORK_CLASSES]
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def _slot_free(self) -> bool:
+        return self.max_inflight is None or self.inflight < self.max_inflight
+
+    async def acquire(self, request: Dict[str, Any]) -> int:
+        """
+        Wait for this call's turn under the current work tag and take its
+        slot and rate limit share. Returns the tokens charged; call release()
+        once the request is done.
+        """
+        estimate = self.estimate(request)
+        tag = _current_work.get()
+        if not self.queued and self._slot_free() and self.ready_in(request, estimate) <= 0:
+            waiter = _Waiter(self, tag, request, estimate, None)
+            self._grant(waiter)
+            return estimate
+        waiter = _Waiter(self, tag, request, estimate, asyncio.get_running_loop().create_future())
+        self._enqueue(waiter)
+        self._dispatch()
+        try:
+            return await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Granted just as the caller gave up
+                self.release()
+            else:
+                self._remove(waiter)
+                self._dispatch()
+            raise
+
+    def release(self) -> None:
+        self.inflight -= 1
+        self._dispatch()
+
+    def _enqueue(self, waiter: _Waiter) -> None:
+        self.queues[waiter.work_class].setdefault(waiter.client_id, deque()).append(waiter)
+        self.queued += 1
+        if waiter.tag is not None:
+            waiter.tag.queued.add(waiter)
+
+    def _remove(self, waiter: _Waiter) -> None:
+        queue = self.queues[waiter.work_class]
+        waiters = queue.get(waiter.client_id)
+        if waiters is None or waiter not in waiters:
+            return
+        served_head = waiters[0] is waiter
+        waiters.remove(waiter)
+        self.queued -= 1
+        if waiter.tag is not None:
+            waiter.tag.queued.discard(waiter)
+        if not waiters:
+            del queue[waiter.client_id]
+        elif served_head:
+            # Round robin: the client goes to the back of its class
+            queue.move_to_end(waiter.client_id)
+
+    def _requeue(self, waiter: _Waiter) -> None:
+        """File a queued call under its tag's (new) work class"""
+        self._remove(waiter)
+        waiter.work_class = WORK_CLASSES.index(waiter.tag.work_class)
+        self._enqueue(waiter)
+        self._dispatch()
+
+    def _pick(self) -> Optional[_Waiter]:
+        if self.starvation_after is not None:
+            oldest = None
+            for queue in self.queues[1:]:
+                for waiters in queue.values():
+                    if oldest is None or waiters[0].enqueued < oldest.enqueued:
+                        oldest = waiters[0]
+            if oldest is not None and time.monotonic() - oldest.enqueued > self.starvation_after:
+                return oldest
+        for queue in self.queues:
+            if queue:
+                return next(iter(queue.values()))[0]
+        return None
+
+    def _grant(self, waiter: _Waiter) -> None:
+        self.reserve(waiter.request, waiter.estimate)
+        self.inflight += 1
+        wait = time.monotonic() - waiter.enqueued
+        self.granted[waiter.work_class] += 1
+        if waiter.work_class and self.starvation_after is not None and wait > self.starvation_after:
+            self.starved[waiter.work_class] += 1
+        self.waits[waiter.work_class].append(wait)
+        metrics.observe(f"llm_queue.{WORK_CLASSES[waiter.work_class]}", wait, waiter.request.get("model"))
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self.queued and self._slot_free():
+            waiter = self._pick()
+            if waiter.future.done():
+                # Cancelled while queued
+                self._remove(waiter)
+                continue
+            delay = self.ready_in(waiter.request, waiter.estimate)
+            if delay > 0:
+                # Rate limited: hold the slot open for the most urgent call
+                self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+            self._remove(waiter)
+            self._grant(waiter)
+            waiter.future.set_result(waiter.estimate)
+
+    def stats(self) -> Dict[str, object]:
+        classes = {}
+        for index, work_class in enumerate(WORK_CLASSES):
+            waits = sorted(self.waits[index])
+            classes[work_class] = {
+                "queued": sum(len(waiters) for waiters in self.queues[index].values()),
+                "clients": len(self.queues[index]),
+                "granted": self.granted[index],
+                "starved": self.starved[index],
+                "wait_p50": waits[len(waits) // 2] if waits else None,
+                "wait_p95": waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else None,
+                "wait_max": waits[-1] if waits else None
+            }
+        return {
+            "inflight": self.inflight,
+            "max_inflight": self.max_inflight,
+            "queued": self.queued,
+            "starvation_after": self.starvation_after,
+            "classes": classes
+        }
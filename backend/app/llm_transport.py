@@ -0,0 +1,181 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import threading
+import time
+import types
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, List
+
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+from app.response_cache import ResponseCache
+
+def request_shape(request: Dict[str, Any]) -> str:
+    """What a request asks for regardless of its details: model, system prompt and streaming"""
+    system = [message.get("content") for message in request.get("messages", []) if message.get("role") == "system"]
+    payload = json.dumps([request.get("model"), system, bool(request.get("stream"))], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+class CompletionRecorder:
+    """
+    Appends completions to a recording file as JSON lines.
+
+    Each record is compressed as its own gzip member, so the file stays
+    compact, grows a record at a time and still loads if the recording run
+    is cut short.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.records = 0
+        self._file = open(path, "ab")
+        self._lock = threading.Lock()
+
+    def write(self, request: Dict[str, Any], record: Dict[str, Any]) -> None:
+        record = {"key": ResponseCache.make_key(**request), "shape": request_shape(request), "model": request.get("model"), **record}
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._file.write(gzip.compress(line.encode("utf-8")))
+            self._file.flush()
+            self.records += 1
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+class Recording:
+    """
+    Completions loaded from a recording, served by request.
+
+    A request gets the completions recorded for the identical request, in
+    recorded order (the last repeating once they run out). Without an exact
+    match, e.g. after a change to a prompt, it gets the recordings of the
+    same shape (model, system prompt, streaming) in turn, failing that any
+    recording for the same model and streaming, or raises when `strict`.
+    `hits` and `fallbacks` count how requests were matched.
+    """
+    def __init__(self, path: str, strict: bool = False):
+        self.path = path
+        self.strict = strict
+        self.by_key: Dict[str, Deque[Dict[str, Any]]] = {}
+        self.by_shape: Dict[str, List[Dict[str, Any]]] = {}
+        self.by_model: Dict[str, List[Dict[str, Any]]] = {}
+        self._fallback_turns: Dict[str, int] = {}
+        self.hits = 0
+        self.fallbacks = 0
+        self._lock = threading.Lock()
+        with gzip.open(path, "rt", encoding="utf-8") as recording:
+            for line in recording:
+                if line.strip():
+                    record = json.loads(line)
+                    self.by_key.setdefault(record["key"], deque()).append(record)
+                    self.by_shape.setdefault(record["shape"], []).append(record)
+                    self.by_model.setdefault(f"{record['model']}:{'offsets' in record}", []).append(record)
+
+    def __len__(self) -> int:
+        return sum(len(records) for records in self.by_shape.values())
+
+    def lookup(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            records = self.by_key.get(ResponseCache.make_key(**request))
+            if records:
+                self.hits += 1
+                return records.popleft() if len(records) > 1 else records[0]
+            shape = request_shape(request)
+            model = f"{request.get('model')}:{bool(request.get('stream'))}"
+            fallback = shape if shape in self.by_shape else model
+            candidates = self.by_shape.get(shape) or self.by_model.get(model)
+            if self.strict or not candidates:
+                raise Exception(f"No recorded completion for this {request.get('model')} request in {self.path}")
+            self.fallbacks += 1
+            turn = self._fallback_turns.get(fallback, 0)
+            self._fallback_turns[fallback] = turn + 1
+            return candidates[turn % len(candidates)]
+
+def _completions(create) -> types.SimpleNamespace:
+    return types.SimpleNamespace(completions=types.SimpleNamespace(create=create))
+
+class RecordingClient:
+    """Wraps a client, recording each successful completion and its latency"""
+    def __init__(self, client: Any, recorder: CompletionRecorder):
+        self.raw = client
+        self.recorder = recorder
+        self.chat = _completions(self._create)
+
+    def _create(self, **request) -> Any:
+        started = time.monotonic()
+        response = self.raw.chat.completions.create(**request)
+        if request.get("stream"):
+            return self._record_stream(request, response, started)
+        self.recorder.write(request, {"latency": round(time.monotonic() - started, 4), "response": response.model_dump(exclude_unset=True)})
+        return response
+
+    def _record_stream(self, request: Dict[str, Any], stream: Any, started: float) -> Iterator[Any]:
+        chunks, offsets = [], []
+        for chunk in stream:
+            offsets.append(round(time.monotonic() - started, 4))
+            chunks.append(chunk.model_dump(exclude_unset=True))
+            yield chunk
+        self.recorder.write(request, {"latency": offsets[-1] if offsets else 0.0, "offsets": offsets, "chunks": chunks})
+
+class AsyncRecordingClient(RecordingClient):
+    async def _create(self, **request) -> Any:
+        started = time.monotonic()
+        response = await self.raw.chat.completions.create(**request)
+        if request.get("stream"):
+            return self._record_stream(request, response, started)
+        self.recorder.write(request, {"latency": round(time.monotonic() - started, 4), "response": response.model_dump(exclude_unset=True)})
+        return response
+
+    async def _record_stream(self, request: Dict[str, Any], stream: Any, started: float) -> AsyncIterator[Any]:
+        chunks, offsets = [], []
+        async for chunk in stream:
+            offsets.append(round(time.monotonic() - started, 4))
+            chunks.append(chunk.model_dump(exclude_unset=True))
+            yield chunk
+        self.recorder.write(request, {"latency": offsets[-1] if offsets else 0.0, "offsets": offsets, "chunks": chunks})
+
+class ReplayClient:
+    """
+    Serves completions from a Recording, with no network. Latencies are the
+    recorded ones times `latency_scale`: 1 replays at recorded speed, 0
+    without waiting.
+    """
+    def __init__(self, recording: Recording, latency_scale: float = 1.0):
+        self.recording = recording
+        self.latency_scale = latency_scale
+        self.chat = _completions(self._create)
+
+    def _create(self, **request) -> Any:
+        record = self.recording.lookup(request)
+        if request.get("stream"):
+            return self._replay_stream(record)
+        if self.latency_scale:
+            time.sleep(record["latency"] * self.latency_scale)
+        return ChatCompletion.model_validate(record["response"])
+
+    def _replay_stream(self, record: Dict[str, Any]) -> Iterator[ChatCompletionChunk]:
+        elapsed = 0.0
+        for offset, chunk in zip(record["offsets"], record["chunks"]):
+            if self.latency_scale:
+                time.sleep((offset - elapsed) * self.latency_scale)
+            elapsed = offset
+            yield ChatCompletionChunk.model_validate(chunk)
+
+class AsyncReplayClient(ReplayClient):
+    async def _create(self, **request) -> Any:
+        record = self.recording.lookup(request)
+        if request.get("stream"):
+            return self._replay_stream(record)
+        if self.latency_scale:
+            await asyncio.sleep(record["latency"] * self.latency_scale)
+        return ChatCompletion.model_validate(record["response"])
+
+    async def _replay_stream(self, record: Dict[str, Any]) -> AsyncIterator[ChatCompletionChunk]:
+        elapsed = 0.0
+        for offset, chunk in zip(record["offsets"], record["chunks"]):
+            if self.latency_scale:
+                await asyncio.sleep((offset - elapsed) * self.latency_scale)
+            elapsed = offset
+            yield ChatCompletionChunk.model_validate(chunk)
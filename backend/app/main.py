@@ -1,9 +1,20 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Dict
+from typing import AsyncIterator, List, Dict, Optional
 import json
-from app.question_graph import QuestionGraph
-from app.philosophical_discussion_bot import PhilosophicalDiscussionBot
+from app.question_graph import AsyncQuestionGraph
+from app.philosophical_discussion_bot import AsyncPhilosophicalDiscussionBot
+from app.graph_cache import CachedGraph, GraphCache
+from app.graph_prewarmer import GraphPrewarmer
+from app.llm_gateway import get_gateway
+from app.llm_scheduler import llm_work
+from app.metrics import metrics, timed
+from app.prompt_registry import prompts
+from app.response_cache import ResponseCache
+from app.session_limits import SessionTracker
+from app.session_scope import ScopeCancelled, SessionScope
+from app.session_store import SessionStore
 import os
 import asyncio
 
@@ -17,61 +28,349 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Close codes for sessions the server reclaimed; clients reconnect (and resume)
+# when the user is back rather than straight away
+SESSION_EVICTED_CODE = 4000
+SESSION_IDLE_CODE = 4001
+
+# Where the SQLite stores live unless DATA_DIR (or a per-store *_PATH) says otherwise
+DEFAULT_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
 class ConnectionManager:
     def __init__(self):
         self.chat_connections: Dict[str, WebSocket] = {}
-        self.discussion_bots: Dict[str, PhilosophicalDiscussionBot] = {}
-        self.graphs: Dict[str, QuestionGraph] = {}
+        self.discussion_bots: Dict[str, AsyncPhilosophicalDiscussionBot] = {}
+        self.graphs: Dict[str, AsyncQuestionGraph] = {}
+        # Graph version each client last received
+        self.graph_versions: Dict[str, int] = {}
         self.api_key = os.getenv('OPENAI_API_KEY')
+        self.graph_build_concurrency = int(os.getenv('GRAPH_BUILD_CONCURRENCY', '4'))
+        self.graph_num_nodes = int(os.getenv('GRAPH_NUM_NODES', '10'))
+        # Lazy sessions start from the central question alone and grow the
+        # graph around the discussion instead of building it up front
+        self.graph_lazy = os.getenv('GRAPH_LAZY', '0') == '1'
+        self.graph_watchers: Dict[str, asyncio.Task] = {}
+        # Each connection's in-flight work, cancelled when it goes away. Past
+        # the build deadline a session starts from the nodes built so far,
+        # and a turn past its deadline is cut short with an error frame
+        self.scopes: Dict[str, SessionScope] = {}
+        self.graph_build_deadline = float(os.getenv('GRAPH_BUILD_DEADLINE', '120')) or None
+        self.turn_deadline = float(os.getenv('TURN_DEADLINE', '60')) or None
+        # The SQLite stores and the warm pool are opened by open_stores() at
+        # startup, so importing this module touches no files
+        self.data_dir = os.getenv('DATA_DIR', DEFAULT_DATA_DIR)
+        self.graph_cache: Optional[GraphCache] = None
+        self.response_cache: Optional[ResponseCache] = None
+        self.session_store: Optional[SessionStore] = None
+        self.prewarmer: Optional[GraphPrewarmer] = None
+        self.session_tokens: Dict[str, str] = {}
+        # Live sessions are capped in number and estimated memory, least
+        # recently used first, and sockets silent for too long are closed
+        memory_budget_mb = os.getenv('SESSION_MEMORY_BUDGET_MB')
+        idle_timeout = float(os.getenv('SESSION_IDLE_TIMEOUT', '1800'))
+        self.sessions = SessionTracker(
+            max_sessions=int(os.getenv('SESSION_MAX_LIVE', '500')),
+            memory_budget=int(float(memory_budget_mb) * 2**20) if memory_budget_mb else None,
+            idle_timeout=idle_timeout or None
+        )
+        rank_margin = os.getenv('NEXT_QUESTION_RANK_MARGIN', '0.25')
+        self.bot_options = {
+            "history_turns": int(os.getenv('SESSION_HISTORY_TURNS', '50')),
+            "history_tokens": int(os.getenv('SESSION_HISTORY_TOKENS', '8000')),
+            # One structured call per turn instead of three
+            "fast_turns": os.getenv('FAST_TURNS', '0') == '1',
+            # Lead the best child question needs to be picked without a completion; empty always asks the model
+            "rank_margin": float(rank_margin) if rank_margin else None
+        }
+        # Turns and live graph builds in progress; the warm pool only refills while there are none
+        self.active_turns = 0
+        # Session GC, warm pool and idle reaper, run from startup until shutdown
+        self.background_tasks: List[asyncio.Task] = []
+
+    def _data_path(self, variable: str, filename: str) -> str:
+        return os.getenv(variable) or os.path.join(self.data_dir, filename)
+
+    def open_stores(self):
+        """Open the graph cache, response cache and session store, and the warm pool filling the graph cache"""
+        if self.graph_cache is not None:
+            return
+        os.makedirs(self.data_dir, exist_ok=True)
+        self.graph_cache = GraphCache(
+            path=self._data_path('GRAPH_CACHE_PATH', 'graph_cache.sqlite3'),
+            ttl=float(os.getenv('GRAPH_CACHE_TTL', str(7 * 24 * 3600)))
+        )
+        # Completions for byte-identical requests are shared across sessions
+        self.response_cache = ResponseCache(path=self._data_path('RESPONSE_CACHE_PATH', 'response_cache.sqlite3'))
+        # Sessions are snapshotted after every turn so a reconnect can resume them
+        self.session_store = SessionStore(
+            path=self._data_path('SESSION_STORE_PATH', 'sessions.sqlite3'),
+            ttl=float(os.getenv('SESSION_TTL', str(24 * 3600)))
+        )
+        seed_questions = [question.strip() for question in os.getenv('WARM_POOL_QUESTIONS', 'What is knowledge?').split('|') if question.strip()]
+        self.prewarmer = GraphPrewarmer(
+            self.graph_cache,
+            seed_questions,
+            build=self._build_graph,
+            open_session=self._open_graph,
+            num_nodes=self.graph_num_nodes,
+            pool_size=int(os.getenv('WARM_POOL_SIZE', '2')),
+            min_interval=float(os.getenv('WARM_POOL_INTERVAL', '5')),
+            is_busy=lambda: self.active_turns > 0,
+            cache_params=self._graph_cache_params
+        )
+
+    def _graph_cache_params(self) -> Dict[str, str]:
+        """Graph cache key parameters besides num_nodes; graphs built under other values are stale"""
+        return {"model": AsyncQuestionGraph.MODEL, "prompt": prompts.fingerprint("generate_question")}
 
     def get_graph_data(self, client_id: str) -> dict:
         """Convert the graph structure to visualization format"""
-        question_graph = self.graphs[client_id]
-        nodes = []
-        edges = []
-        
-        # Add nodes with summaries
-        for i, (question, details) in enumerate(question_graph.graph.items()):
-            nodes.append({
-                "summary": details['summary'],
-                "question": question
-            })
-        
-        # Add edges
-        node_to_id = {question: i for i, question in enumerate(question_graph.graph.keys())}
-        for question, details in question_graph.graph.items():
-            source_id = node_to_id[question]
-            for connected_question in details['questions']:
-                target_id = node_to_id[connected_question]
-                edges.append({
-                    "source": source_id,
-                    "target": target_id
-                })
-        
+        return self._graph_data_frame(self.graphs[client_id])
+
+    @timed("graph_data")
+    def _graph_data_frame(self, question_graph: AsyncQuestionGraph) -> dict:
+        snapshot = question_graph.snapshot()
         return {
             "type": "graph_data",
+            "version": snapshot["version"],
+            "data": {
+                "nodes": snapshot["nodes"],
+                "edges": snapshot["edges"]
+            }
+        }
+
+    @timed("graph_patch")
+    def _graph_patch_frame(self, question_graph: AsyncQuestionGraph, since_version: int) -> Optional[dict]:
+        """A graph_patch frame with the nodes and edges added after since_version, or None if unavailable"""
+        changes = question_graph.changes_since(since_version)
+        if changes is None:
+            return None
+        return {
+            "type": "graph_patch",
+            "from_version": since_version,
+            "version": question_graph.version,
             "data": {
-                "nodes": nodes,
-                "edges": edges
+                "nodes": [change["node"] for change in changes],
+                "edges": [change["edge"] for change in changes]
             }
         }
 
+    async def send_graph_update(self, client_id: str, question_graph: Optional[AsyncQuestionGraph] = None, full: bool = False):
+        """
+        Bring the client's view of the graph up to date: a graph_patch when the
+        version it holds can be bridged from the change log, otherwise (or when
+        full is set) a graph_data snapshot. Nothing is sent if it is current.
+        """
+        question_graph = question_graph or self.graphs[client_id]
+        known_version = self.graph_versions.get(client_id)
+        if known_version == question_graph.version and not full:
+            return
+        frame = None
+        if known_version is not None and not full:
+            frame = self._graph_patch_frame(question_graph, known_version)
+        if frame is None:
+            frame = self._graph_data_frame(question_graph)
+        self.graph_versions[client_id] = question_graph.version
+        await self.chat_connections[client_id].send_json(frame)
+
+    async def _build_with_patches(self, client_id: str, question_graph: AsyncQuestionGraph) -> None:
+        """
+        Build the initial graph, sending each node to the client as a patch as
+        soon as it is added. A build still running at the build deadline is
+        stopped, leaving the nodes added so far.
+        """
+        changed = asyncio.Event()
+        question_graph.change_listeners.append(changed.set)
+        build = asyncio.create_task(question_graph.initialize_graph(self.graph_num_nodes, self.graph_build_concurrency))
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.graph_build_deadline if self.graph_build_deadline is not None else None
+        waiter = None
+        try:
+            await self.send_graph_update(client_id, question_graph, full=True)
+            while not build.done():
+                waiter = asyncio.create_task(changed.wait())
+                timeout = max(0.0, deadline - loop.time()) if deadline is not None else None
+                await asyncio.wait({build, waiter}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                waiter.cancel()
+                changed.clear()
+                if not build.done() and deadline is not None and loop.time() >= deadline:
+                    print(f"Graph build for {client_id} passed its deadline with {len(question_graph.core)} nodes")
+                    metrics.count("deadlines_total", stage="build_graph")
+                    build.cancel()
+                    # Let cancelled requests release their reserved child slots
+                    await asyncio.gather(build, return_exceptions=True)
+                    await self.send_graph_update(client_id, question_graph)
+                    return
+                await self.send_graph_update(client_id, question_graph)
+            await build
+        finally:
+            build.cancel()
+            if waiter is not None:
+                waiter.cancel()
+            question_graph.change_listeners.remove(changed.set)
+
+    async def _build_graph(self, question: str) -> AsyncQuestionGraph:
+        """Build a graph with no client watching, for the warm pool"""
+        with llm_work("background", "warm_pool"):
+            return await AsyncQuestionGraph.build_async(
+                self.api_key,
+                question,
+                num_nodes=self.graph_num_nodes,
+                max_concurrency=self.graph_build_concurrency,
+                response_cache=self.response_cache
+            )
+
+    def _open_graph(self, cached: CachedGraph) -> AsyncQuestionGraph:
+        """A session graph writing to its own overlay on top of a shared cached graph"""
+        return AsyncQuestionGraph.from_cached(self.api_key, cached, response_cache=self.response_cache)
+
+    async def _watch_graph(self, client_id: str, question_graph: AsyncQuestionGraph) -> None:
+        """Send nodes added outside a turn (e.g. by prefetching) as they arrive"""
+        changed = asyncio.Event()
+        question_graph.change_listeners.append(changed.set)
+        try:
+            while True:
+                await changed.wait()
+                changed.clear()
+                # Until the first graph_data frame the client gets the full graph anyway
+                if client_id in self.graph_versions:
+                    await self.send_graph_update(client_id, question_graph)
+        except Exception as e:
+            print(f"Error sending graph update: {e}")
+        finally:
+            question_graph.change_listeners.remove(changed.set)
+
+    def _start_graph_watcher(self, client_id: str, question_graph: AsyncQuestionGraph) -> None:
+        if self.graph_lazy:
+            self._stop_graph_watcher(client_id)
+            self.graph_watchers[client_id] = asyncio.create_task(self._watch_graph(client_id, question_graph))
+
+    def _stop_graph_watcher(self, client_id: str) -> None:
+        watcher = self.graph_watchers.pop(client_id, None)
+        if watcher is not None:
+            watcher.cancel()
+
     async def connect_chat(self, websocket: WebSocket, client_id: str, initial_question: str):
         """Initialize session with graph and discussion bot"""
         self.chat_connections[client_id] = websocket
+        self.graph_versions.pop(client_id, None)
+        
+        async def build_graph() -> AsyncQuestionGraph:
+            question_graph = AsyncQuestionGraph(api_key=self.api_key, central_question=initial_question, response_cache=self.response_cache)
+            await self._build_with_patches(client_id, question_graph)
+            return question_graph
         
-        # Create graph and discussion bot
-        question_graph = QuestionGraph(api_key=self.api_key, central_question=initial_question)
+        # Create graph and discussion bot. Seed questions come ready from the
+        # warm pool; otherwise finished graphs are shared through the cache
+        if self.graph_lazy:
+            question_graph = AsyncQuestionGraph(api_key=self.api_key, central_question=initial_question, response_cache=self.response_cache)
+        else:
+            question_graph = self.prewarmer.take(initial_question)
+        if question_graph is None:
+            self.active_turns += 1
+            try:
+                with llm_work("setup", client_id):
+                    cached = await self.graph_cache.get_or_build(
+                        initial_question,
+                        build_graph,
+                        num_nodes=self.graph_num_nodes,
+                        **self._graph_cache_params()
+                    )
+            finally:
+                self.active_turns -= 1
+            question_graph = self._open_graph(cached)
         self.graphs[client_id] = question_graph
-        self.discussion_bots[client_id] = PhilosophicalDiscussionBot(question_graph, api_key=self.api_key)
+        self.discussion_bots[client_id] = AsyncPhilosophicalDiscussionBot(question_graph, api_key=self.api_key, response_cache=self.response_cache, prefetch=self.graph_lazy, **self.bot_options)
+        self.session_tokens[client_id] = self.session_store.new_token()
+        self._start_graph_watcher(client_id, question_graph)
+        # Busy until the endpoint has finished setting the session up
+        self.sessions.set_busy(client_id, True)
+        await self.enforce_session_limits(client_id)
+
+    async def resume_chat(self, websocket: WebSocket, client_id: str, resume_token: str) -> bool:
+        """Restore a saved session without any LLM calls. Returns False if there is nothing to resume"""
+        state = await asyncio.to_thread(self.session_store.load, client_id, resume_token)
+        if state is None:
+            return False
+        try:
+            question_graph = AsyncQuestionGraph.from_dict(self.api_key, state["graph"], response_cache=self.response_cache)
+            discussion_bot = AsyncPhilosophicalDiscussionBot.from_dict(question_graph, self.api_key, state["bot"], response_cache=self.response_cache, prefetch=self.graph_lazy, **self.bot_options)
+        except Exception as e:
+            print(f"Error restoring session {client_id}: {e}")
+            return False
+        self.chat_connections[client_id] = websocket
+        self.graph_versions.pop(client_id, None)
+        self.graphs[client_id] = question_graph
+        self.discussion_bots[client_id] = discussion_bot
+        self.session_tokens[client_id] = resume_token
+        self._start_graph_watcher(client_id, question_graph)
+        self.sessions.set_busy(client_id, True)
+        await self.enforce_session_limits(client_id)
+        return True
+
+    async def save_session(self, client_id: str):
+        """Snapshot the session's graph and conversation; the snapshot's size is the session's memory estimate"""
+        if client_id not in self.graphs:
+            return
+        state = {
+            "graph": self.graphs[client_id].to_dict(),
+            "bot": self.discussion_bots[client_id].to_dict()
+        }
+        try:
+            size = await asyncio.to_thread(self.session_store.save, client_id, self.session_tokens[client_id], state)
+        except Exception as e:
+            print(f"Error saving session {client_id}: {e}")
+            return
+        self.sessions.set_size(client_id, size)
+        await self.enforce_session_limits(client_id)
+
+    async def close_session(self, client_id: str, code: int, reason: str):
+        """Drop a live session and close its socket. Its last snapshot stays resumable"""
+        websocket = self.chat_connections.get(client_id)
+        self.disconnect_chat(client_id)
+        metrics.count("sessions_closed_total", reason=reason)
+        if websocket is not None:
+            try:
+                # A half-dead peer never completes the closing handshake
+                await asyncio.wait_for(websocket.close(code=code, reason=reason), timeout=5)
+            except Exception as e:
+                print(f"Error closing session {client_id}: {e}")
+
+    async def enforce_session_limits(self, keep: str):
+        """Evict least recently used sessions (never `keep`) until under the session and memory caps"""
+        for client_id in self.sessions.over_limit(keep=[keep]):
+            self.sessions.evicted += 1
+            await self.close_session(client_id, SESSION_EVICTED_CODE, "evicted")
+
+    async def run_idle_reaper(self):
+        """Close sessions idle for longer than the idle timeout; run as a background task"""
+        if self.sessions.idle_timeout is None:
+            return
+        interval = min(60.0, self.sessions.idle_timeout / 4)
+        while True:
+            await asyncio.sleep(interval)
+            for client_id in self.sessions.idle():
+                self.sessions.reaped += 1
+                await self.close_session(client_id, SESSION_IDLE_CODE, "idle")
 
-    def disconnect_chat(self, client_id: str):
+    def disconnect_chat(self, client_id: str, websocket: Optional[WebSocket] = None):
+        # A reconnect may already have replaced this connection; leave the new one alone
+        if websocket is not None and self.chat_connections.get(client_id) is not websocket:
+            return
         if client_id in self.chat_connections:
             del self.chat_connections[client_id]
+        scope = self.scopes.pop(client_id, None)
+        if scope is not None:
+            scope.cancel()
         if client_id in self.discussion_bots:
+            self.discussion_bots[client_id].cancel_prefetch()
             del self.discussion_bots[client_id]
+        self._stop_graph_watcher(client_id)
         if client_id in self.graphs:
             del self.graphs[client_id]
+        self.graph_versions.pop(client_id, None)
+        self.session_tokens.pop(client_id, None)
+        self.sessions.discard(client_id)
 
     async def send_typing_indicator(self, client_id: str, is_typing: bool):
         if client_id in self.chat_connections:
@@ -80,80 +379,249 @@ class ConnectionManager:
                 "typing": is_typing
             })
 
+    async def stream_message(self, client_id: str, deltas: AsyncIterator[str], prefix: str = "") -> str:
+        """
+        Forward a streamed reply as message_delta frames followed by a single
+        message_done frame carrying the full text. Returns the full text.
+        """
+        websocket = self.chat_connections[client_id]
+        parts = []
+        if prefix:
+            parts.append(prefix)
+            await websocket.send_json({"type": "message_delta", "delta": prefix})
+        first_token = True
+        try:
+            async for delta in deltas:
+                if first_token:
+                    # The reply itself now shows progress
+                    await self.send_typing_indicator(client_id, False)
+                    first_token = False
+                parts.append(delta)
+                await websocket.send_json({"type": "message_delta", "delta": delta})
+        except asyncio.CancelledError:
+            # Cut short by the turn deadline; close off what the client already has
+            if parts and client_id in self.chat_connections:
+                await websocket.send_json({"type": "message_done", "message": "".join(parts), "partial": True})
+            raise
+        message = "".join(parts)
+        await websocket.send_json({"type": "message_done", "message": message})
+        return message
+
+    async def read_frames(self, client_id: str, websocket: WebSocket, scope: SessionScope, frames: asyncio.Queue):
+        """
+        Receive the client's frames into `frames` while the endpoint is busy,
+        so a disconnect cancels the session's work straight away. The
+        exception that ended the connection is queued last.
+        """
+        try:
+            while True:
+                frames.put_nowait(await websocket.receive_json())
+        except Exception as e:
+            if isinstance(e, WebSocketDisconnect):
+                scope.cancel()
+                self.disconnect_chat(client_id, websocket)
+            frames.put_nowait(e)
+
+    async def send_deadline_error(self, client_id: str, stage: str):
+        print(f"{stage} for {client_id} passed its deadline")
+        metrics.count("deadlines_total", stage=stage)
+        if client_id in self.chat_connections:
+            await self.chat_connections[client_id].send_json({
+                "type": "error",
+                "message": "This is taking longer than expected; please try again"
+            })
+
 manager = ConnectionManager()
+# Per-turn trace spans are kept for the last few turns
+metrics.tracing = os.getenv('METRICS_TRACES', '1') == '1'
+
+@app.on_event("startup")
+async def start_background_tasks():
+    manager.open_stores()
+    manager.background_tasks = [
+        asyncio.create_task(manager.session_store.run_garbage_collector()),
+        asyncio.create_task(manager.prewarmer.run()),
+        asyncio.create_task(manager.run_idle_reaper())
+    ]
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    for task in manager.background_tasks:
+        task.cancel()
+    await asyncio.gather(*manager.background_tasks, return_exceptions=True)
+    manager.background_tasks = []
+
+@app.get("/metrics")
+async def get_metrics(format: str = "prometheus", traces: bool = False):
+    """Stage latencies, token counts, retries and cache hits; format=json adds p50/p99 and optional traces"""
+    if format == "json":
+        return metrics.snapshot(traces=traces)
+    return PlainTextResponse(metrics.render_prometheus())
+
+@app.get("/warm_pool")
+async def warm_pool_stats():
+    return manager.prewarmer.stats()
+
+@app.get("/sessions")
+async def session_stats():
+    return manager.sessions.stats()
+
+@app.get("/llm_queue")
+async def llm_queue_stats():
+    """In-flight LLM calls, and queue depth and wait times per work class"""
+    return get_gateway(manager.api_key).scheduler.stats()
 
 @app.websocket("/ws/chat/{client_id}")
 async def chat_websocket_endpoint(websocket: WebSocket, client_id: str):
+    # LLM work for this connection runs in its scope, which is cancelled as
+    # soon as the reader sees the client go
+    scope = SessionScope()
+    frames: asyncio.Queue = asyncio.Queue()
+    reader = None
     try:
         await websocket.accept()
         
         # Wait for initial question
         initial_data = await websocket.receive_json()
         initial_question = initial_data.get('message', "What is knowledge?")
+        # Clients that understand message_delta / message_done frames opt in
+        stream = bool(initial_data.get('stream', False))
+        manager.scopes[client_id] = scope
+        reader = asyncio.create_task(manager.read_frames(client_id, websocket, scope, frames))
         
-        # Initialize chat and create graph
-        await manager.connect_chat(websocket, client_id, initial_question)
-        
-        # Send graph data
-        graph_data = manager.get_graph_data(client_id)
-        await websocket.send_json(graph_data)
+        # Resume a saved session if the client holds its token, otherwise
+        # initialize chat and create graph
+        resume_token = initial_data.get('resume_token')
+        resumed = bool(resume_token) and await scope.run(manager.resume_chat(websocket, client_id, resume_token))
+        if not resumed:
+            await scope.run(manager.connect_chat(websocket, client_id, initial_question))
         
         # Get discussion bot
         discussion_bot = manager.discussion_bots[client_id]
         
-        # Start discussion
-        await manager.send_typing_indicator(client_id, True)
-        opening_message = discussion_bot.start_discussion()
-        await websocket.send_json({
-            "type": "message",
-            "message": opening_message
-        })
-        await manager.send_typing_indicator(client_id, False)
+        session_frame = {
+            "type": "session",
+            "resume_token": manager.session_tokens[client_id],
+            "resumed": resumed
+        }
+        if resumed:
+            session_frame["history"] = discussion_bot.conversation_history.to_list()
+        await websocket.send_json(session_frame)
+        
+        # Send graph data: a patch if the nodes were already streamed during
+        # the build, a full snapshot otherwise
+        await manager.send_graph_update(client_id)
+        
+        if resumed:
+            # Pick up think-time prefetching where the saved session left off
+            with llm_work("background", client_id):
+                discussion_bot.start_prefetch()
+        else:
+            # Start discussion
+            await manager.send_typing_indicator(client_id, True)
+            
+            async def start_discussion():
+                with llm_work("interactive", client_id):
+                    if stream:
+                        await manager.stream_message(client_id, discussion_bot.stream_discussion())
+                    else:
+                        opening_message = await discussion_bot.start_discussion()
+                        await websocket.send_json({
+                            "type": "message",
+                            "message": opening_message
+                        })
+            
+            try:
+                await scope.run(start_discussion(), deadline=manager.turn_deadline)
+            except asyncio.TimeoutError:
+                await manager.send_deadline_error(client_id, "opening_message")
+            await manager.send_typing_indicator(client_id, False)
+            await manager.save_session(client_id)
+        manager.sessions.set_busy(client_id, False)
         
         while True:
-            data = await websocket.receive_json()
+            data = await frames.get()
+            if isinstance(data, Exception):
+                raise data
+            manager.sessions.touch(client_id)
+            
+            if data["type"] == "graph_sync":
+                # The client lost track of the graph version; resend everything
+                await manager.send_graph_update(client_id, full=True)
             
-            if data["type"] == "message":
+            elif data["type"] == "message":
                 user_message = data["message"]
                 
                 await manager.send_typing_indicator(client_id, True)
                 
-                # Process message
-                bot_response = discussion_bot.process_user_response(user_message)
+                # Process message: question selection, the reply and the
+                # equilibrium check run as one dependency graph
+                stream_response = (lambda deltas: manager.stream_message(client_id, deltas)) if stream else None
+                turn = discussion_bot.plan_turn(user_message, stream_response=stream_response)
                 
-                # Check for equilibrium
-                if discussion_bot.check_equilibrium():
-                    summary = discussion_bot.get_summary()
-                    await websocket.send_json({
-                        "type": "message",
-                        "message": bot_response
-                    })
+                async def send_response(results):
+                    if not stream:
+                        await websocket.send_json({
+                            "type": "message",
+                            "message": results["response"]
+                        })
+                
+                async def send_summary(results):
                     await asyncio.sleep(1)
-                    await websocket.send_json({
-                        "type": "message",
-                        "message": f"\n\nDiscussion Summary:\n{summary}"
-                    })
+                    if stream:
+                        await manager.stream_message(
+                            client_id,
+                            results["summary"],
+                            prefix="\n\nDiscussion Summary:\n"
+                        )
+                    else:
+                        await websocket.send_json({
+                            "type": "message",
+                            "message": f"\n\nDiscussion Summary:\n{results['summary']}"
+                        })
                     await websocket.send_json({
                         "type": "discussion_ended",
                         "message": "Discussion has reached equilibrium"
                     })
-                else:
-                    await websocket.send_json({
-                        "type": "message",
-                        "message": bot_response
-                    })
+                
+                async def run_turn():
+                    with metrics.stage("turn"), metrics.trace(f"turn {client_id}"), llm_work("interactive", client_id):
+                        await turn.run()
+                
+                turn.add_step("send_response", send_response, depends_on=["response"])
+                turn.add_step("send_summary", send_summary, depends_on=["send_response", "summary"], when=lambda results: results["equilibrium"])
+                manager.active_turns += 1
+                manager.sessions.set_busy(client_id, True)
+                try:
+                    await scope.run(run_turn(), deadline=manager.turn_deadline)
+                except asyncio.TimeoutError:
+                    # Whatever the turn finished is kept; the user can try again
+                    await manager.send_deadline_error(client_id, "turn")
+                finally:
+                    manager.active_turns -= 1
+                
+                # The turn may have expanded the graph
+                await manager.send_graph_update(client_id)
                 
                 await manager.send_typing_indicator(client_id, False)
+                await manager.save_session(client_id)
+                manager.sessions.set_busy(client_id, False)
                 
-    except WebSocketDisconnect:
-        manager.disconnect_chat(client_id)
+    except (WebSocketDisconnect, ScopeCancelled):
+        manager.disconnect_chat(client_id, websocket)
     except Exception as e:
         print(f"Error in chat WebSocket connection: {e}")
         await websocket.send_json({
             "type": "error",
             "message": "An error occurred in the discussion"
         })
-        manager.disconnect_chat(client_id)
+        manager.disconnect_chat(client_id, websocket)
+    finally:
+        scope.cancel()
+        if reader is not None:
+            reader.cancel()
+        if manager.scopes.get(client_id) is scope:
+            del manager.scopes[client_id]
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,225 @@
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+# Upper bounds in seconds; LLM calls land between a few hundred ms and tens of seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 80.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+_current_stage: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_stage", default=None)
+_current_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("current_trace", default=None)
+
+def _labels(**labels: Any) -> Labels:
+    return tuple(sorted((key, "" if value is None else str(value)) for key, value in labels.items()))
+
+def _json_bound(value: Optional[float]) -> Any:
+    return "+Inf" if value == float("inf") else value
+
+def _format_labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{key}="{value}"' for key, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-th observation"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+class Trace:
+    """Timed spans of the stages run while handling one turn"""
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.monotonic()
+        self.spans: List[Dict[str, Any]] = []
+
+    def add_span(self, stage: str, started: float, seconds: float, error: bool) -> None:
+        self.spans.append({
+            "stage": stage,
+            "start": round(started - self.started, 6),
+            "seconds": round(seconds, 6),
+            "error": error
+        })
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"name": self.name, "seconds": round(time.monotonic() - self.started, 6), "spans": self.spans}
+
+class Metrics:
+    """
+    In-process registry of stage latencies and LLM usage.
+
+    Stages are timed with stage() or the timed() decorator. LLM token counts
+    and retries reported by the gateway are attributed to the innermost stage
+    running at the time, through a context variable, so they carry the same
+    labels. Per-turn traces collect every stage span run under trace().
+    """
+    def __init__(self, prefix: str = "philosophiser", max_traces: int = 100):
+        self.prefix = prefix
+        self.histograms: Dict[Labels, Histogram] = {}
+        self.counters: Dict[str, Dict[Labels, float]] = {}
+        self.traces: Deque[Dict[str, Any]] = deque(maxlen=max_traces)
+        self.tracing = True
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float, model: Optional[str] = None) -> None:
+        labels = _labels(stage=stage, model=model)
+        with self._lock:
+            histogram = self.histograms.get(labels)
+            if histogram is None:
+                histogram = self.histograms[labels] = Histogram()
+            histogram.observe(seconds)
+
+    def count(self, name: str, amount: float = 1, **labels: Any) -> None:
+        key = _labels(**labels)
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def record(self, stage: str, started: float, seconds: float, model: Optional[str] = None, error: bool = False) -> None:
+        """Observe a finished stage and add it to the current trace, if any"""
+        self.observe(stage, seconds, model)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_span(stage, started, seconds, error)
+
+    @staticmethod
+    def current_stage() -> Optional[str]:
+        return _current_stage.get()
+
+    @contextmanager
+    def stage(self, name: str, model: Optional[str] = None) -> Iterator[None]:
+        token = _current_stage.set(name)
+        started = time.monotonic()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            self.count("stage_errors_total", stage=name, model=model)
+            raise
+        finally:
+            _current_stage.reset(token)
+            self.record(name, started, time.monotonic() - started, model, error)
+
+    @contextmanager
+    def trace(self, name: str) -> Iterator[Optional[Trace]]:
+        """Collect the spans of every stage run in this context (and tasks it starts)"""
+        if not self.tracing:
+            yield None
+            return
+        trace = Trace(name)
+        token = _current_trace.set(trace)
+        try:
+            yield trace
+        finally:
+            _current_trace.reset(token)
+            self.traces.append(trace.to_dict())
+
+    def record_llm_response(self, request: Dict[str, Any], response: Any, seconds: float) -> None:
+        """Gateway response hook"""
+        stage, model = self.current_stage(), request.get("model")
+        self.count("llm_requests_total", stage=stage, model=model)
+        self.count("llm_request_seconds_total", seconds, stage=stage, model=model)
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            self.count("llm_tokens_total", getattr(usage, "prompt_tokens", 0) or 0, stage=stage, model=model, kind="prompt")
+            self.count("llm_tokens_total", getattr(usage, "completion_tokens", 0) or 0, stage=stage, model=model, kind="completion")
+
+    def record_llm_retry(self, request: Dict[str, Any], error: Exception, attempt: int, delay: float) -> None:
+        """Gateway retry hook"""
+        self.count("llm_retries_total", stage=self.current_stage(), model=request.get("model"), error=type(error).__name__)
+
+    def instrument(self, gateway) -> None:
+        gateway.response_hooks.append(self.record_llm_response)
+        gateway.retry_hooks.append(self.record_llm_retry)
+
+    def render_prometheus(self) -> str:
+        lines = []
+        name = f"{self.prefix}_stage_seconds"
+        with self._lock:
+            lines.append(f"# TYPE {name} histogram")
+            for labels, histogram in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                    cumulative += count
+                    le = 'le="%s"' % bound
+                    lines.append(f"{name}_bucket{_format_labels(labels, le)} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+            for counter, series in sorted(self.counters.items()):
+                full_name = f"{self.prefix}_{counter}"
+                lines.append(f"# TYPE {full_name} counter")
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{full_name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self, traces: bool = False) -> Dict[str, Any]:
+        with self._lock:
+            data: Dict[str, Any] = {
+                "stages": [
+                    {
+                        **dict(labels),
+                        "count": histogram.count,
+                        "mean": histogram.sum / histogram.count if histogram.count else None,
+                        "p50": _json_bound(histogram.quantile(0.5)),
+                        "p99": _json_bound(histogram.quantile(0.99))
+                    }
+                    for labels, histogram in sorted(self.histograms.items())
+                ],
+                "counters": {
+                    counter: [{**dict(labels), "value": value} for labels, value in sorted(series.items())]
+                    for counter, series in sorted(self.counters.items())
+                }
+            }
+        if traces:
+            data["traces"] = list(self.traces)
+        return data
+
+metrics = Metrics()
+
+def _model_of(args: tuple) -> Optional[str]:
+    owner = args[0] if args else None
+    return getattr(owner, "model", None) or getattr(owner, "MODEL", None)
+
+def timed(stage: str) -> Callable:
+    """Time every call of a (sync or async) method as `stage`, labelled with its owner's model"""
+    def decorate(func: Callable) -> Callable:
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with metrics.stage(stage, _model_of(args)):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with metrics.stage(stage, _model_of(args)):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
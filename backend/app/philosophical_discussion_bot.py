@@ -1,44 +1,126 @@
 from app.question_graph import QuestionGraph
-from openai import OpenAI
+from app.conversation_history import ConversationHistory
+from app.position_digest import PositionDigest, TokenCounter
+from app.question_ranker import QuestionRanker
+from app.prompt_registry import prompts
+from app.llm_gateway import get_gateway
+from app.llm_scheduler import WorkTag, current_work, llm_work
+from app.metrics import metrics, timed
+from app.response_cache import ResponseCache, async_cached_completion, cached_completion, stream_cached_completion
+from app.turn_orchestrator import BufferedStream, TurnOrchestrator
+import asyncio
 import json
-from typing import Dict, List, Optional
+import time
+from openai import AsyncOpenAI, OpenAI
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+# (next question, reply, equilibrium verdict) from a single fast-turn call
+FastTurn = Tuple[str, str, bool]
 
 class PhilosophicalDiscussionBot:
-    def __init__(self, question_graph, api_key: str, model="gpt-4o"):
+    client_class = OpenAI
+
+    def __init__(self, question_graph, api_key: str, model="gpt-4o", response_cache: Optional[ResponseCache] = None, digest_budget: int = 1500, history_turns: Optional[int] = 50, history_tokens: Optional[int] = 8000, fast_turns: bool = False, rank_margin: Optional[float] = 0.25):
         """
         Initialize the discussion bot with a QuestionGraph instance.
         
         Args:
             question_graph: QuestionGraph instance containing the question space
             api_key: OpenAI API key
+            response_cache: Optional cache for repeated completion requests
+            digest_budget: Token budget for the positions digest sent with the
+                equilibrium check and summary
+            history_turns: Turns of conversation history (and user positions) kept; None keeps all
+            history_tokens: Token limit on the conversation history kept; None for no limit
+            fast_turns: Choose the next question, write the reply and judge equilibrium
+                in one structured call per turn, falling back to separate calls
+                when its answer does not validate
+            rank_margin: How far (as a fraction of the top score) the best child question
+                must lead the runner-up on lexical relevance to be chosen without a
+                completion; None always asks the model
         """
         self.question_graph = question_graph
         self.model = model
-        self.client = OpenAI(api_key=api_key)
-        self.conversation_history = []
+        self.client = get_gateway(api_key).client_for(self.client_class)
+        self.response_cache = response_cache
+        counter = TokenCounter(model)
+        self.history_turns = history_turns
+        self.conversation_history = ConversationHistory(max_turns=history_turns, max_tokens=history_tokens, counter=counter)
         self.current_question = question_graph.central_question
         self.user_positions: Dict[str, str] = {}
-        
+        # Bounded stand-in for user_positions in prompts; updated once per turn
+        self.position_digest = PositionDigest(budget=digest_budget, counter=counter)
+        self.fast_turns = fast_turns
+        self.ranker = QuestionRanker(margin=rank_margin)
+        # Equilibrium verdict that came with the last fast turn, until it is read
+        self._turn_equilibrium: Optional[bool] = None
+
+    def to_dict(self) -> Dict[str, object]:
+        """Serialisable conversation state; the question graph is saved separately."""
+        return {
+            "model": self.model,
+            "conversation_history": self.conversation_history.to_list(),
+            "history_dropped": self.conversation_history.dropped,
+            "current_question": self.current_question,
+            "user_positions": self.user_positions,
+            "position_digest": self.position_digest.to_dict()
+        }
+
+    @classmethod
+    def from_dict(cls, question_graph, api_key: str, data: Dict[str, object], response_cache: Optional[ResponseCache] = None, **options) -> "PhilosophicalDiscussionBot":
+        """Restore a bot saved with to_dict on top of its restored question graph."""
+        bot = cls(question_graph, api_key=api_key, model=data["model"], response_cache=response_cache, **options)
+        bot.conversation_history.extend(data["conversation_history"])
+        bot.conversation_history.dropped += data.get("history_dropped", 0)
+        bot.current_question = data["current_question"]
+        for question, position in data["user_positions"].items():
+            bot._remember_position(question, position)
+        bot.position_digest = PositionDigest.from_dict(data["position_digest"], counter=bot.position_digest.counter)
+        return bot
+
     def start_discussion(self) -> str:
         """Initiates the philosophical discussion."""
         opening_message = self._generate_opening_message()
         self.conversation_history.append({"role": "assistant", "content": opening_message})
         return opening_message
 
-    def _generate_opening_message(self) -> str:
-        print("Generating opening message...")
-        """Generate the opening message using the GPT API."""
-        messages = [
+    def _opening_messages(self) -> List[Dict[str, str]]:
+        """Build the chat messages for the opening message."""
+        return [
             {"role": "system", "content": "You are a philosophical discussion facilitator helping users explore their thoughts on complex questions. Be concise, clear, and thought-provoking."},
             {"role": "user", "content": f"Generate a brief opening message to start a philosophical discussion about '{self.question_graph.central_question}'. Invite the user to share their initial thoughts."}
         ]
-        
-        response = self.client.chat.completions.create(
+
+    @timed("opening_message")
+    def _generate_opening_message(self) -> str:
+        print("Generating opening message...")
+        """Generate the opening message using the GPT API."""
+        content = cached_completion(
+            self.client, self.response_cache, "opening_message",
             model=self.model,
-            messages=messages,
+            messages=self._opening_messages(),
             max_tokens=150
         )
-        return response.choices[0].message.content
+        return content
+
+    def _remember_position(self, question: str, position: str) -> None:
+        """Keep the latest position per question, for the last history_turns questions."""
+        self.user_positions.pop(question, None)
+        self.user_positions[question] = position
+        while self.history_turns is not None and len(self.user_positions) > self.history_turns:
+            del self.user_positions[next(iter(self.user_positions))]
+
+    def _record_user_message(self, user_message: str) -> None:
+        """Store the user's position on the current question."""
+        self._remember_position(self.current_question, user_message)
+        self._turn_equilibrium = None
+        self.position_digest.update(self.current_question, user_message)
+        self.conversation_history.append({"role": "user", "content": user_message})
+
+    def _advance(self, response: str, next_question: str) -> None:
+        """Record the bot's reply and move on to the next question."""
+        self.conversation_history.append({"role": "assistant", "content": response})
+        self.current_question = next_question
 
     def process_user_response(self, user_message: str) -> str:
         print("Processing user response...")
@@ -47,23 +129,71 @@ class PhilosophicalDiscussionBot:
         
         Args:
             user_message: The user's message
-            
+        
         Returns:
             str: Bot's response
         """
         # Store user's position on current question
-        self.user_positions[self.current_question] = user_message
-        self.conversation_history.append({"role": "user", "content": user_message})
+        self._record_user_message(user_message)
         
-        # Analyze response and determine next question
-        next_question = self._determine_next_question(user_message)
-        response = self._generate_discussion_response(user_message, next_question)
+        fast_turn = self._fast_turn(user_message) if self.fast_turns else None
+        if fast_turn is not None:
+            next_question, response, self._turn_equilibrium = fast_turn
+        else:
+            # Analyze response and determine next question
+            next_question = self._determine_next_question(user_message)
+            response = self._generate_discussion_response(user_message, next_question)
         
-        self.conversation_history.append({"role": "assistant", "content": response})
-        self.current_question = next_question
+        self._advance(response, next_question)
         
         return response
 
+    def _prepare_children(self) -> None:
+        """Make sure the current question has child questions to choose from."""
+        # If there are no child questions, generate one for the current question
+        if not self.question_graph.get_children(self.current_question):
+            self.question_graph.expand_question(self.current_question)
+
+    def _next_question_messages(self, user_message: str) -> List[Dict[str, str]]:
+        """Build the chat messages for _determine_next_question."""
+        return [
+            {"role": "system", "content": "You are helping select the next relevant question in a philosophical discussion."},
+            {"role": "user", "content": prompts.render(
+            "determine_next_question",
+            current_question=self.current_question,
+            user_message=user_message,
+            question_list=json.dumps(self.question_graph.get_children(self.current_question), ensure_ascii=False)
+            )}
+        ]
+
+    def _rank_children(self, user_message: str) -> List[Tuple[str, float]]:
+        """The current question's children ranked by lexical relevance to the user's message."""
+        graph = self.question_graph.graph
+        candidates = {
+            child: f"{child} {graph[child]['summary']}"
+            for child in self.question_graph.get_children(self.current_question)
+        }
+        return self.ranker.rank(user_message, candidates)
+
+    def _local_next_question(self, ranking: List[Tuple[str, float]]) -> Optional[str]:
+        """The ranking's clear winner, if there is one, so no completion is needed."""
+        choice = self.ranker.decide(ranking)
+        if choice is not None:
+            metrics.count("next_question_choices_total", model=self.model, source="ranker")
+        return choice
+
+    def _resolve_next_question(self, content: str, ranking: List[Tuple[str, float]]) -> str:
+        """Map the model's choice onto a child question, falling back to the best ranked."""
+        choice = self.ranker.resolve(content, [question for question, _ in ranking])
+        if choice is not None:
+            metrics.count("next_question_choices_total", model=self.model, source="model")
+            return choice
+        print(f"Next question '{content.strip()[:80]}' is not a child of the current question, using the best ranked one")
+        metrics.count("next_question_choices_total", model=self.model, source="fallback")
+        # Without children (expansion failed) stay on the current question
+        return ranking[0][0] if ranking else self.current_question
+
+    @timed("determine_next_question")
     def _determine_next_question(self, user_message: str) -> str:
         print("Determining next question...")
         """
@@ -71,36 +201,39 @@ class PhilosophicalDiscussionBot:
         
         Args:
             user_message: The user's last message
-            
+        
         Returns:
-            str: Next question to discuss
+            str: Next question to discuss, always one of the current question's children
+                (or the current question itself if it has none)
         """
-        # If there are no child questions, generate a new one
-        if not self.question_graph.graph[self.current_question]:
-            self.question_graph.expand_graph()
-            
-        with open('app/prompts/determine_next_question.txt', 'r') as file:
-            prompt_template = file.read()
-        
-        messages = [
-            {"role": "system", "content": "You are helping select the next relevant question in a philosophical discussion."},
-            {"role": "user", "content": prompt_template.format(
-            current_question=self.current_question,
-            user_message=user_message,
-            question_list=self.question_graph.graph[self.current_question]
-            )}
-        ]
-
+        self._prepare_children()
+        ranking = self._rank_children(user_message)
+        choice = self._local_next_question(ranking)
+        if choice is not None:
+            return choice
         
-        
-        response = self.client.chat.completions.create(
+        content = cached_completion(
+            self.client, self.response_cache, "determine_next_question",
             model=self.model,
-            messages=messages,
+            messages=self._next_question_messages(user_message),
             max_tokens=50
         )
         
-        return response.choices[0].message.content.strip()
+        return self._resolve_next_question(content, ranking)
+
+    def _discussion_response_messages(self, user_message: str, next_question: str) -> List[Dict[str, str]]:
+        """Build the chat messages for _generate_discussion_response."""
+        return [
+            {"role": "system", "content": "You are facilitating a philosophical discussion. Respond thoughtfully but concisely to the user's ideas and guide them to the next question."},
+            {"role": "user", "content": prompts.render(
+            "generate_discussion_response",
+            current_question=self.current_question,
+            user_message=user_message,
+            next_question=next_question
+            )}
+        ]
 
+    @timed("discussion_response")
     def _generate_discussion_response(self, user_message: str, next_question: str) -> str:
         print("Generating response...")
         """
@@ -109,30 +242,89 @@ class PhilosophicalDiscussionBot:
         Args:
             user_message: The user's last message
             next_question: The next question to discuss
-            
+        
         Returns:
             str: Generated response
         """
-        with open('app/prompts/generate_discussion_response.txt', 'r') as file:
-            prompt_template = file.read()
+        content = cached_completion(
+            self.client, self.response_cache, "discussion_response",
+            model=self.model,
+            messages=self._discussion_response_messages(user_message, next_question),
+            max_tokens=150
+        )
         
-        messages = [
-            {"role": "system", "content": "You are facilitating a philosophical discussion. Respond thoughtfully but concisely to the user's ideas and guide them to the next question."},
-            {"role": "user", "content": prompt_template.format(
+        return content
+
+    def _fast_turn_messages(self, user_message: str) -> List[Dict[str, str]]:
+        """Build the chat messages for _fast_turn."""
+        return [
+            {"role": "system", "content": "You are running one turn of a philosophical discussion: choose the next question, reply to the user and judge whether they have reached equilibrium. Respond in JSON."},
+            {"role": "user", "content": prompts.render(
+            "fast_turn",
             current_question=self.current_question,
             user_message=user_message,
-            next_question=next_question
+            question_list=json.dumps(self.question_graph.get_children(self.current_question), ensure_ascii=False),
+            user_positions=self.position_digest.text
             )}
         ]
-        
-        response = self.client.chat.completions.create(
+
+    def _parse_fast_turn(self, content: Optional[str]) -> Optional[FastTurn]:
+        """
+        The (next question, reply, equilibrium) in a fast turn answer, or None
+        unless it is well formed and picks one of the current question's children.
+        """
+        try:
+            data = json.loads(content or "")
+        except ValueError:
+            return None
+        if not isinstance(data, dict):
+            return None
+        next_question, reply, equilibrium = data.get("next_question"), data.get("reply"), data.get("equilibrium")
+        if isinstance(equilibrium, str):
+            equilibrium = {"true": True, "false": False}.get(equilibrium.strip().lower())
+        if not isinstance(next_question, str) or not isinstance(reply, str) or not reply.strip() or not isinstance(equilibrium, bool):
+            return None
+        next_question = next_question.strip()
+        if next_question not in self.question_graph.get_children(self.current_question):
+            return None
+        return next_question, reply.strip(), equilibrium
+
+    def _check_fast_turn(self, content: Optional[str]) -> Optional[FastTurn]:
+        fast_turn = self._parse_fast_turn(content)
+        if fast_turn is None:
+            print("Fast turn answer did not validate, falling back to separate calls")
+            metrics.count("fast_turn_fallbacks_total", model=self.model)
+        return fast_turn
+
+    @timed("fast_turn")
+    def _fast_turn(self, user_message: str) -> Optional[FastTurn]:
+        """
+        Choose the next question, write the reply and judge equilibrium in one
+        JSON-mode call. Returns None if the answer does not validate against
+        the graph, in which case the caller makes the separate calls instead.
+        """
+        print("Running fast turn...")
+        self._prepare_children()
+        content = cached_completion(
+            self.client, self.response_cache, "fast_turn",
             model=self.model,
-            messages=messages,
-            max_tokens=150
+            messages=self._fast_turn_messages(user_message),
+            max_tokens=300,
+            response_format={"type": "json_object"}
         )
-        
-        return response.choices[0].message.content
+        return self._check_fast_turn(content)
 
+    def _equilibrium_messages(self) -> List[Dict[str, str]]:
+        """Build the chat messages for check_equilibrium."""
+        return [
+            {"role": "system", "content": "You are analyzing philosophical positions for consistency and depth of understanding."},
+            {"role": "user", "content": prompts.render(
+            "check_equilibrium",
+            user_positions=self.position_digest.text
+            )}
+        ]
+
+    @timed("check_equilibrium")
     def check_equilibrium(self) -> bool:
         print("Checking equilibrium...")
         """
@@ -141,24 +333,29 @@ class PhilosophicalDiscussionBot:
         Returns:
             bool: True if equilibrium reached, False otherwise
         """
-        with open('app/prompts/check_equilibrium.txt', 'r') as file:
-            prompt_template = file.read()
-        
-        messages = [
-            {"role": "system", "content": "You are analyzing philosophical positions for consistency and depth of understanding."},
-            {"role": "user", "content": prompt_template.format(
-            user_positions=json.dumps(self.user_positions, indent=2)
-            )}
-        ]
-        
-        response = self.client.chat.completions.create(
+        if self._turn_equilibrium is not None:
+            # The last fast turn already judged it
+            return self._turn_equilibrium
+        content = cached_completion(
+            self.client, self.response_cache, "check_equilibrium",
             model=self.model,
-            messages=messages,
+            messages=self._equilibrium_messages(),
             max_tokens=10
         )
         
-        return response.choices[0].message.content.lower().strip() == "true"
+        return content.lower().strip() == "true"
+
+    def _summary_messages(self) -> List[Dict[str, str]]:
+        """Build the chat messages for get_summary."""
+        return [
+            {"role": "system", "content": "You are summarizing a philosophical discussion and the development of a user's position."},
+            {"role": "user", "content": prompts.render(
+            "get_summary",
+            user_positions=self.position_digest.text
+            )}
+        ]
 
+    @timed("get_summary")
     def get_summary(self) -> str:
         """
         Generate a summary of the user's philosophical position and journey.
@@ -166,22 +363,290 @@ class PhilosophicalDiscussionBot:
         Returns:
             str: Summary of the discussion and user's position
         """
-        with open('app/prompts/get_summary.txt', 'r') as file:
-            prompt_template = file.read()
+        content = cached_completion(
+            self.client, self.response_cache, "get_summary",
+            model=self.model,
+            messages=self._summary_messages(),
+            max_tokens=200
+        )
         
-        messages = [
-            {"role": "system", "content": "You are summarizing a philosophical discussion and the development of a user's position."},
-            {"role": "user", "content": prompt_template.format(
-            user_positions=json.dumps(self.user_positions, indent=2)
-            )}
-        ]
+        return content
+
+
+class AsyncPhilosophicalDiscussionBot(PhilosophicalDiscussionBot):
+    """
+    PhilosophicalDiscussionBot built on AsyncOpenAI. Every LLM-backed method is
+    a coroutine, so a session's turn never blocks the server's event loop.
+    Pair it with an AsyncQuestionGraph.
+    """
+    client_class = AsyncOpenAI
+
+    def __init__(self, question_graph, api_key: str, model="gpt-4o", response_cache: Optional[ResponseCache] = None, digest_budget: int = 1500, history_turns: Optional[int] = 50, history_tokens: Optional[int] = 8000, fast_turns: bool = False, rank_margin: Optional[float] = 0.25, prefetch: bool = False, prefetch_depth: int = 1):
+        """
+        Args:
+            prefetch: Generate children of the current question in the background
+                while the user is typing, for graphs built lazily around the discussion
+            prefetch_depth: How many levels below the current question to prefetch
+        """
+        super().__init__(question_graph, api_key, model=model, response_cache=response_cache, digest_budget=digest_budget, history_turns=history_turns, history_tokens=history_tokens, fast_turns=fast_turns, rank_margin=rank_margin)
+        self.prefetch = prefetch
+        self.prefetch_depth = prefetch_depth
+        self._prefetch_task: Optional[asyncio.Task] = None
+        self._prefetch_question: Optional[str] = None
+        self._prefetch_work: Optional[WorkTag] = None
+        self._prefetch_ready: Optional[asyncio.Event] = None
+
+    async def _prefetch_around(self, question: str, ready: asyncio.Event, work: WorkTag) -> None:
+        """Fill the children of question, then of each child, down to prefetch_depth levels"""
+        level = [question]
+        try:
+            with llm_work(work):
+                for depth in range(self.prefetch_depth):
+                    await asyncio.gather(*(self.question_graph.fill_children(q) for q in level))
+                    if depth == 0:
+                        ready.set()
+                    level = [child for q in level for child in self.question_graph.get_children(q)]
+        except Exception as e:
+            print(f"Error prefetching questions: {e}")
+        finally:
+            ready.set()
+
+    def start_prefetch(self) -> None:
+        """Start prefetching around the current question, replacing any earlier prefetch."""
+        if not self.prefetch:
+            return
+        self.cancel_prefetch()
+        self._prefetch_question = self.current_question
+        self._prefetch_ready = asyncio.Event()
+        # Background work of the same client until a turn waits on it
+        owner = current_work()
+        self._prefetch_work = WorkTag("background", owner.client_id if owner is not None else None)
+        self._prefetch_task = asyncio.create_task(self._prefetch_around(self.current_question, self._prefetch_ready, self._prefetch_work))
+
+    def cancel_prefetch(self) -> None:
+        if self._prefetch_task is not None:
+            self._prefetch_task.cancel()
+            self._prefetch_task = None
+
+    async def _take_prefetch(self) -> None:
+        """
+        Reuse a prefetch of the current question's children by waiting for
+        them, then cancel whatever is left: deeper levels only pay off for
+        branches the discussion has not chosen yet.
+        """
+        if self._prefetch_task is None:
+            return
+        if self._prefetch_question == self.current_question:
+            waiting = current_work()
+            self._prefetch_work.promote(waiting.work_class if waiting is not None else "interactive")
+            await self._prefetch_ready.wait()
+        self.cancel_prefetch()
+
+    def _advance(self, response: str, next_question: str) -> None:
+        super()._advance(response, next_question)
+        self.start_prefetch()
+
+    async def start_discussion(self) -> str:
+        """Initiates the philosophical discussion."""
+        self.start_prefetch()
+        opening_message = await self._generate_opening_message()
+        self.conversation_history.append({"role": "assistant", "content": opening_message})
+        return opening_message
+
+    @timed("opening_message")
+    async def _generate_opening_message(self) -> str:
+        print("Generating opening message...")
+        content = await async_cached_completion(
+            self.client, self.response_cache, "opening_message",
+            model=self.model,
+            messages=self._opening_messages(),
+            max_tokens=150
+        )
+        return content
+
+    async def process_user_response(self, user_message: str) -> str:
+        print("Processing user response...")
+        self._record_user_message(user_message)
+        
+        fast_turn = await self._fast_turn(user_message) if self.fast_turns else None
+        if fast_turn is not None:
+            next_question, response, self._turn_equilibrium = fast_turn
+        else:
+            next_question = await self._determine_next_question(user_message)
+            response = await self._generate_discussion_response(user_message, next_question)
+        
+        self._advance(response, next_question)
+        
+        return response
+
+    async def _prepare_children(self) -> None:
+        if self.prefetch:
+            # Children of the current question are usually already in from the
+            # prefetch started last turn; otherwise they are generated now
+            await self._take_prefetch()
+            await self.question_graph.fill_children(self.current_question)
+        elif not self.question_graph.get_children(self.current_question):
+            # If there are no child questions, generate one for the current question
+            await self.question_graph.expand_question(self.current_question)
+
+    @timed("determine_next_question")
+    async def _determine_next_question(self, user_message: str) -> str:
+        print("Determining next question...")
+        await self._prepare_children()
+        ranking = self._rank_children(user_message)
+        choice = self._local_next_question(ranking)
+        if choice is not None:
+            return choice
         
-        response = self.client.chat.completions.create(
+        content = await async_cached_completion(
+            self.client, self.response_cache, "determine_next_question",
             model=self.model,
-            messages=messages,
+            messages=self._next_question_messages(user_message),
+            max_tokens=50
+        )
+        
+        return self._resolve_next_question(content, ranking)
+
+    @timed("discussion_response")
+    async def _generate_discussion_response(self, user_message: str, next_question: str) -> str:
+        print("Generating response...")
+        content = await async_cached_completion(
+            self.client, self.response_cache, "discussion_response",
+            model=self.model,
+            messages=self._discussion_response_messages(user_message, next_question),
+            max_tokens=150
+        )
+        
+        return content
+
+    @timed("fast_turn")
+    async def _fast_turn(self, user_message: str) -> Optional[FastTurn]:
+        print("Running fast turn...")
+        await self._prepare_children()
+        content = await async_cached_completion(
+            self.client, self.response_cache, "fast_turn",
+            model=self.model,
+            messages=self._fast_turn_messages(user_message),
+            max_tokens=300,
+            response_format={"type": "json_object"}
+        )
+        return self._check_fast_turn(content)
+
+    @timed("check_equilibrium")
+    async def check_equilibrium(self) -> bool:
+        print("Checking equilibrium...")
+        if self._turn_equilibrium is not None:
+            return self._turn_equilibrium
+        content = await async_cached_completion(
+            self.client, self.response_cache, "check_equilibrium",
+            model=self.model,
+            messages=self._equilibrium_messages(),
+            max_tokens=10
+        )
+        
+        return content.lower().strip() == "true"
+
+    @timed("get_summary")
+    async def get_summary(self) -> str:
+        content = await async_cached_completion(
+            self.client, self.response_cache, "get_summary",
+            model=self.model,
+            messages=self._summary_messages(),
             max_tokens=200
         )
         
-        return response.choices[0].message.content
-    
-    
+        return content
+
+    async def _stream_completion(self, messages: List[Dict[str, str]], max_tokens: int, site: str) -> AsyncIterator[str]:
+        """Yield the content deltas of a streamed completion; site selects its response cache TTL and metrics stage."""
+        started = time.monotonic()
+        first_token = True
+        async for delta in stream_cached_completion(self.client, self.response_cache, site, model=self.model, messages=messages, max_tokens=max_tokens):
+            if first_token:
+                metrics.record(f"{site}.first_token", started, time.monotonic() - started, self.model)
+                first_token = False
+            yield delta
+        metrics.record(site, started, time.monotonic() - started, self.model)
+
+    async def stream_discussion(self) -> AsyncIterator[str]:
+        """Streaming counterpart of start_discussion; yields the opening message token by token."""
+        self.start_prefetch()
+        print("Generating opening message...")
+        parts = []
+        async for delta in self._stream_completion(self._opening_messages(), max_tokens=150, site="opening_message"):
+            parts.append(delta)
+            yield delta
+        self.conversation_history.append({"role": "assistant", "content": "".join(parts)})
+
+    async def stream_summary(self) -> AsyncIterator[str]:
+        """Streaming counterpart of get_summary."""
+        async for delta in self._stream_completion(self._summary_messages(), max_tokens=200, site="get_summary"):
+            yield delta
+
+    def plan_turn(self, user_message: str, stream_response: Optional[Callable[[AsyncIterator[str]], Awaitable[str]]] = None) -> TurnOrchestrator:
+        """
+        Record the user's message and plan the rest of the turn as a dependency graph.
+
+        Steps: next_question -> response, and equilibrium -> summary (only when
+        equilibrium is reached). The equilibrium check only reads user_positions,
+        so it runs alongside question selection, and the summary starts as soon
+        as the verdict arrives. Callers can add steps that depend on these.
+
+        With fast_turns a fast_turn step runs first and next_question, response
+        and equilibrium take their results from it, making their own calls
+        only if its answer did not validate.
+
+        Args:
+            user_message: The user's message
+            stream_response: Optional sink for the reply's deltas, returning the full text.
+                When given, the summary step yields a BufferedStream instead of a string.
+        """
+        self._record_user_message(user_message)
+        turn = TurnOrchestrator()
+        fast_steps = ["fast_turn"] if self.fast_turns else []
+
+        async def fast_turn(results):
+            return await self._fast_turn(user_message)
+
+        async def single_delta(text):
+            yield text
+
+        async def next_question(results):
+            if results.get("fast_turn") is not None:
+                return results["fast_turn"][0]
+            return await self._determine_next_question(user_message)
+
+        async def response(results):
+            if results.get("fast_turn") is not None:
+                text = results["fast_turn"][1]
+                if stream_response is not None:
+                    text = await stream_response(single_delta(text))
+            elif stream_response is None:
+                text = await self._generate_discussion_response(user_message, results["next_question"])
+            else:
+                print("Generating response...")
+                text = await stream_response(self._stream_completion(
+                    self._discussion_response_messages(user_message, results["next_question"]),
+                    max_tokens=150,
+                    site="discussion_response"
+                ))
+            self._advance(text, results["next_question"])
+            return text
+
+        async def equilibrium(results):
+            if results.get("fast_turn") is not None:
+                return results["fast_turn"][2]
+            return await self.check_equilibrium()
+
+        async def summary(results):
+            if stream_response is None:
+                return await self.get_summary()
+            return BufferedStream(self.stream_summary())
+
+        if self.fast_turns:
+            turn.add_step("fast_turn", fast_turn)
+        turn.add_step("next_question", next_question, depends_on=fast_steps)
+        turn.add_step("response", response, depends_on=["next_question"])
+        turn.add_step("equilibrium", equilibrium, depends_on=fast_steps)
+        turn.add_step("summary", summary, depends_on=["equilibrium"], when=lambda results: results["equilibrium"])
+        return turn
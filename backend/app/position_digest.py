@@ -0,0 +1,124 @@
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+try:
+    import tiktoken
+except ImportError:  # Fall back to a character estimate
+    tiktoken = None
+
+class TokenCounter:
+    """Counts and truncates text in model tokens, or in ~4-character units without tiktoken"""
+    CHARS_PER_TOKEN = 4
+
+    def __init__(self, model: str = "gpt-4o"):
+        self.encoding = None
+        if tiktoken is not None:
+            try:
+                self.encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                self.encoding = tiktoken.get_encoding("cl100k_base")
+
+    def count(self, text: str) -> int:
+        if self.encoding is not None:
+            return len(self.encoding.encode(text))
+        return -(-len(text) // self.CHARS_PER_TOKEN)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if self.count(text) <= max_tokens:
+            return text
+        # Leave a token for the ellipsis
+        keep = max(0, max_tokens - 1)
+        if self.encoding is not None:
+            return self.encoding.decode(self.encoding.encode(text)[:keep]).rstrip() + "..."
+        return text[:keep * self.CHARS_PER_TOKEN].rstrip() + "..."
+
+class PositionDigest:
+    """
+    Bounded digest of a user's positions, one entry per question.
+
+    Each turn adds or replaces a single entry. While the rendered digest is
+    over `budget` tokens, older entries are shortened to `entry_tokens` and
+    then the oldest are dropped, so the digest (and every prompt built from
+    it) stops growing after a few turns. The most recent answer is always
+    kept, truncated to the budget if it alone exceeds it.
+    """
+    def __init__(self, budget: int = 1500, entry_tokens: int = 60, counter: Optional[TokenCounter] = None):
+        self.budget = budget
+        self.entry_tokens = entry_tokens
+        self.counter = counter or TokenCounter()
+        self.entries: "OrderedDict[str, str]" = OrderedDict()
+        self.entry_costs: Dict[str, int] = {}
+        self.shortened = set()
+        self.omitted = 0
+        self.tokens = 0
+        self.text = ""
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @staticmethod
+    def _format(question: str, position: str) -> str:
+        return f"Q: {question}\nA: {position}"
+
+    def _set(self, question: str, position: str) -> None:
+        if question in self.entries:
+            self.tokens -= self.entry_costs[question]
+        self.entries[question] = position
+        self.entry_costs[question] = self.counter.count(self._format(question, position))
+        self.tokens += self.entry_costs[question]
+
+    def _forget(self, question: str) -> None:
+        del self.entries[question]
+        self.tokens -= self.entry_costs.pop(question)
+        self.shortened.discard(question)
+
+    def _drop_oldest(self) -> None:
+        self._forget(next(iter(self.entries)))
+        self.omitted += 1
+
+    def update(self, question: str, position: str) -> None:
+        """Record the user's latest position on a question and re-fit the digest to the budget"""
+        if question in self.entries:
+            # Re-answered questions move to the newest position
+            self._forget(question)
+        self._set(question, position)
+
+        latest = question
+        if self.tokens > self.budget:
+            for older in list(self.entries):
+                if self.tokens <= self.budget:
+                    break
+                if older != latest and older not in self.shortened:
+                    self._set(older, self.counter.truncate(self.entries[older], self.entry_tokens))
+                    self.shortened.add(older)
+        while self.tokens > self.budget and len(self.entries) > 1:
+            self._drop_oldest()
+        if self.tokens > self.budget:
+            self._set(latest, self.counter.truncate(position, max(1, self.budget - self.counter.count(self._format(latest, "")))))
+        self.text = self._render()
+
+    def _render(self) -> str:
+        lines = []
+        if self.omitted:
+            lines.append(f"({self.omitted} earlier positions omitted)")
+        lines.extend(self._format(question, position) for question, position in self.entries.items())
+        return "\n\n".join(lines)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "budget": self.budget,
+            "entry_tokens": self.entry_tokens,
+            "entries": list(self.entries.items()),
+            "shortened": sorted(self.shortened),
+            "omitted": self.omitted
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], counter: Optional[TokenCounter] = None) -> "PositionDigest":
+        digest = cls(data["budget"], data["entry_tokens"], counter)
+        for question, position in data["entries"]:
+            digest._set(question, position)
+        digest.shortened = set(data["shortened"])
+        digest.omitted = data["omitted"]
+        digest.text = digest._render()
+        return digest
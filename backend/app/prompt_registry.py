@@ -0,0 +1,110 @@
+import hashlib
+import os
+import time
+from string import Formatter
+from typing import Dict, FrozenSet, Iterable, Tuple
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROMPT_DIR = os.path.join(PACKAGE_DIR, "prompts")
+
+class PromptTemplate:
+    def __init__(self, name: str, path: str, text: str, mtime: float):
+        self.name = name
+        self.path = path
+        self.text = text
+        self.mtime = mtime
+        self.placeholders: FrozenSet[str] = frozenset(
+            field_name for _, field_name, _, _ in Formatter().parse(text) if field_name
+        )
+
+    def render(self, **kwargs) -> str:
+        return self.text.format(**kwargs)
+
+class PromptRegistry:
+    """
+    Loads prompt templates once and serves them from memory.
+
+    Each prompt is registered with the placeholders its call site supplies;
+    a template using any other {placeholder} is rejected at load time. Files
+    are re-read only when their mtime changes, and mtimes are checked at most
+    once per reload_interval seconds, so rendering a prompt normally does no
+    disk I/O.
+    """
+    def __init__(self, prompt_dir: str, specs: Dict[str, Tuple[str, Iterable[str]]], reload_interval: float = 2.0):
+        """
+        Args:
+            prompt_dir: Directory containing the template files; relative paths
+                are resolved against the app package, not the working directory
+            specs: Prompt name -> (filename, placeholders supplied by the call site)
+            reload_interval: Minimum seconds between mtime checks
+        """
+        self.prompt_dir = os.path.join(PACKAGE_DIR, prompt_dir)
+        self.specs = {name: (filename, frozenset(fields)) for name, (filename, fields) in specs.items()}
+        self.reload_interval = reload_interval
+        self.templates: Dict[str, PromptTemplate] = {}
+        self._last_check = 0.0
+        self.load()
+
+    def _read(self, name: str) -> PromptTemplate:
+        filename, expected = self.specs[name]
+        path = os.path.join(self.prompt_dir, filename)
+        mtime = os.path.getmtime(path)
+        with open(path, 'r') as file:
+            template = PromptTemplate(name, path, file.read().strip(), mtime)
+
+        unknown = sorted(template.placeholders - expected)
+        if unknown:
+            raise ValueError(f"Prompt {name} ({path}) uses placeholders its call site does not supply: {unknown}")
+        unused = sorted(expected - template.placeholders)
+        if unused:
+            print(f"Warning: prompt {name} ignores supplied values {unused}")
+        return template
+
+    def load(self) -> None:
+        """Load and validate every registered template"""
+        try:
+            self.templates = {name: self._read(name) for name in self.specs}
+        except Exception as e:
+            raise Exception(f"Error loading prompts: {e}")
+        self._last_check = time.monotonic()
+
+    def _reload_changed(self) -> None:
+        """Re-read templates whose file mtime changed, keeping the old version if the new one is invalid"""
+        for name, template in list(self.templates.items()):
+            try:
+                if os.path.getmtime(template.path) != template.mtime:
+                    self.templates[name] = self._read(name)
+            except Exception as e:
+                print(f"Warning: keeping previous prompt {name}: {e}")
+
+    def get(self, name: str) -> PromptTemplate:
+        now = time.monotonic()
+        if self.reload_interval >= 0 and now - self._last_check >= self.reload_interval:
+            self._last_check = now
+            self._reload_changed()
+        return self.templates[name]
+
+    def __getitem__(self, name: str) -> str:
+        return self.get(name).text
+
+    def render(self, name: str, **kwargs) -> str:
+        return self.get(name).render(**kwargs)
+
+    def fingerprint(self, *names: str) -> str:
+        """Short hash of the named templates' current text, so cache keys change when a prompt does"""
+        digest = hashlib.sha256()
+        for name in names:
+            digest.update(self.get(name).text.encode("utf-8"))
+        return digest.hexdigest()[:16]
+
+# Templates used by QuestionGraph, PhilosophicalDiscussionBot and batched
+# DialecticalGraph checks, loaded at import
+prompts = PromptRegistry(PROMPT_DIR, {
+    "generate_question": ("generate_question.txt", {"random_question", "central_question", "context"}),
+    "determine_next_question": ("determine_next_question.txt", {"current_question", "user_message", "question_list"}),
+    "generate_discussion_response": ("generate_discussion_response.txt", {"current_question", "user_message", "next_question"}),
+    "check_equilibrium": ("check_equilibrium.txt", {"user_positions"}),
+    "get_summary": ("get_summary.txt", {"user_positions"}),
+    "batch_requests": ("batch_requests.txt", {"count", "requests"}),
+    "fast_turn": ("fast_turn.txt", {"current_question", "user_message", "question_list", "user_positions"}),
+})
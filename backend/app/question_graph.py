@@ -1,17 +1,105 @@
-import random
-from openai import OpenAI
-from typing import Dict, List, Tuple
+import asyncio
+from collections import deque
+from itertools import islice
+from openai import AsyncOpenAI, OpenAI
+from app.graph_core import GraphCore, GraphView
+from app.prompt_registry import prompts
+from app.llm_gateway import get_gateway
+from app.llm_scheduler import llm_work
+from app.metrics import timed
+from app.response_cache import ResponseCache, async_cached_completion, cached_completion
+from app.similarity_index import QuestionSimilarityIndex
+from typing import TYPE_CHECKING, Callable, Deque, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from app.graph_cache import CachedGraph
 
 class QuestionGraph:
-    def __init__(self, api_key: str, central_question: str = "What is knowledge?", num_nodes: int = 10):
-        self.client = OpenAI(api_key=api_key)
-        self.graph: Dict[str, Dict[str, any]] = {}
+    MAX_CHILDREN = 3  # Limit connections per node
+    CHANGE_LOG_LIMIT = 500  # Versions a client can lag behind and still get a patch
+    MODEL = "gpt-4-0125-preview"
+    client_class = OpenAI
+
+    def __init__(self, api_key: str, central_question: str = "What is knowledge?", num_nodes: int = 10, build: bool = True, duplicate_threshold: Optional[float] = 0.65, response_cache: Optional[ResponseCache] = None):
+        """
+        Args:
+            duplicate_threshold: Similarity above which a generated question counts as a
+                rephrasing of an existing one and is rejected; None disables the check
+            response_cache: Optional cache for repeated completion requests
+        """
+        # Shared across sessions: one connection pool, rate limits and retries
+        self.client = get_gateway(api_key).client_for(self.client_class)
+        self.response_cache = response_cache
         self.central_question = central_question
-        self.graph[self.central_question] = {"summary": "", "questions": []}
+        self.core = GraphCore(central_question, "", self.MAX_CHILDREN)
+        # Node ids follow insertion order; every insert bumps the version and
+        # is logged so clients can be sent just the changes. Only the latest
+        # CHANGE_LOG_LIMIT are kept; clients further behind get the full graph
+        self.version = 0
+        self.log_start_version = 0
+        self.change_log: Deque[Dict[str, any]] = deque(maxlen=self.CHANGE_LOG_LIMIT)
+        self.change_listeners: List[Callable[[], None]] = []
+        self.similarity_index: Optional[QuestionSimilarityIndex] = None
+        if duplicate_threshold is not None:
+            self.similarity_index = QuestionSimilarityIndex(threshold=duplicate_threshold)
+            self.similarity_index.add(central_question)
         
         # Instead of recursive calls in __init__, create initial structure
-        self.initialize_graph(num_nodes)
+        if build:
+            self.initialize_graph(num_nodes)
+
+    @classmethod
+    async def build_async(cls, api_key: str, central_question: str = "What is knowledge?", num_nodes: int = 10, max_concurrency: int = 4, duplicate_threshold: Optional[float] = 0.65, response_cache: Optional[ResponseCache] = None) -> "QuestionGraph":
+        """Create a graph whose initial nodes are expanded concurrently"""
+        question_graph = cls(api_key=api_key, central_question=central_question, num_nodes=num_nodes, build=False, duplicate_threshold=duplicate_threshold, response_cache=response_cache)
+        await question_graph.initialize_graph_async(num_nodes, max_concurrency)
+        return question_graph
+
+    @classmethod
+    def from_cached(cls, api_key: str, cached: "CachedGraph", duplicate_threshold: Optional[float] = 0.65, response_cache: Optional[ResponseCache] = None) -> "QuestionGraph":
+        """
+        Create a session graph on top of a shared cached graph. Writes go to a
+        per-session overlay, so expanding this graph never modifies the cache.
+        """
+        question_graph = cls(api_key=api_key, central_question=cached.central_question, build=False, duplicate_threshold=duplicate_threshold, response_cache=response_cache)
+        question_graph.core = cached.core.fork()
+        # One version per inserted node, so the overlay continues where the
+        # graph that was cached left off
+        question_graph.version = question_graph.log_start_version = len(cached.core) - 1
+        if duplicate_threshold is not None:
+            # The cached graph's index is built once and shared read-only
+            if cached.similarity_index is None:
+                cached.similarity_index = QuestionSimilarityIndex(threshold=duplicate_threshold)
+                for question in cached.core.texts:
+                    cached.similarity_index.add(question)
+            question_graph.similarity_index = QuestionSimilarityIndex(threshold=duplicate_threshold, base=cached.similarity_index)
+        return question_graph
+
+    def to_dict(self) -> Dict[str, any]:
+        """Serialisable session state: the graph and its version"""
+        return {"central_question": self.central_question, "version": self.version, "core": self.core.to_dict()}
+
+    @classmethod
+    def from_dict(cls, api_key: str, data: Dict[str, any], duplicate_threshold: Optional[float] = 0.65, response_cache: Optional[ResponseCache] = None) -> "QuestionGraph":
+        """Restore a graph saved with to_dict, without any LLM calls. The change log starts empty"""
+        question_graph = cls(api_key=api_key, central_question=data["central_question"], build=False, duplicate_threshold=duplicate_threshold, response_cache=response_cache)
+        question_graph.core = GraphCore.from_dict(data["core"])
+        question_graph.version = question_graph.log_start_version = data["version"]
+        if question_graph.similarity_index is not None:
+            for question in question_graph.core.texts:
+                question_graph.similarity_index.add(question)
+        return question_graph
+
+    @property
+    def graph(self) -> GraphView:
+        """Read-only {question: {"summary", "questions"}} view of the graph"""
+        return GraphView(self.core)
+
+    @property
+    def node_ids(self) -> Dict[str, int]:
+        return self.core.index
     
+    @timed("build_graph")
     def initialize_graph(self, num_nodes: int) -> None:
         """Safely initialize the graph with the specified number of nodes"""
         nodes_created = 0
@@ -29,69 +117,223 @@ class QuestionGraph:
         if nodes_created < num_nodes - 1:
             print(f"Warning: Only created {nodes_created} nodes out of {num_nodes} requested")
 
-    def add_question(self, parent_question: str, summary: str, new_question: str) -> None:
-        """Add a new question to the graph if it doesn't already exist"""
-        if new_question in self.graph:
-            return  # Prevent duplicate questions
+    @timed("build_graph")
+    async def initialize_graph_async(self, num_nodes: int, max_concurrency: int = 4) -> None:
+        """
+        Initialize the graph by expanding up to max_concurrency eligible nodes at once.
+
+        Child slots are reserved on a parent before its request is sent, so the
+        per-node cap holds while requests are in flight. Inserts happen on the
+        event loop, so duplicate checks in add_question never race.
+        """
+        with llm_work("setup", keep_existing=True):
+            await self._initialize_graph_async(num_nodes, max_concurrency)
+
+    async def _initialize_graph_async(self, num_nodes: int, max_concurrency: int) -> None:
+        target = num_nodes - 1
+        max_attempts = num_nodes * 3  # Matches the retry budget of expand_graph
+        nodes_created = 0
+        attempt_count = 0
+        in_flight = 0
+        slot_freed = asyncio.Event()
+        # Parents whose last generated question was rejected; their next
+        # request skips the response cache so it cannot repeat the rejection
+        rejected_parents = set()
+
+        async def worker() -> None:
+            nonlocal nodes_created, attempt_count, in_flight
+            while nodes_created + in_flight < target and attempt_count < max_attempts:
+                try:
+                    parent_question = self.get_random_question()
+                except ValueError:
+                    if in_flight == 0:
+                        return
+                    # Every eligible slot is reserved; wait for a request to finish
+                    slot_freed.clear()
+                    await slot_freed.wait()
+                    continue
+
+                parent_id = self.core.id_of(parent_question)
+                self.core.reserve(parent_id)
+                in_flight += 1
+                attempt_count += 1
+                try:
+                    summary, new_question = await self._generate_question_async(
+                        parent_question,
+                        self.central_question,
+                        self.get_local_context(parent_question),
+                        fresh=parent_id in rejected_parents
+                    )
+                    if self.add_question(parent_question, summary, new_question):
+                        nodes_created += 1
+                        rejected_parents.discard(parent_id)
+                    else:
+                        rejected_parents.add(parent_id)
+                except Exception as e:
+                    print(f"Error creating node: {e}")
+                finally:
+                    self.core.release(parent_id)
+                    in_flight -= 1
+                    slot_freed.set()
+
+        await asyncio.gather(*(worker() for _ in range(max(1, max_concurrency))))
+
+        if nodes_created < target:
+            print(f"Warning: Only created {nodes_created} nodes out of {num_nodes} requested")
+
+    def add_question(self, parent_question: str, summary: str, new_question: str) -> bool:
+        """Add a new question to the graph if it doesn't already exist. Returns True if added"""
+        if new_question in self.core:
+            return False  # Prevent duplicate questions
+        if self.find_similar_question(new_question) is not None:
+            return False  # Prevent rephrasings of existing questions
             
-        if parent_question in self.graph:
-            self.graph[parent_question]["questions"].append(new_question)
-            self.graph[new_question] = {"summary": summary, "questions": []}
+        parent_id = self.core.id_of(parent_question)
+        if parent_id is not None:
+            if not self.core.has_capacity(parent_id):
+                return False
+            node_id = self.core.add(new_question, summary, parent_id)
+            if self.similarity_index is not None:
+                self.similarity_index.add(new_question)
+            self._record_change(parent_id, node_id)
+            return True
+        return False
 
-    def get_random_question(self) -> str:
-        """Get a random question that hasn't reached maximum connections"""
-        eligible_questions = [
-            q for q, data in self.graph.items() 
-            if len(data["questions"]) < 3  # Limit connections per node
+    def _record_change(self, parent_id: int, node_id: int) -> None:
+        self.version += 1
+        if len(self.change_log) == self.change_log.maxlen:
+            # The oldest entry drops off
+            self.log_start_version += 1
+        self.change_log.append({
+            "version": self.version,
+            "node": {"id": node_id, "summary": self.core.summaries[node_id], "question": self.core.texts[node_id]},
+            "edge": {"source": parent_id, "target": node_id}
+        })
+        for listener in self.change_listeners:
+            listener()
+
+    def changes_since(self, version: int) -> Optional[List[Dict[str, any]]]:
+        """Change log entries after the given version, or None if the log cannot bridge the gap"""
+        if version < self.log_start_version or version > self.version:
+            return None
+        return list(islice(self.change_log, version - self.log_start_version, None))
+
+    def snapshot(self) -> Dict[str, any]:
+        """Full node and edge lists in visualisation format, with the current version"""
+        core = self.core
+        nodes = [
+            {"summary": summary, "question": question}
+            for question, summary in zip(core.texts, core.summaries)
+        ]
+        edges = [
+            {"source": source_id, "target": target_id}
+            for source_id, children in enumerate(core.children)
+            for target_id in children
         ]
-        if not eligible_questions:
+        return {"version": self.version, "nodes": nodes, "edges": edges}
+
+    def find_similar_question(self, question: str) -> Optional[str]:
+        """Return an existing question that the given one near-duplicates, if any"""
+        if self.similarity_index is None:
+            return None
+        match = self.similarity_index.find_similar(question)
+        return match[0] if match else None
+
+    def get_random_question(self) -> str:
+        """Get a random question that hasn't reached maximum connections, counting reserved slots"""
+        node_id = self.core.random_expandable()
+        if node_id is None:
             raise ValueError("No eligible questions available for expansion")
-        return random.choice(eligible_questions)
+        return self.core.texts[node_id]
+
+    def get_parent(self, question: str) -> Optional[str]:
+        """The question this one was generated from, or None for the central question"""
+        parent_id = self.core.parent_of(self.core.index[question])
+        return None if parent_id is None else self.core.texts[parent_id]
+
+    def get_children(self, question: str) -> List[str]:
+        return [self.core.texts[child_id] for child_id in self.core.children_of(self.core.index[question])]
 
     def get_local_context(self, question: str) -> Dict:
         """Get the context for a question with error handling"""
-        if question not in self.graph:
+        if question not in self.core:
             return {"summary": "", "questions": []}
         return self.graph[question]
 
-    def generate_question(self, random_question: str, central_question: str, context: Dict) -> Tuple[str, str]:
-        """Generate a new question with improved error handling and validation"""
-        try:
-            with open('app/prompts/generate_question.txt', 'r') as file:
-                prompt_template = file.read()
+    def _build_question_messages(self, random_question: str, central_question: str, context: Dict) -> List[Dict[str, str]]:
+        """Build the chat messages for generate_question"""
+        prompt = prompts.render(
+            "generate_question",
+            random_question=random_question,
+            central_question=central_question,
+            context=context
+        )
+        return [
+            {"role": "system", "content": "You are a critical question-based inquirer who is building the question space surrounding a central question."},
+            {"role": "user", "content": prompt}
+        ]
+
+    def _parse_question_response(self, content: str) -> Tuple[str, str]:
+        """Split a completion into (summary, question) and validate it"""
+        parts = content.strip().split('\n', 1)
+        
+        if len(parts) != 2:
+            raise ValueError("Invalid response format from API")
             
-            prompt = prompt_template.format(
-                random_question=random_question,
-                central_question=central_question,
-                context=context
-            )
+        summary, question = parts
+        
+        # Validate response
+        if not summary or not question or len(summary) < 5 or len(question) < 5:
+            raise ValueError("Invalid response content")
             
-            response = self.client.chat.completions.create(
-                model="gpt-4-0125-preview",
-                messages=[
-                    {"role": "system", "content": "You are a critical question-based inquirer who is building the question space surrounding a central question."},
-                    {"role": "user", "content": prompt}
-                ],
+        return summary.strip(), question.strip()
+
+    @timed("generate_question")
+    def generate_question(self, random_question: str, central_question: str, context: Dict, fresh: bool = False) -> Tuple[str, str]:
+        """Generate a new question with improved error handling and validation. fresh bypasses cached answers"""
+        try:
+            content = cached_completion(
+                self.client, self.response_cache, "generate_question", fresh=fresh,
+                model=self.MODEL,
+                messages=self._build_question_messages(random_question, central_question, context),
                 max_tokens=50
             )
-            
-            content = response.choices[0].message.content.strip()
-            parts = content.split('\n', 1)
-            
-            if len(parts) != 2:
-                raise ValueError("Invalid response format from API")
-                
-            summary, question = parts
-            
-            # Validate response
-            if not summary or not question or len(summary) < 5 or len(question) < 5:
-                raise ValueError("Invalid response content")
-                
-            return summary.strip(), question.strip()
+            return self._parse_question_response(content)
             
         except Exception as e:
             raise Exception(f"Error generating question: {e}")
 
+    async def _generate_question_async(self, random_question: str, central_question: str, context: Dict, fresh: bool = False) -> Tuple[str, str]:
+        """Run generate_question off the event loop"""
+        return await asyncio.to_thread(self.generate_question, random_question, central_question, context, fresh)
+
+    @timed("expand_question")
+    def expand_question(self, question: str) -> bool:
+        """Add one child to the given question. Returns False if it has no free child slot"""
+        parent_id = self.core.id_of(question)
+        if parent_id is None or not self.core.has_free_slot(parent_id):
+            return False
+        self.core.reserve(parent_id)
+        try:
+            max_attempts = 3
+            for attempt in range(max_attempts):
+                try:
+                    summary, new_question = self.generate_question(
+                        question,
+                        self.central_question,
+                        self.get_local_context(question),
+                        fresh=attempt > 0
+                    )
+                    if self.add_question(question, summary, new_question):
+                        return True
+                except Exception as e:
+                    if attempt == max_attempts - 1:
+                        raise Exception(f"Failed to expand '{question}' after {max_attempts} attempts: {e}")
+            return False
+        finally:
+            self.core.release(parent_id)
+
+    @timed("expand_graph")
     def expand_graph(self) -> None:
         """Expand the graph with error handling and cycle prevention"""
         max_attempts = 3
@@ -102,15 +344,119 @@ class QuestionGraph:
                 summary, new_question = self.generate_question(
                     random_question, 
                     self.central_question, 
-                    local_context
+                    local_context,
+                    fresh=attempt > 0
+                )
+                
+                # Prevent duplicate and near-duplicate questions
+                if self.add_question(random_question, summary, new_question):
+                    return
+                    
+            except Exception as e:
+                if attempt == max_attempts - 1:
+                    raise Exception(f"Failed to expand graph after {max_attempts} attempts: {e}")
+                continue
+
+
+class AsyncQuestionGraph(QuestionGraph):
+    """
+    QuestionGraph whose LLM calls run on an AsyncOpenAI client, so graph
+    construction and expansion never block the event loop.
+
+    Build it with `await AsyncQuestionGraph.build_async(...)`, or construct it
+    and `await initialize_graph(num_nodes)`.
+    """
+    client_class = AsyncOpenAI
+
+    def __init__(self, api_key: str, central_question: str = "What is knowledge?", num_nodes: int = 10, build: bool = False, duplicate_threshold: Optional[float] = 0.65, response_cache: Optional[ResponseCache] = None):
+        # The synchronous build path cannot run here; building is always awaited
+        super().__init__(api_key=api_key, central_question=central_question, num_nodes=num_nodes, build=False, duplicate_threshold=duplicate_threshold, response_cache=response_cache)
+
+    async def initialize_graph(self, num_nodes: int, max_concurrency: int = 4) -> None:
+        """Initialize the graph with the specified number of nodes"""
+        await self.initialize_graph_async(num_nodes, max_concurrency)
+
+    @timed("generate_question")
+    async def generate_question(self, random_question: str, central_question: str, context: Dict, fresh: bool = False) -> Tuple[str, str]:
+        """Generate a new question with improved error handling and validation. fresh bypasses cached answers"""
+        try:
+            content = await async_cached_completion(
+                self.client, self.response_cache, "generate_question", fresh=fresh,
+                model=self.MODEL,
+                messages=self._build_question_messages(random_question, central_question, context),
+                max_tokens=50
+            )
+            return self._parse_question_response(content)
+            
+        except Exception as e:
+            raise Exception(f"Error generating question: {e}")
+
+    async def _generate_question_async(self, random_question: str, central_question: str, context: Dict, fresh: bool = False) -> Tuple[str, str]:
+        return await self.generate_question(random_question, central_question, context, fresh)
+
+    @timed("expand_question")
+    async def expand_question(self, question: str) -> bool:
+        """Add one child to the given question. Returns False if it has no free child slot"""
+        parent_id = self.core.id_of(question)
+        if parent_id is None or not self.core.has_free_slot(parent_id):
+            return False
+        # Reserved so concurrent expansions of the same question respect MAX_CHILDREN
+        self.core.reserve(parent_id)
+        try:
+            max_attempts = 3
+            for attempt in range(max_attempts):
+                try:
+                    summary, new_question = await self.generate_question(
+                        question,
+                        self.central_question,
+                        self.get_local_context(question),
+                        fresh=attempt > 0
+                    )
+                    if self.add_question(question, summary, new_question):
+                        return True
+                except Exception as e:
+                    if attempt == max_attempts - 1:
+                        raise Exception(f"Failed to expand '{question}' after {max_attempts} attempts: {e}")
+            return False
+        finally:
+            self.core.release(parent_id)
+
+    async def fill_children(self, question: str) -> int:
+        """Expand every free child slot of a question concurrently. Returns how many children were added"""
+        parent_id = self.core.id_of(question)
+        if parent_id is None:
+            return 0
+        free = self.MAX_CHILDREN - len(self.core.children_of(parent_id)) - self.core.pending[parent_id]
+        results = await asyncio.gather(*(self.expand_question(question) for _ in range(free)), return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                print(f"Error expanding question: {result}")
+        return sum(result is True for result in results)
+
+    @timed("expand_graph")
+    async def expand_graph(self) -> None:
+        """Expand the graph with error handling and cycle prevention"""
+        with llm_work("background", keep_existing=True):
+            await self._expand_graph()
+
+    async def _expand_graph(self) -> None:
+        max_attempts = 3
+        for attempt in range(max_attempts):
+            try:
+                random_question = self.get_random_question()
+                local_context = self.get_local_context(random_question)
+                summary, new_question = await self.generate_question(
+                    random_question, 
+                    self.central_question, 
+                    local_context,
+                    fresh=attempt > 0
                 )
                 
-                # Prevent duplicate questions
-                if new_question not in self.graph:
-                    self.add_question(random_question, summary, new_question)
+                # Prevent duplicate and near-duplicate questions
+                if self.add_question(random_question, summary, new_question):
                     return
                     
             except Exception as e:
                 if attempt == max_attempts - 1:
                     raise Exception(f"Failed to expand graph after {max_attempts} attempts: {e}")
-                continue
\ No newline at end of file
+                continue
@@ -0,0 +1,83 @@
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from app.similarity_index import jaccard, shingles, terms
+
+def _normalize(text: str) -> str:
+    """Strip the numbering, quotes and labels models wrap around a chosen question"""
+    text = text.strip().splitlines()[0] if text.strip() else ""
+    text = re.sub(r"^\s*(?:next question:|question:|\d+[.)]|[-*])\s*", "", text, flags=re.I)
+    return " ".join(text.strip(" \"'`*").lower().split())
+
+class QuestionRanker:
+    """
+    BM25 ranking of candidate next questions against the user's message.
+
+    Each candidate is scored on its question text plus its summary, with
+    term frequencies and IDF taken over the candidates themselves. decide()
+    only names a winner when the top score leads the runner-up by at least
+    `margin` (a fraction of the top score); otherwise the choice is left to
+    the model, whose free-text answer resolve() maps back onto a candidate.
+    """
+    def __init__(self, margin: Optional[float] = 0.25, k1: float = 1.2, b: float = 0.75, match_threshold: float = 0.5):
+        self.margin = margin
+        self.k1 = k1
+        self.b = b
+        self.match_threshold = match_threshold
+
+    def rank(self, query: str, candidates: Dict[str, str]) -> List[Tuple[str, float]]:
+        """(candidate, score) pairs, best first; `candidates` maps each question to the text it is scored on"""
+        documents = {question: Counter(terms(text)) for question, text in candidates.items()}
+        if not documents:
+            return []
+        lengths = {question: sum(counts.values()) for question, counts in documents.items()}
+        average_length = sum(lengths.values()) / len(documents) or 1.0
+        query_terms = set(terms(query))
+        idf = {}
+        for term in query_terms:
+            containing = sum(1 for counts in documents.values() if term in counts)
+            idf[term] = math.log(1 + (len(documents) - containing + 0.5) / (containing + 0.5))
+
+        scores = []
+        for question, counts in documents.items():
+            norm = self.k1 * (1 - self.b + self.b * lengths[question] / average_length)
+            score = 0.0
+            for term in query_terms:
+                frequency = counts.get(term, 0)
+                if frequency:
+                    score += idf[term] * frequency * (self.k1 + 1) / (frequency + norm)
+            scores.append((question, score))
+        # Stable sort keeps graph order among ties
+        scores.sort(key=lambda item: item[1], reverse=True)
+        return scores
+
+    def decide(self, ranking: List[Tuple[str, float]]) -> Optional[str]:
+        """The clear winner of a ranking, or None when the top two are too close to call"""
+        if not ranking:
+            return None
+        if len(ranking) == 1:
+            return ranking[0][0]
+        if self.margin is None:
+            return None
+        (best, top), (_, second) = ranking[0], ranking[1]
+        if top > 0 and top - second >= self.margin * top:
+            return best
+        return None
+
+    def resolve(self, answer: str, candidates: List[str]) -> Optional[str]:
+        """The candidate a model's answer refers to, or None if it names none of them"""
+        if answer in candidates:
+            return answer
+        normalized = _normalize(answer)
+        for candidate in candidates:
+            if _normalize(candidate) == normalized:
+                return candidate
+        answer_shingles = shingles(normalized)
+        best, best_similarity = None, self.match_threshold
+        for candidate in candidates:
+            similarity = jaccard(answer_shingles, shingles(candidate))
+            if similarity >= best_similarity:
+                best, best_similarity = candidate, similarity
+        return best
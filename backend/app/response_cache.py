@@ -0,0 +1,207 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+from app.metrics import metrics
+
+# Seconds a response stays cached, per call site. None opts the call site out:
+# its answer depends on state that must be re-read every time, or repeating
+# an earlier answer would make the discussion feel canned.
+DEFAULT_TTLS: Dict[str, Optional[float]] = {
+    "opening_message": 30 * 24 * 3600,
+    "generate_question": 7 * 24 * 3600,
+    "dialectical": 7 * 24 * 3600,
+    "determine_next_question": 24 * 3600,
+    "discussion_response": None,
+    "fast_turn": None,
+    "check_equilibrium": None,
+    "get_summary": None,
+}
+
+class ResponseCache:
+    """
+    Content-addressed cache of chat completion responses.
+
+    Entries are keyed by a hash of the full request (model, messages,
+    max_tokens and any other parameters), so identical requests from any
+    session or call site share one answer. Lookups hit an in-memory LRU first
+    and a SQLite table second. How long an answer is kept depends on the call
+    site that asked for it (see DEFAULT_TTLS); call sites with no TTL bypass
+    the cache entirely.
+    """
+    def __init__(self, path: str = "response_cache.sqlite3", ttls: Optional[Dict[str, Optional[float]]] = None, default_ttl: Optional[float] = 24 * 3600, max_entries: int = 10000, max_memory_entries: int = 1024):
+        """
+        Args:
+            ttls: Per-call-site TTL overrides, merged over DEFAULT_TTLS
+            default_ttl: TTL for call sites not listed; None leaves them uncached
+        """
+        self.path = path
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self.max_memory_entries = max_memory_entries
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, site TEXT NOT NULL, content TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+
+    @staticmethod
+    def make_key(**request) -> str:
+        payload = json.dumps(request, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def ttl_for(self, site: str) -> Optional[float]:
+        return self.ttls.get(site, self.default_ttl)
+
+    def _remember(self, key: str, content: str, expires_at: float) -> None:
+        with self._lock:
+            self._memory[key] = (content, expires_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    def get_memory(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            return entry[0]
+
+    def _load(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock, self._db:
+            row = self._db.execute(
+                "SELECT content, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+        self._remember(key, row[0], row[1])
+        return row[0]
+
+    def get(self, key: str) -> Optional[str]:
+        content = self.get_memory(key)
+        return content if content is not None else self._load(key)
+
+    def put(self, key: str, site: str, content: str, ttl: float) -> None:
+        now = time.time()
+        self._remember(key, content, now + ttl)
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, site, content, expires_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, site, content, now + ttl, now)
+            )
+            self._writes += 1
+            # Expiry and LRU trimming scan the table, so only run them now and then
+            if self._writes % 64 == 0:
+                self._db.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+                self._db.execute(
+                    "DELETE FROM responses WHERE key NOT IN (SELECT key FROM responses ORDER BY last_used DESC LIMIT ?)",
+                    (self.max_entries,)
+                )
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+def _lookup_key(cache: Optional[ResponseCache], site: str, request: Dict[str, Any]) -> Tuple[Optional[str], Optional[float]]:
+    """The cache key and TTL for a request, or (None, None) when it must not be cached"""
+    ttl = cache.ttl_for(site) if cache is not None else None
+    if ttl is None:
+        if cache is not None:
+            cache.bypassed += 1
+            metrics.count("llm_cache_requests_total", site=site, result="bypass")
+        return None, None
+    return cache.make_key(**request), ttl
+
+def cached_completion(client, cache: Optional[ResponseCache], site: str, fresh: bool = False, **request) -> str:
+    """
+    The content of a chat completion for `request`, served from `cache` when
+    an identical request was answered before. `site` names the calling code
+    and selects the TTL. With fresh set the cache is not read, only refreshed.
+    """
+    key, ttl = _lookup_key(cache, site, request)
+    if key is not None and not fresh:
+        content = cache.get(key)
+        if content is not None:
+            cache.hits += 1
+            metrics.count("llm_cache_requests_total", site=site, result="hit")
+            return content
+        cache.misses += 1
+        metrics.count("llm_cache_requests_total", site=site, result="miss")
+    response = client.chat.completions.create(**request)
+    content = response.choices[0].message.content
+    if key is not None and content:
+        cache.put(key, site, content, ttl)
+    return content
+
+async def async_cached_completion(client, cache: Optional[ResponseCache], site: str, fresh: bool = False, **request) -> str:
+    """cached_completion for AsyncOpenAI clients; disk lookups run off the event loop"""
+    key, ttl = _lookup_key(cache, site, request)
+    if key is not None and not fresh:
+        content = cache.get_memory(key)
+        if content is None:
+            content = await asyncio.to_thread(cache._load, key)
+        if content is not None:
+            cache.hits += 1
+            metrics.count("llm_cache_requests_total", site=site, result="hit")
+            return content
+        cache.misses += 1
+        metrics.count("llm_cache_requests_total", site=site, result="miss")
+    response = await client.chat.completions.create(**request)
+    content = response.choices[0].message.content
+    if key is not None and content:
+        await asyncio.to_thread(cache.put, key, site, content, ttl)
+    return content
+
+async def stream_cached_completion(client, cache: Optional[ResponseCache], site: str, **request) -> AsyncIterator[str]:
+    """
+    Yield the content deltas of a streamed completion. A cached answer is
+    yielded as a single delta; a streamed answer is cached once it completes.
+    """
+    key, ttl = _lookup_key(cache, site, request)
+    if key is not None:
+        content = cache.get_memory(key)
+        if content is None:
+            content = await asyncio.to_thread(cache._load, key)
+        if content is not None:
+            cache.hits += 1
+            metrics.count("llm_cache_requests_total", site=site, result="hit")
+            yield content
+            return
+        cache.misses += 1
+        metrics.count("llm_cache_requests_total", site=site, result="miss")
+    stream = await client.chat.completions.create(stream=True, **request)
+    parts = []
+    try:
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+                yield chunk.choices[0].delta.content
+    finally:
+        # Frees the connection (and the gateway's in-flight slot) if the reader stopped early
+        close = getattr(stream, "close", None)
+        if close is not None:
+            await close()
+    if key is not None and parts:
+        await asyncio.to_thread(cache.put, key, site, "".join(parts), ttl)
@@ -0,0 +1,92 @@
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set
+
+class SessionTracker:
+    """
+    Activity and estimated memory of live sessions, least recently used first.
+
+    A session's size is the byte length of its last snapshot, which is
+    dominated by the same text (graph questions, history) it holds in
+    memory. over_limit() names the sessions to evict to get back under
+    `max_sessions` and `memory_budget` bytes, and idle() those silent for
+    longer than `idle_timeout` seconds. Busy sessions (being set up or in
+    the middle of a turn) are never named.
+    """
+    def __init__(self, max_sessions: Optional[int] = 500, memory_budget: Optional[int] = None, idle_timeout: Optional[float] = 1800):
+        self.max_sessions = max_sessions
+        self.memory_budget = memory_budget
+        self.idle_timeout = idle_timeout
+        self.last_active: "OrderedDict[str, float]" = OrderedDict()
+        self.sizes: Dict[str, int] = {}
+        self.busy: Set[str] = set()
+        self.total_bytes = 0
+        self.evicted = 0
+        self.reaped = 0
+
+    def __len__(self) -> int:
+        return len(self.last_active)
+
+    def touch(self, client_id: str) -> None:
+        self.last_active[client_id] = time.monotonic()
+        self.last_active.move_to_end(client_id)
+
+    def set_size(self, client_id: str, size: int) -> None:
+        if client_id in self.last_active:
+            self.total_bytes += size - self.sizes.get(client_id, 0)
+            self.sizes[client_id] = size
+
+    def set_busy(self, client_id: str, busy: bool) -> None:
+        """Mark a session as handling a request (setup or a turn), which protects it from eviction"""
+        self.touch(client_id)
+        if busy:
+            self.busy.add(client_id)
+        else:
+            self.busy.discard(client_id)
+
+    def discard(self, client_id: str) -> None:
+        self.last_active.pop(client_id, None)
+        self.total_bytes -= self.sizes.pop(client_id, 0)
+        self.busy.discard(client_id)
+
+    def over_limit(self, keep: Iterable[str] = ()) -> List[str]:
+        """Least recently used sessions to evict, excluding `keep` and busy sessions"""
+        keep = set(keep) | self.busy
+        count, total = len(self.last_active), self.total_bytes
+        victims = []
+        for client_id in self.last_active:
+            over_count = self.max_sessions is not None and count > self.max_sessions
+            over_memory = self.memory_budget is not None and total > self.memory_budget
+            if not (over_count or over_memory):
+                break
+            if client_id in keep:
+                continue
+            victims.append(client_id)
+            count -= 1
+            total -= self.sizes.get(client_id, 0)
+        return victims
+
+    def idle(self) -> List[str]:
+        """Sessions with no activity for longer than idle_timeout"""
+        if self.idle_timeout is None:
+            return []
+        cutoff = time.monotonic() - self.idle_timeout
+        victims = []
+        for client_id, last_active in self.last_active.items():
+            if last_active > cutoff:
+                break
+            if client_id not in self.busy:
+                victims.append(client_id)
+        return victims
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "live": len(self.last_active),
+            "busy": len(self.busy),
+            "estimated_bytes": self.total_bytes,
+            "max_sessions": self.max_sessions,
+            "memory_budget": self.memory_budget,
+            "idle_timeout": self.idle_timeout,
+            "evicted": self.evicted,
+            "reaped": self.reaped
+        }
@@ -0,0 +1,54 @@
+import asyncio
+from typing import Awaitable, Optional, Set, TypeVar
+
+T = TypeVar("T")
+
+class ScopeCancelled(Exception):
+    """The scope's session went away while the work was running"""
+
+class SessionScope:
+    """
+    The in-flight work of one client connection.
+
+    Setup and turns run through run(), each as a task of the scope. When the
+    client disconnects (or the session is closed) cancel() stops them, and
+    every completion they are waiting on, rather than letting them finish
+    for nobody. run() can also stop work that passes a deadline.
+    """
+    def __init__(self):
+        self.tasks: Set[asyncio.Task] = set()
+        self.cancelled = False
+
+    async def run(self, work: Awaitable[T], deadline: Optional[float] = None) -> T:
+        """
+        Await `work` as a task of this scope.
+
+        Raises ScopeCancelled if the scope is cancelled first, and
+        asyncio.TimeoutError (after cancelling the work) if it takes longer
+        than `deadline` seconds.
+        """
+        task = asyncio.ensure_future(work)
+        if self.cancelled:
+            task.cancel()
+        self.tasks.add(task)
+        try:
+            done, _ = await asyncio.wait({task}, timeout=deadline)
+            if not done:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                if not self.cancelled:
+                    raise asyncio.TimeoutError()
+            if task.cancelled() and self.cancelled:
+                raise ScopeCancelled()
+            return task.result()
+        except asyncio.CancelledError:
+            # Whoever awaits the scope was cancelled; the work goes with it
+            task.cancel()
+            raise
+        finally:
+            self.tasks.discard(task)
+
+    def cancel(self) -> None:
+        self.cancelled = True
+        for task in self.tasks:
+            task.cancel()
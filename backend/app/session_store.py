@@ -0,0 +1,82 @@
+import asyncio
+import hmac
+import json
+import secrets
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+class SessionStore:
+    """
+    SQLite store of serialised discussion sessions, so a client that
+    reconnects with the same client_id and resume token picks up where it
+    left off without rebuilding anything.
+
+    Snapshots not updated for `ttl` seconds are treated as abandoned and
+    removed by collect_garbage(), which run_garbage_collector() calls every
+    `gc_interval` seconds.
+    """
+    def __init__(self, path: str = "sessions.sqlite3", ttl: float = 24 * 3600, gc_interval: float = 600):
+        self.path = path
+        self.ttl = ttl
+        self.gc_interval = gc_interval
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "client_id TEXT PRIMARY KEY, token TEXT NOT NULL, state TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    @staticmethod
+    def new_token() -> str:
+        return secrets.token_urlsafe(24)
+
+    def save(self, client_id: str, token: str, state: Dict[str, Any]) -> int:
+        """Store the state for client_id and return the size of the snapshot in bytes"""
+        payload = json.dumps(state)
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO sessions (client_id, token, state, updated_at) VALUES (?, ?, ?, ?)",
+                (client_id, token, payload, time.time())
+            )
+        return len(payload)
+
+    def load(self, client_id: str, token: str) -> Optional[Dict[str, Any]]:
+        """The saved state for client_id, or None if there is none, it expired or the token does not match"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT token, state, updated_at FROM sessions WHERE client_id = ?", (client_id,)
+            ).fetchone()
+        if row is None or not hmac.compare_digest(row[0], token):
+            return None
+        if time.time() - row[2] > self.ttl:
+            self.delete(client_id)
+            return None
+        return json.loads(row[1])
+
+    def delete(self, client_id: str) -> None:
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM sessions WHERE client_id = ?", (client_id,))
+
+    def collect_garbage(self) -> int:
+        """Remove abandoned snapshots; returns how many were removed"""
+        with self._lock, self._db:
+            return self._db.execute(
+                "DELETE FROM sessions WHERE updated_at < ?", (time.time() - self.ttl,)
+            ).rowcount
+
+    async def run_garbage_collector(self) -> None:
+        while True:
+            try:
+                removed = await asyncio.to_thread(self.collect_garbage)
+                if removed:
+                    print(f"Removed {removed} abandoned session snapshots")
+            except Exception as e:
+                print(f"Error collecting session snapshots: {e}")
+            await asyncio.sleep(self.gc_interval)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,163 @@
+import random
+import re
+import zlib
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+def shingles(text: str, size: int = 3) -> FrozenSet[int]:
+    """Hashed character n-grams of the lower-cased, punctuation-free text"""
+    normalized = " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+    if len(normalized) <= size:
+        return frozenset([zlib.crc32(normalized.encode("utf-8"))])
+    return frozenset(
+        zlib.crc32(normalized[i:i + size].encode("utf-8"))
+        for i in range(len(normalized) - size + 1)
+    )
+
+STOPWORDS = frozenset(
+    "a about all also am an and any are as at be because been but by can could did do does "
+    "for from had has have how i if in into is it its just me more most my no not of on or "
+    "our should so some such than that the their them then there these they this those to "
+    "too very was we were what when where which who whom why will with would you your".split()
+)
+
+# Kept when comparing questions for duplicates: they change what is asked
+NEGATIONS = frozenset(["cannot", "never", "no", "not", "nor"])
+QUESTION_WORDS = frozenset("can could how should what when where which who whom why will would".split())
+
+def _stem(word: str) -> str:
+    """Fold plurals and possessives so 'beliefs' matches 'belief'"""
+    if word.endswith("'s"):
+        word = word[:-2]
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+def terms(text: str) -> List[str]:
+    """Lower-cased, stemmed content words of the text"""
+    return [_stem(word) for word in re.findall(r"[a-z0-9']+", text.lower()) if word not in STOPWORDS and len(word) > 1]
+
+def dedup_terms(text: str) -> Tuple[List[str], List[str]]:
+    """
+    The question words and content words of the text, with each negation
+    folded into the content word it negates so 'sufficient' and
+    'not sufficient' differ
+    """
+    question_words: List[str] = []
+    words: List[str] = []
+    negated = False
+    for word in re.findall(r"[a-z0-9']+", text.lower()):
+        if word in NEGATIONS or word.endswith("n't"):
+            negated = True
+        elif word in QUESTION_WORDS:
+            question_words.append(word)
+        elif word not in STOPWORDS and len(word) > 1:
+            words.append(f"not {_stem(word)}" if negated else _stem(word))
+            negated = False
+    if negated:
+        words.append("not")
+    return question_words, words
+
+def term_shingles(text: str) -> FrozenSet[int]:
+    """
+    Hashed content words of the text, unordered pairs of neighbouring ones
+    and each content word qualified by each question word, so questions
+    differing in one content word, negation or question word stay apart
+    while reworded or reordered ones match
+    """
+    question_words, words = dedup_terms(text)
+    if not words:
+        return shingles(text)
+    features = set(words)
+    features.update(" ".join(sorted(pair)) for pair in zip(words, words[1:]))
+    features.update(f"{question_word}: {word}" for question_word in question_words for word in words)
+    return frozenset(zlib.crc32(feature.encode("utf-8")) for feature in features)
+
+def jaccard(a: FrozenSet[int], b: FrozenSet[int]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+class QuestionSimilarityIndex:
+    """
+    MinHash/LSH index for finding near-duplicate questions.
+
+    Each question is reduced to a MinHash signature over its content words
+    and neighbouring word pairs (see term_shingles) and filed under one
+    bucket per band. A query only compares
+    against questions sharing at least one bucket, then confirms candidates
+    with the exact Jaccard similarity of their shingle sets, so lookups stay
+    sublinear in the number of indexed questions.
+
+    An index can layer over a read-only `base` index (e.g. one shared by every
+    session using the same cached graph); queries consult both.
+    """
+    def __init__(self, threshold: float = 0.65, num_perm: int = 64, bands: int = 16, seed: int = 1, base: Optional["QuestionSimilarityIndex"] = None):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        if base is not None:
+            num_perm, bands, seed = base.num_perm, base.bands, base.seed
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.seed = seed
+        self.base = base
+        generator = random.Random(seed)
+        self._permutations = [
+            (generator.randrange(1, _MERSENNE_PRIME), generator.randrange(0, _MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+        self._shingles: Dict[str, FrozenSet[int]] = {}
+        self._buckets: List[Dict[Tuple[int, ...], Set[str]]] = [{} for _ in range(bands)]
+
+    def __len__(self) -> int:
+        return len(self._shingles) + (len(self.base) if self.base is not None else 0)
+
+    def __contains__(self, question: str) -> bool:
+        return question in self._shingles or (self.base is not None and question in self.base)
+
+    def _signature(self, question_shingles: FrozenSet[int]) -> List[int]:
+        return [
+            min(((a * shingle + b) % _MERSENNE_PRIME) & _MAX_HASH for shingle in question_shingles)
+            for a, b in self._permutations
+        ]
+
+    def _band_keys(self, signature: List[int]) -> List[Tuple[int, ...]]:
+        return [tuple(signature[band * self.rows:(band + 1) * self.rows]) for band in range(self.bands)]
+
+    def add(self, question: str) -> None:
+        if question in self._shingles:
+            return
+        question_shingles = term_shingles(question)
+        self._shingles[question] = question_shingles
+        for band, key in enumerate(self._band_keys(self._signature(question_shingles))):
+            self._buckets[band].setdefault(key, set()).add(question)
+
+    def _candidates(self, band_keys: List[Tuple[int, ...]]) -> Set[str]:
+        candidates: Set[str] = set()
+        for band, key in enumerate(band_keys):
+            candidates |= self._buckets[band].get(key, set())
+        if self.base is not None:
+            candidates |= self.base._candidates(band_keys)
+        return candidates
+
+    def _shingles_of(self, question: str) -> FrozenSet[int]:
+        if question in self._shingles:
+            return self._shingles[question]
+        return self.base._shingles_of(question)
+
+    def find_similar(self, question: str) -> Optional[Tuple[str, float]]:
+        """Return the most similar indexed question and its similarity, if it reaches the threshold"""
+        question_shingles = term_shingles(question)
+        band_keys = self._band_keys(self._signature(question_shingles))
+        best: Optional[Tuple[str, float]] = None
+        for candidate in self._candidates(band_keys):
+            similarity = jaccard(question_shingles, self._shingles_of(candidate))
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (candidate, similarity)
+        return best
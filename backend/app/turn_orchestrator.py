@@ -0,0 +1,109 @@
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence
+
+StepFunc = Callable[[Dict[str, Any]], Awaitable[Any]]
+StepCondition = Callable[[Dict[str, Any]], bool]
+
+class TurnStep:
+    def __init__(self, name: str, func: StepFunc, depends_on: Sequence[str] = (), when: Optional[StepCondition] = None):
+        self.name = name
+        self.func = func
+        self.depends_on = list(depends_on)
+        self.when = when
+
+class TurnOrchestrator:
+    """
+    Runs the calls that make up one discussion turn as a dependency graph.
+
+    Each step starts as soon as all of its dependencies have finished, so
+    independent calls (e.g. the equilibrium check and next-question selection)
+    overlap and a turn costs roughly its longest chain of round trips. Steps
+    receive the results of every finished step and may be skipped with a
+    `when` condition, in which case their result is None.
+    """
+    def __init__(self):
+        self.steps: Dict[str, TurnStep] = {}
+
+    def add_step(self, name: str, func: StepFunc, depends_on: Sequence[str] = (), when: Optional[StepCondition] = None) -> None:
+        """Register a step. Dependencies must already be registered, which keeps the graph acyclic"""
+        if name in self.steps:
+            raise ValueError(f"Step {name} already exists")
+        for dependency in depends_on:
+            if dependency not in self.steps:
+                raise ValueError(f"Step {name} depends on unknown step {dependency}")
+        self.steps[name] = TurnStep(name, func, depends_on, when)
+
+    async def run(self) -> Dict[str, Any]:
+        """Run every step and return their results by name. The first failure cancels the rest"""
+        results: Dict[str, Any] = {}
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run_step(step: TurnStep) -> None:
+            for dependency in step.depends_on:
+                await tasks[dependency]
+            if step.when is not None and not step.when(results):
+                results[step.name] = None
+                return
+            results[step.name] = await step.func(results)
+
+        for step in self.steps.values():
+            tasks[step.name] = asyncio.create_task(run_step(step))
+
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            # Streams started by finished steps would otherwise run on for nobody
+            for result in results.values():
+                if isinstance(result, BufferedStream):
+                    result.cancel()
+            raise
+        return results
+
+class BufferedStream:
+    """
+    Starts consuming an async iterator immediately and buffers its items, so
+    a streamed completion can be generated early and forwarded later.
+    """
+    def __init__(self, source: AsyncIterator[str]):
+        self._items: List[str] = []
+        self._done = False
+        self._error: Optional[Exception] = None
+        self._cancelled = False
+        self._changed = asyncio.Event()
+        self._task = asyncio.create_task(self._consume(source))
+
+    async def _consume(self, source: AsyncIterator[str]) -> None:
+        try:
+            async for item in source:
+                self._items.append(item)
+                self._changed.set()
+        except asyncio.CancelledError:
+            # Stay a cancelled task, so whoever cancelled the stream sees it stop
+            self._cancelled = True
+            raise
+        except Exception as e:
+            self._error = e
+        finally:
+            self._done = True
+            self._changed.set()
+
+    def cancel(self) -> None:
+        self._task.cancel()
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        position = 0
+        while True:
+            while position < len(self._items):
+                yield self._items[position]
+                position += 1
+            if self._done:
+                if self._cancelled:
+                    raise asyncio.CancelledError()
+                if self._error is not None:
+                    raise self._error
+                return
+            self._changed.clear()
+            await self._changed.wait()
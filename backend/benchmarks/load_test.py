@@ -0,0 +1,276 @@
+"""
+Load test for the discussion websocket, against a local mock OpenAI server.
+
+Starts benchmarks.mock_openai and benchmarks.serve_app as subprocesses (the
+app's caches and session store go to a temporary directory), then drives
+--users concurrent simulated users through /ws/chat/{client_id}: each sends
+an initial question, waits for the opening message and sends up to --turns
+answers. The mock reports equilibrium on the last turn, so every discussion
+also exercises the summary. Prints (and with --json writes) session setup
+time, per-turn latency percentiles, messages per second, peak RSS per
+session and event-loop lag.
+
+    python -m benchmarks.load_test --users 50 --turns 4 --stream
+    python -m benchmarks.load_test --users 20 --app-env GRAPH_LAZY=1 --latency fixed:0.2
+
+Run from the backend directory.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from typing import Dict, List, Optional
+
+import httpx
+import websockets
+
+from benchmarks.stats import percentile
+
+QUESTIONS = [
+    "What is knowledge?",
+    "Is free will compatible with determinism?",
+    "What makes an action morally right?",
+    "Can a machine think?",
+]
+
+ANSWERS = [
+    "I think knowledge is justified true belief, though Gettier cases trouble me.",
+    "It depends on whether we can ever be certain of our evidence.",
+    "Perhaps reliability of the process matters more than justification.",
+    "I am now inclined to say context decides what counts as knowing.",
+    "Maybe the concept has no single definition at all.",
+]
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+class UserResult:
+    def __init__(self, index: int):
+        self.index = index
+        self.setup: Optional[float] = None
+        self.graph_ready: Optional[float] = None
+        self.first_replies: List[float] = []
+        self.turns: List[float] = []
+        self.frames = 0
+        self.ended = False
+        self.error: Optional[str] = None
+
+async def _receive(websocket, result: UserResult, timeout: float) -> dict:
+    frame = json.loads(await asyncio.wait_for(websocket.recv(), timeout))
+    result.frames += 1
+    if frame["type"] == "error":
+        raise Exception(f"Server error: {frame.get('message')}")
+    return frame
+
+async def simulate_user(url: str, index: int, args) -> UserResult:
+    """One discussion: initial question, opening message, then up to args.turns answers"""
+    result = UserResult(index)
+    rng = random.Random(index)
+    question = QUESTIONS[index % len(QUESTIONS)]
+    if args.unique_questions:
+        question = f"{question} (variant {index})"
+    reply_types = ("message_delta", "message") if args.stream else ("message", "message_done")
+    try:
+        started = time.monotonic()
+        async with websockets.connect(f"{url}/ws/chat/bench-{index}-{uuid.uuid4().hex[:8]}", max_size=None) as websocket:
+            await websocket.send(json.dumps({"type": "init", "message": question, "stream": args.stream}))
+            while result.setup is None:
+                frame = await _receive(websocket, result, args.timeout)
+                if frame["type"] in ("graph_data", "graph_patch") and result.graph_ready is None:
+                    result.graph_ready = time.monotonic() - started
+                if frame["type"] in ("message", "message_done"):
+                    result.setup = time.monotonic() - started
+            while True:
+                frame = await _receive(websocket, result, args.timeout)
+                if frame["type"] == "typing" and not frame["typing"]:
+                    break
+
+            for _ in range(args.turns):
+                await asyncio.sleep(rng.uniform(0, args.think_time))
+                sent = time.monotonic()
+                first_reply = None
+                # Streamed messages clear the typing indicator at their first
+                # token; only the one after the reply (and any summary) ends the turn
+                replied = streaming = False
+                await websocket.send(json.dumps({"type": "message", "message": rng.choice(ANSWERS)}))
+                while True:
+                    frame = await _receive(websocket, result, args.timeout)
+                    if frame["type"] in reply_types and first_reply is None:
+                        first_reply = time.monotonic() - sent
+                    if frame["type"] == "message_delta":
+                        streaming = True
+                    elif frame["type"] in ("message", "message_done"):
+                        replied, streaming = True, False
+                    elif frame["type"] == "discussion_ended":
+                        result.ended = True
+                    elif frame["type"] == "typing" and not frame["typing"] and replied and not streaming:
+                        break
+                result.turns.append(time.monotonic() - sent)
+                if first_reply is not None:
+                    result.first_replies.append(first_reply)
+                if result.ended:
+                    break
+    except Exception as e:
+        result.error = f"{type(e).__name__}: {e}"
+    return result
+
+def _summary(values: List[float]) -> Dict[str, Optional[float]]:
+    return {
+        "count": len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else None
+    }
+
+async def run_load(url: str, args) -> Dict[str, object]:
+    async with httpx.AsyncClient(base_url=url.replace("ws://", "http://")) as http:
+        baseline = (await http.post("/benchmark/reset")).json()
+        started = time.monotonic()
+
+        async def delayed_user(index: int) -> UserResult:
+            await asyncio.sleep(args.ramp * index / max(1, args.users))
+            return await simulate_user(url, index, args)
+
+        results = await asyncio.gather(*(delayed_user(index) for index in range(args.users)))
+        elapsed = time.monotonic() - started
+        server = (await http.get("/benchmark/stats")).json()
+
+    completed = [result for result in results if result.error is None]
+    turns = [latency for result in results for latency in result.turns]
+    user_messages = sum(len(result.turns) for result in results)
+    return {
+        "users": args.users,
+        "completed": len(completed),
+        "ended_in_equilibrium": sum(result.ended for result in results),
+        "errors": [f"user {result.index}: {result.error}" for result in results if result.error],
+        "elapsed_seconds": elapsed,
+        "session_setup_seconds": _summary([result.setup for result in results if result.setup is not None]),
+        "graph_ready_seconds": _summary([result.graph_ready for result in results if result.graph_ready is not None]),
+        "turn_seconds": _summary(turns),
+        "first_reply_seconds": _summary([latency for result in results for latency in result.first_replies]),
+        "user_messages_per_second": user_messages / elapsed,
+        "frames_per_second": sum(result.frames for result in results) / elapsed,
+        "rss_baseline_bytes": baseline["rss_bytes"],
+        "peak_rss_bytes": server["peak_rss_bytes"],
+        "peak_rss_per_session_bytes": max(0, server["peak_rss_bytes"] - baseline["rss_bytes"]) / max(1, args.users),
+        "event_loop_lag_seconds": server["loop_lag"]
+    }
+
+def _format_seconds(summary: Dict[str, Optional[float]]) -> str:
+    if not summary["count"]:
+        return "n/a"
+    return "  ".join(f"{key} {summary[key] * 1000:.1f}ms" for key in ("p50", "p95", "p99", "max")) + f"  (n={summary['count']})"
+
+def print_report(report: Dict[str, object], mock_stats: Optional[dict]) -> None:
+    lag = report["event_loop_lag_seconds"]
+    print(f"Users:               {report['completed']}/{report['users']} completed, {report['ended_in_equilibrium']} reached equilibrium in {report['elapsed_seconds']:.2f}s")
+    print(f"Session setup:       {_format_seconds(report['session_setup_seconds'])}")
+    print(f"Graph ready:         {_format_seconds(report['graph_ready_seconds'])}")
+    print(f"First reply:         {_format_seconds(report['first_reply_seconds'])}")
+    print(f"Turn:                {_format_seconds(report['turn_seconds'])}")
+    print(f"Throughput:          {report['user_messages_per_second']:.2f} user messages/s, {report['frames_per_second']:.1f} frames/s")
+    print(f"Peak RSS:            {report['peak_rss_bytes'] / 2**20:.1f} MiB ({report['peak_rss_per_session_bytes'] / 2**10:.1f} KiB per session over {report['rss_baseline_bytes'] / 2**20:.1f} MiB baseline)")
+    if lag["samples"]:
+        print(f"Event-loop lag:      p50 {lag['p50'] * 1000:.2f}ms  p95 {lag['p95'] * 1000:.2f}ms  p99 {lag['p99'] * 1000:.2f}ms  max {lag['max'] * 1000:.2f}ms")
+    if mock_stats:
+        print(f"Mock LLM requests:   {mock_stats['requests']} ({mock_stats['errors']} failed on purpose)")
+    for error in report["errors"][:10]:
+        print(f"Error: {error}")
+
+def _wait_until_ready(url: str, process: subprocess.Popen, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise Exception(f"{' '.join(process.args)} exited with code {process.returncode}")
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.TransportError:
+            time.sleep(0.1)
+    raise Exception(f"Timed out waiting for {url}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the discussion websocket against a mock OpenAI server")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--ramp", type=float, default=1.0, help="Seconds over which users connect")
+    parser.add_argument("--think-time", type=float, default=0.5, help="Maximum random pause before each answer")
+    parser.add_argument("--stream", action="store_true", help="Use streamed replies")
+    parser.add_argument("--unique-questions", action=argparse.BooleanOptionalAction, default=True, help="Give every user a distinct question, so graph caches do not hide build cost")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Seconds to wait for any one frame")
+    parser.add_argument("--latency", default="lognormal:0.3,0.4")
+    parser.add_argument("--latency-for", action="append", default=[], metavar="KIND=DIST")
+    parser.add_argument("--token-interval", type=float, default=0.01)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=429)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--app-env", action="append", default=[], metavar="KEY=VALUE", help="Extra environment for the app, e.g. GRAPH_LAZY=1")
+    parser.add_argument("--server-url", help="Drive an already running benchmarks.serve_app instead of starting one")
+    parser.add_argument("--json", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    processes: List[subprocess.Popen] = []
+    mock_url = None
+    with tempfile.TemporaryDirectory(prefix="philosophiser-bench-") as workdir:
+        try:
+            url = args.server_url
+            if url is None:
+                mock_port, app_port = _free_port(), _free_port()
+                mock_url = f"http://127.0.0.1:{mock_port}"
+                mock_command = [
+                    sys.executable, "-m", "benchmarks.mock_openai",
+                    "--port", str(mock_port),
+                    "--latency", args.latency,
+                    "--token-interval", str(args.token_interval),
+                    "--error-rate", str(args.error_rate),
+                    "--error-status", str(args.error_status),
+                    "--equilibrium-after", str(args.turns),
+                    "--seed", str(args.seed)
+                ]
+                for override in args.latency_for:
+                    mock_command += ["--latency-for", override]
+                processes.append(subprocess.Popen(mock_command))
+                _wait_until_ready(f"{mock_url}/stats", processes[-1])
+
+                env = {
+                    **os.environ,
+                    "OPENAI_API_KEY": "benchmark",
+                    "LLM_BASE_URL": f"{mock_url}/v1",
+                    "WARM_POOL_QUESTIONS": "",
+                    "DATA_DIR": workdir,
+                }
+                for setting in args.app_env:
+                    key, _, value = setting.partition("=")
+                    env[key] = value
+                processes.append(subprocess.Popen([sys.executable, "-m", "benchmarks.serve_app", "--port", str(app_port)], env=env))
+                _wait_until_ready(f"http://127.0.0.1:{app_port}/benchmark/stats", processes[-1])
+                url = f"ws://127.0.0.1:{app_port}"
+            elif url.startswith("http"):
+                url = "ws" + url[len("http"):]
+
+            report = asyncio.run(run_load(url.rstrip("/"), args))
+            mock_stats = httpx.get(f"{mock_url}/stats").json() if mock_url else None
+            report["mock"] = mock_stats
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.wait(timeout=10)
+
+    print_report(report, mock_stats)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(report, file, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""
+OpenAI-compatible mock server for load tests.
+
+Serves POST /v1/chat/completions, streamed and not, with canned answers in
+the format each of the app's prompts expects: summary and question lines for
+graph building, one of the listed questions for next-question selection,
+'true'/'false' for equilibrium checks, JSON arrays for batched checks and so
+on. Latency is drawn from a configurable distribution per kind of request,
+and a fraction of requests can be failed with a 429 or 5xx.
+
+Run it on its own and point the app at it with LLM_BASE_URL:
+
+    python -m benchmarks.mock_openai --port 8090 --latency lognormal:0.6,0.4
+"""
+import argparse
+import ast
+import asyncio
+import json
+import random
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# System prompt fragment -> request kind, checked in order
+REQUEST_KINDS: List[Tuple[str, str]] = [
+    ("question-based inquirer", "question"),
+    ("one turn of a philosophical discussion", "fast_turn"),
+    ("discussion facilitator", "opening"),
+    ("select the next relevant question", "next_question"),
+    ("facilitating a philosophical discussion", "reply"),
+    ("analyzing philosophical positions", "equilibrium"),
+    ("summarizing a philosophical discussion", "summary"),
+    ("objections to thesis statements", "antithesis"),
+    ("thesis statements", "thesis"),
+    ("synthetic positions", "synthesis"),
+    ("identifying the philosophical viewpoint", "view_identity"),
+    ("evaluating statements for meaningfulness", "nonsense"),
+    ("several independent requests", "batch"),
+]
+
+WORDS = (
+    "truth justification belief knowledge reason evidence doubt certainty mind "
+    "world language meaning value virtue duty freedom cause necessity possibility "
+    "identity time self other perception memory testimony intuition concept"
+).split()
+
+class LatencyDistribution:
+    """
+    Seconds to wait before answering, parsed from "fixed:S", "uniform:LOW,HIGH",
+    "normal:MEAN,STDDEV" or "lognormal:MEDIAN,SIGMA". Samples are never negative.
+    """
+    def __init__(self, spec: str):
+        self.spec = spec
+        kind, _, params = spec.partition(":")
+        values = [float(value) for value in params.split(",")] if params else []
+        samplers = {
+            "fixed": (1, lambda rng: values[0]),
+            "uniform": (2, lambda rng: rng.uniform(values[0], values[1])),
+            "normal": (2, lambda rng: rng.gauss(values[0], values[1])),
+            "lognormal": (2, lambda rng: values[0] * rng.lognormvariate(0, values[1])),
+        }
+        if kind not in samplers or len(values) != samplers[kind][0]:
+            raise ValueError(f"Invalid latency distribution '{spec}'")
+        self._sample = samplers[kind][1]
+
+    def sample(self, rng: random.Random) -> float:
+        return max(0.0, self._sample(rng))
+
+class MockOpenAI:
+    """
+    The mock's behaviour and counters.
+
+    Equilibrium checks answer 'true' once the positions in the prompt reach
+    `equilibrium_after`, so simulated discussions end after a known number
+    of turns.
+    """
+    def __init__(
+        self,
+        latency: str = "fixed:0",
+        latency_for: Optional[Dict[str, str]] = None,
+        token_interval: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 429,
+        retry_after: Optional[float] = 0.1,
+        equilibrium_after: int = 3,
+        seed: Optional[int] = None
+    ):
+        """
+        Args:
+            latency: Default time-to-first-token distribution
+            latency_for: Request kind -> distribution overrides (see REQUEST_KINDS)
+            token_interval: Seconds between streamed chunks
+            error_rate: Fraction of requests answered with error_status
+        """
+        self.latency = LatencyDistribution(latency)
+        self.latency_for = {kind: LatencyDistribution(spec) for kind, spec in (latency_for or {}).items()}
+        self.token_interval = token_interval
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.equilibrium_after = equilibrium_after
+        self.rng = random.Random(seed)
+        self.requests: Dict[str, int] = {}
+        self.errors = 0
+
+    @staticmethod
+    def classify(messages: List[Dict[str, str]]) -> str:
+        system = " ".join(message.get("content") or "" for message in messages if message.get("role") == "system")
+        for fragment, kind in REQUEST_KINDS:
+            if fragment in system:
+                return kind
+        return "other"
+
+    def _phrase(self, count: int) -> str:
+        return " ".join(self.rng.choice(WORDS) for _ in range(count))
+
+    @staticmethod
+    def _listed_questions(prompt: str) -> List[str]:
+        match = re.search(r"from this list: (.*)\nBase your choice", prompt, re.S)
+        if not match:
+            return []
+        try:
+            questions = ast.literal_eval(match.group(1).strip())
+        except (ValueError, SyntaxError):
+            return re.findall(r"'([^']+\?)'", match.group(1))
+        if isinstance(questions, dict):
+            questions = questions.get("questions", [])
+        return [str(question) for question in questions]
+
+    def _reached_equilibrium(self, prompt: str) -> bool:
+        omitted = re.search(r"\((\d+) earlier positions omitted\)", prompt)
+        positions = prompt.count("\nA: ") + (int(omitted.group(1)) if omitted else 0)
+        return positions >= self.equilibrium_after
+
+    def answer(self, kind: str, prompt: str) -> str:
+        if kind == "question":
+            return f"On {self._phrase(3)}\nWhat does {self._phrase(6)} presuppose?"
+        if kind == "next_question":
+            questions = self._listed_questions(prompt)
+            return self.rng.choice(questions) if questions else f"What is {self._phrase(3)}?"
+        if kind == "equilibrium":
+            return "true" if self._reached_equilibrium(prompt) else "false"
+        if kind == "fast_turn":
+            candidates = re.search(r"Candidate next questions \(JSON array\): (.*)", prompt)
+            questions = json.loads(candidates.group(1)) if candidates else []
+            return json.dumps({
+                "next_question": self.rng.choice(questions) if questions else f"What is {self._phrase(3)}?",
+                "reply": " ".join(f"That {self._phrase(10)}." for _ in range(3)),
+                "equilibrium": self._reached_equilibrium(prompt)
+            })
+        if kind in ("thesis", "antithesis"):
+            return "\n".join(f"The {self._phrase(4)} is {self._phrase(3)}." for _ in range(3))
+        if kind == "synthesis":
+            return "\n".join(f"Both {self._phrase(3)} and {self._phrase(3)} hold." for _ in range(8))
+        if kind == "view_identity":
+            return self.rng.choice(["Empiricism", "Rationalism", "Pragmatism", "Skepticism"])
+        if kind == "nonsense":
+            return "false"
+        if kind == "batch":
+            count = int(re.search(r"Answer each of the (\d+)", prompt).group(1))
+            return json.dumps([self.rng.choice(["Empiricism", "false"]) for _ in range(count)])
+        if kind == "summary":
+            return " ".join(f"The user {self._phrase(8)}." for _ in range(4))
+        return " ".join(f"That {self._phrase(10)}." for _ in range(3))
+
+    def _delay(self, kind: str) -> float:
+        return self.latency_for.get(kind, self.latency).sample(self.rng)
+
+    @staticmethod
+    def _usage(messages: List[Dict[str, str]], content: str) -> Dict[str, int]:
+        prompt_tokens = sum(len(message.get("content") or "") for message in messages) // 4
+        completion_tokens = len(content) // 4
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+
+    async def complete(self, body: dict):
+        messages = body.get("messages", [])
+        kind = self.classify(messages)
+        self.requests[kind] = self.requests.get(kind, 0) + 1
+        await asyncio.sleep(self._delay(kind))
+        if self.rng.random() < self.error_rate:
+            self.errors += 1
+            headers = {"retry-after": str(self.retry_after)} if self.retry_after is not None else {}
+            return JSONResponse(
+                {"error": {"message": "Mock failure", "type": "mock_error", "code": None}},
+                status_code=self.error_status,
+                headers=headers
+            )
+
+        prompt = messages[-1].get("content", "") if messages else ""
+        content = self.answer(kind, prompt)
+        completion_id = f"chatcmpl-mock-{time.monotonic_ns()}"
+        model = body.get("model", "mock")
+        if body.get("stream"):
+            return StreamingResponse(self._stream(completion_id, model, content), media_type="text/event-stream")
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+            "usage": self._usage(messages, content)
+        }
+
+    async def _stream(self, completion_id: str, model: str, content: str):
+        def chunk(delta: dict, finish_reason: Optional[str] = None) -> str:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            }
+            return f"data: {json.dumps(payload)}\n\n"
+
+        yield chunk({"role": "assistant", "content": ""})
+        for word in re.findall(r"\S+\s*", content):
+            if self.token_interval:
+                await asyncio.sleep(self.token_interval)
+            yield chunk({"content": word})
+        yield chunk({}, "stop")
+        yield "data: [DONE]\n\n"
+
+    def stats(self) -> Dict[str, object]:
+        return {"requests": dict(self.requests), "errors": self.errors}
+
+def create_app(mock: MockOpenAI) -> FastAPI:
+    mock_app = FastAPI()
+
+    @mock_app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        return await mock.complete(await request.json())
+
+    @mock_app.get("/stats")
+    async def stats():
+        return mock.stats()
+
+    return mock_app
+
+def _parse_latency_for(values: List[str]) -> Dict[str, str]:
+    overrides = {}
+    for value in values:
+        kind, _, spec = value.partition("=")
+        overrides[kind] = spec
+    return overrides
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible mock server for load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", default="lognormal:0.5,0.4", help="fixed:S, uniform:LOW,HIGH, normal:MEAN,SD or lognormal:MEDIAN,SIGMA")
+    parser.add_argument("--latency-for", action="append", default=[], metavar="KIND=DIST", help="Per-kind override, e.g. reply=lognormal:1.2,0.5")
+    parser.add_argument("--token-interval", type=float, default=0.01)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=429)
+    parser.add_argument("--retry-after", type=float, default=0.1)
+    parser.add_argument("--equilibrium-after", type=int, default=3)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    mock = MockOpenAI(
+        latency=args.latency,
+        latency_for=_parse_latency_for(args.latency_for),
+        token_interval=args.token_interval,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        retry_after=args.retry_after,
+        equilibrium_after=args.equilibrium_after,
+        seed=args.seed
+    )
+    uvicorn.run(create_app(mock), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
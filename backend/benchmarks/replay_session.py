@@ -0,0 +1,133 @@
+"""
+Offline regression run: one scripted discussion (graph build, opening,
+turns and summary) with every completion recorded to, or replayed from,
+a recording file beneath the LLM gateway.
+
+Record once, against the API or the mock server:
+
+    python -m benchmarks.mock_openai --port 8090 --latency lognormal:0.5,0.4 &
+    LLM_BASE_URL=http://127.0.0.1:8090/v1 OPENAI_API_KEY=mock \\
+        python -m benchmarks.replay_session --record runs/session.jsonl.gz
+
+then replay it on any commit, with no network, at recorded speed or faster:
+
+    python -m benchmarks.replay_session --replay runs/session.jsonl.gz --latency-scale 0 --repeat 5
+
+Each run reports wall time, CPU time and peak traced Python memory (with
+--trace-memory), and how many requests matched the recording exactly.
+Fallbacks mean the prompts changed since the recording, so timings are
+only comparable where they are zero. Run from the backend directory.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import time
+import tracemalloc
+from typing import Any, Dict, List
+
+from benchmarks.stats import peak_rss
+
+ANSWERS = [
+    "I think knowledge is justified true belief, though Gettier cases trouble me.",
+    "It depends on whether we can ever be certain of our evidence.",
+    "Perhaps reliability of the process matters more than justification.",
+    "I am now inclined to say context decides what counts as knowing.",
+    "Maybe the concept has no single definition at all.",
+]
+
+async def run_session(args: argparse.Namespace) -> Dict[str, Any]:
+    # Imported here so the gateway is configured from the environment set in main()
+    from app.philosophical_discussion_bot import AsyncPhilosophicalDiscussionBot
+    from app.question_graph import AsyncQuestionGraph
+
+    api_key = os.getenv("OPENAI_API_KEY")
+    graph = await AsyncQuestionGraph.build_async(api_key, args.question, num_nodes=args.nodes, max_concurrency=args.concurrency)
+    bot = AsyncPhilosophicalDiscussionBot(graph, api_key=api_key, fast_turns=args.fast_turns)
+    await bot.start_discussion()
+
+    async def collect(deltas) -> str:
+        return "".join([delta async for delta in deltas])
+
+    turns = 0
+    for answer in ANSWERS[:args.turns]:
+        results = await bot.plan_turn(answer, stream_response=collect if args.stream else None).run()
+        turns += 1
+        if args.stream and results.get("summary") is not None:
+            await collect(results["summary"])
+        if results["equilibrium"]:
+            break
+    return {"nodes": len(graph.core.texts), "turns": turns}
+
+def run_once(args: argparse.Namespace, index: int) -> Dict[str, Any]:
+    random.seed(args.seed)
+    if args.trace_memory:
+        tracemalloc.start()
+    wall, cpu = time.perf_counter(), time.process_time()
+    session = asyncio.run(run_session(args))
+    result = {
+        "run": index,
+        "wall_seconds": round(time.perf_counter() - wall, 4),
+        "cpu_seconds": round(time.process_time() - cpu, 4),
+        **session
+    }
+    if args.trace_memory:
+        result["peak_traced_bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Record or replay one scripted discussion for offline performance comparisons")
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--record", metavar="PATH", help="Call the API (or LLM_BASE_URL) and append every completion to PATH")
+    mode.add_argument("--replay", metavar="PATH", help="Serve every completion from PATH, with no network")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="Factor on replayed latencies; 0 replays without waiting")
+    parser.add_argument("--strict", action="store_true", help="Fail on requests with no exact match in the recording")
+    parser.add_argument("--repeat", type=int, default=1, help="Replay runs to make")
+    parser.add_argument("--question", default="What is knowledge?")
+    parser.add_argument("--nodes", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=4, help="Graph build concurrency; 1 makes request order fully deterministic")
+    parser.add_argument("--turns", type=int, default=len(ANSWERS))
+    parser.add_argument("--stream", action="store_true", help="Stream replies and the summary")
+    parser.add_argument("--fast-turns", action="store_true")
+    parser.add_argument("--trace-memory", action="store_true", help="Report peak Python allocations per run (slower)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    if args.record:
+        os.environ["LLM_RECORD"] = args.record
+    else:
+        os.environ["LLM_REPLAY"] = args.replay
+        os.environ["LLM_REPLAY_LATENCY_SCALE"] = str(args.latency_scale)
+        os.environ["LLM_REPLAY_STRICT"] = "1" if args.strict else "0"
+
+    from app.llm_gateway import get_gateway
+    gateway = get_gateway(os.getenv("OPENAI_API_KEY"))
+    runs: List[Dict[str, Any]] = []
+    for index in range(1 if args.record else args.repeat):
+        runs.append(run_once(args, index))
+        print(" ".join(f"{key}={value}" for key, value in runs[-1].items()))
+
+    report: Dict[str, Any] = {"runs": runs, "peak_rss_bytes": peak_rss()}
+    for key in ("wall_seconds", "cpu_seconds"):
+        report[f"median_{key}"] = statistics.median(run[key] for run in runs)
+    if args.record:
+        report["recorded"] = gateway.record.records
+        gateway.record.close()
+    else:
+        report["exact_matches"] = gateway.replay.hits
+        report["fallbacks"] = gateway.replay.fallbacks
+    print(f"Median wall {report['median_wall_seconds']:.3f}s  CPU {report['median_cpu_seconds']:.3f}s  peak RSS {report['peak_rss_bytes'] / 2**20:.1f}MB")
+    if args.record:
+        print(f"Recorded {report['recorded']} completions to {args.record}")
+    else:
+        print(f"Exact matches {report['exact_matches']}, fallbacks {report['fallbacks']}")
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(report, file, indent=2)
+
+if __name__ == "__main__":
+    main()
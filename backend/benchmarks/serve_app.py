@@ -0,0 +1,63 @@
+"""
+Runs the app under uvicorn with the probes the load test reads: event-loop
+lag and resident memory, served from GET /benchmark/stats and cleared with
+POST /benchmark/reset. The app itself is unchanged.
+
+    python -m benchmarks.serve_app --port 8001
+"""
+import argparse
+import asyncio
+from collections import deque
+from typing import Deque, Dict
+
+import uvicorn
+
+from app.main import app, manager
+from benchmarks.stats import current_rss, peak_rss, percentile
+
+LAG_INTERVAL = 0.02
+
+lag_samples: Deque[float] = deque(maxlen=200000)
+
+async def probe_loop_lag() -> None:
+    """Record how late a short sleep wakes up; anything blocking the loop shows up here"""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(LAG_INTERVAL)
+        lag_samples.append(loop.time() - started - LAG_INTERVAL)
+
+@app.on_event("startup")
+async def start_lag_probe():
+    asyncio.create_task(probe_loop_lag())
+
+@app.get("/benchmark/stats")
+async def benchmark_stats() -> Dict[str, object]:
+    samples = list(lag_samples)
+    return {
+        "rss_bytes": current_rss(),
+        "peak_rss_bytes": peak_rss(),
+        "sessions": len(manager.discussion_bots),
+        "loop_lag": {
+            "samples": len(samples),
+            "p50": percentile(samples, 50),
+            "p95": percentile(samples, 95),
+            "p99": percentile(samples, 99),
+            "max": max(samples) if samples else None
+        }
+    }
+
+@app.post("/benchmark/reset")
+async def benchmark_reset():
+    lag_samples.clear()
+    return {"rss_bytes": current_rss()}
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the app with load-test probes")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
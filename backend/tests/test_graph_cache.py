@@ -0,0 +1,97 @@
+import asyncio
+import types
+
+import pytest
+
+from app.graph_cache import GraphCache
+from app.graph_core import GraphCore
+from app.question_graph import QuestionGraph
+
+class CountingCache(GraphCache):
+    """Counts finished lookups; a caller past its lookup is building or waiting on a build"""
+    lookups = 0
+
+    async def get(self, central_question, **params):
+        cached = await super().get(central_question, **params)
+        self.lookups += 1
+        return cached
+
+def make_cache(tmp_path):
+    return CountingCache(path=str(tmp_path / "graphs.sqlite3"))
+
+async def until(condition):
+    while not condition():
+        await asyncio.sleep(0.001)
+
+def make_build(builds, nodes=2, started=None, release=None):
+    """A build that records its calls and adds `nodes - 1` children, optionally pausing on `release`"""
+    async def build():
+        builds.append(len(builds))
+        if started is not None:
+            started.set()
+        if release is not None:
+            await release.wait()
+        core = GraphCore("What is knowledge?")
+        for number in range(1, nodes):
+            core.add(f"Q{number}", "summary", 0)
+        return types.SimpleNamespace(central_question="What is knowledge?", core=core)
+    return build
+
+def test_concurrent_callers_share_one_build(tmp_path):
+    cache = make_cache(tmp_path)
+    builds = []
+
+    async def main():
+        release = asyncio.Event()
+        build = make_build(builds, release=release)
+        tasks = [asyncio.create_task(cache.get_or_build("What is knowledge?", build, num_nodes=2)) for _ in range(5)]
+        await until(lambda: cache.lookups == 5)
+        release.set()
+        return await asyncio.gather(*tasks)
+
+    results = asyncio.run(main())
+    assert builds == [0]
+    assert all(result is results[0] for result in results)
+    assert cache.misses == 1 and cache.coalesced == 4
+
+def test_waiters_take_over_when_the_builder_is_cancelled(tmp_path):
+    cache = make_cache(tmp_path)
+    builds = []
+
+    async def main():
+        started, release = asyncio.Event(), asyncio.Event()
+        builder = asyncio.create_task(cache.get_or_build("What is knowledge?", make_build(builds, started=started, release=release), num_nodes=2))
+        await started.wait()
+        waiters = [asyncio.create_task(cache.get_or_build("What is knowledge?", make_build(builds), num_nodes=2)) for _ in range(3)]
+        await until(lambda: cache.lookups == 4)
+        builder.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await builder
+        return await asyncio.gather(*waiters)
+
+    results = asyncio.run(main())
+    assert len(builds) == 2
+    assert cache.misses == 2 and cache.coalesced == 2
+    assert all(len(result.core) == 2 and result is results[0] for result in results)
+
+def test_partial_builds_are_not_stored(tmp_path):
+    cache = make_cache(tmp_path)
+    builds = []
+    partial = asyncio.run(cache.get_or_build("What is knowledge?", make_build(builds, nodes=2), num_nodes=3))
+    assert len(partial.core) == 2
+    assert asyncio.run(cache.get("What is knowledge?", num_nodes=3)) is None
+    assert asyncio.run(make_cache(tmp_path).get("What is knowledge?", num_nodes=3)) is None
+    asyncio.run(cache.get_or_build("What is knowledge?", make_build(builds, nodes=3), num_nodes=3))
+    assert len(builds) == 2
+    assert len(asyncio.run(make_cache(tmp_path).get("What is knowledge?", num_nodes=3)).core) == 3
+
+def test_sessions_fork_the_cached_graph(tmp_path):
+    cache = make_cache(tmp_path)
+    cached = asyncio.run(cache.get_or_build("What is knowledge?", make_build([], nodes=3), num_nodes=3))
+    first = QuestionGraph.from_cached("test-key", cached, duplicate_threshold=None)
+    second = QuestionGraph.from_cached("test-key", cached, duplicate_threshold=None)
+    assert first.add_question("Q1", "summary", "Is knowledge justified true belief?")
+    assert len(first.core) == 4
+    assert len(second.core) == len(cached.core) == 3
+    assert "Is knowledge justified true belief?" not in cached.core
+    assert len(asyncio.run(make_cache(tmp_path).get("What is knowledge?", num_nodes=3)).core) == 3
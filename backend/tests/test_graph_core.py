@@ -0,0 +1,60 @@
+import random
+
+from app.graph_core import GraphCore, GraphView
+
+def make_core():
+    core = GraphCore("root", "root summary", max_children=2)
+    first = core.add("first", "s1", 0)
+    core.add("second", "s2", 0)
+    core.add("grandchild", "s3", first)
+    return core
+
+def test_add_tracks_parents_children_and_index():
+    core = make_core()
+    assert len(core) == 4
+    assert core.children_of(0) == (1, 2)
+    assert core.parent_of(3) == 1 and core.parent_of(0) is None
+    assert core.id_of("grandchild") == 3 and "second" in core and "missing" not in core
+
+def test_expandable_counts_reserved_slots():
+    core = make_core()
+    assert sorted(core.expandable) == [1, 2, 3]
+    core.reserve(1)
+    assert not core.has_free_slot(1) and core.has_capacity(1)
+    core.release(1)
+    assert core.has_free_slot(1)
+    assert core.random_expandable(random.Random(0)) in {1, 2, 3}
+
+def test_fork_shares_storage_until_written():
+    core = make_core()
+    clone = core.fork()
+    assert clone.texts is core.texts and clone.children is core.children
+
+    clone.add("clone only", "s4", 2)
+    assert clone.texts is not core.texts
+    assert len(core) == 4 and "clone only" not in core
+    assert core.children_of(2) == () and clone.children_of(2) == (4,)
+
+def test_writing_to_the_original_leaves_the_fork_intact():
+    core = make_core()
+    clone = core.fork()
+    core.reserve(2)
+    core.reserve(2)
+    core.add("original only", "s4", 3)
+    assert len(clone) == 4 and "original only" not in clone
+    assert clone.has_free_slot(2) and not core.has_free_slot(2)
+
+def test_forks_of_forks_are_independent():
+    core = make_core()
+    first, second = core.fork(), core.fork()
+    first.add("a", "", 2)
+    second.add("b", "", 2)
+    assert first.texts[4:] == ["a"] and second.texts[4:] == ["b"] and len(core) == 4
+
+def test_dict_round_trip_and_view():
+    core = make_core()
+    restored = GraphCore.from_dict(core.to_dict())
+    assert restored.texts == core.texts and restored.children == core.children
+    view = GraphView(restored)
+    assert view["root"] == {"summary": "root summary", "questions": ["first", "second"]}
+    assert list(view) == ["root", "first", "second", "grandchild"] and len(view) == 4
@@ -0,0 +1,59 @@
+import asyncio
+import time
+import types
+
+from app.graph_cache import GraphCache
+from app.graph_core import GraphCore
+from app.graph_prewarmer import GraphPrewarmer
+
+def make_prewarmer(tmp_path, params, ttl=3600.0):
+    cache = GraphCache(path=str(tmp_path / "graphs.sqlite3"), ttl=ttl)
+    builds = []
+
+    async def build(question):
+        builds.append(question)
+        core = GraphCore(question)
+        core.add(f"{question} child", "summary", 0)
+        return types.SimpleNamespace(central_question=question, core=core)
+
+    prewarmer = GraphPrewarmer(
+        cache,
+        ["What is knowledge?"],
+        build=build,
+        open_session=lambda cached: types.SimpleNamespace(core=cached.core.fork()),
+        num_nodes=2,
+        pool_size=2,
+        min_interval=0,
+        cache_params=lambda: dict(params)
+    )
+    return prewarmer, builds
+
+def test_pool_serves_seed_questions_only(tmp_path):
+    prewarmer, builds = make_prewarmer(tmp_path, {"model": "m"})
+    asyncio.run(prewarmer._fill("what is knowledge?"))
+    assert prewarmer.take("What is truth?") is None
+    assert len(prewarmer.take("  what is KNOWLEDGE? ").core) == 2
+    assert builds == ["What is knowledge?"]
+    assert prewarmer.stats()["ready"] == {"What is knowledge?": 1}
+
+def test_graphs_built_under_another_key_are_discarded(tmp_path):
+    params = {"model": "m", "prompt": "v1"}
+    prewarmer, builds = make_prewarmer(tmp_path, params)
+    asyncio.run(prewarmer._fill("what is knowledge?"))
+    params["prompt"] = "v2"
+    prewarmer.cache_params = lambda: dict(params)
+    assert prewarmer.take("What is knowledge?") is None
+    assert prewarmer.expired == 2
+    asyncio.run(prewarmer._fill("what is knowledge?"))
+    assert len(builds) == 2
+    assert prewarmer.take("What is knowledge?") is not None
+
+def test_graphs_past_the_cache_ttl_are_discarded_and_rebuilt(tmp_path):
+    prewarmer, builds = make_prewarmer(tmp_path, {"model": "m"}, ttl=0.05)
+    asyncio.run(prewarmer._fill("what is knowledge?"))
+    time.sleep(0.1)
+    assert prewarmer.take("What is knowledge?") is None
+    assert prewarmer.expired == 2
+    asyncio.run(prewarmer._fill("what is knowledge?"))
+    assert len(builds) == 2
+    assert prewarmer.take("What is knowledge?") is not None
@@ -0,0 +1,63 @@
+import asyncio
+import types
+
+from app.llm_gateway import AsyncGatewayClient, LLMGateway
+from app.response_cache import stream_cached_completion
+
+class StreamingClient:
+    """Raw async client whose streams yield one delta, then the rest once `gate` is set"""
+    def __init__(self, chunks=3):
+        self.chunks = chunks
+        self.gate = None
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=self.create))
+
+    async def create(self, **request):
+        async def stream():
+            for number in range(self.chunks):
+                if number:
+                    await self.gate.wait()
+                yield types.SimpleNamespace(choices=[types.SimpleNamespace(delta=types.SimpleNamespace(content=str(number)))])
+        return stream()
+
+async def settle():
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+def test_streams_hold_their_slot_until_read_or_closed():
+    gateway = LLMGateway(limits={}, max_inflight=1)
+    raw = StreamingClient()
+    client = AsyncGatewayClient(gateway, raw)
+
+    async def read(limit=None):
+        deltas = []
+        async for delta in stream_cached_completion(client, None, "test", model="m", messages=[]):
+            deltas.append(delta)
+            if len(deltas) == limit:
+                break
+        return deltas
+
+    async def run():
+        raw.gate = asyncio.Event()
+        first = asyncio.create_task(read())
+        await settle()
+        second = asyncio.create_task(read())
+        await settle()
+        # The first stream is still open, so the second call waits for its slot
+        assert gateway.scheduler.inflight == 1 and gateway.scheduler.queued == 1
+        raw.gate.set()
+        assert await first == ["0", "1", "2"]
+        assert await second == ["0", "1", "2"]
+        assert gateway.scheduler.inflight == 0
+
+        # A reader that stops early frees the slot too
+        raw.gate = asyncio.Event()
+        assert await read(limit=1) == ["0"]
+        await settle()
+        return gateway.scheduler.inflight, gateway.scheduler.queued
+
+    assert asyncio.run(run()) == (0, 0)
+
+def test_no_client_side_rate_limits_by_default():
+    gateway = LLMGateway()
+    assert gateway.limits == {}
+    assert gateway._admission_delay({"model": "gpt-4o", "messages": [], "max_tokens": 10 ** 6}, 10 ** 6) == 0.0
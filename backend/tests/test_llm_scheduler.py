@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+from app.llm_scheduler import LLMScheduler, WorkTag, current_work, llm_work
+
+def make_scheduler(**options):
+    return LLMScheduler(lambda request: 1, lambda request, estimate: 0.0, lambda request, estimate: None, max_inflight=1, **options)
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+async def grant_order(scheduler, calls, before_release=None):
+    """Queue `calls` of (work, client_id, name) behind a held slot and return the order they are granted in"""
+    await scheduler.acquire({"name": "holder"})
+    order = []
+
+    async def call(work, client_id, name):
+        with llm_work(work, client_id):
+            await scheduler.acquire({"name": name})
+        order.append(name)
+
+    tasks = [asyncio.create_task(call(*spec)) for spec in calls]
+    await settle()
+    if before_release is not None:
+        await before_release()
+    for _ in calls:
+        scheduler.release()
+        await settle()
+    await asyncio.gather(*tasks)
+    scheduler.release()
+    return order
+
+def test_more_urgent_work_classes_go_first():
+    calls = [("background", "a", "bg"), ("setup", "a", "setup"), ("interactive", "a", "turn")]
+    assert asyncio.run(grant_order(make_scheduler(), calls)) == ["turn", "setup", "bg"]
+
+def test_clients_take_turns_within_a_class():
+    calls = [
+        ("interactive", "a", "a1"), ("interactive", "a", "a2"), ("interactive", "a", "a3"),
+        ("interactive", "b", "b1"), ("interactive", "c", "c1"), ("interactive", "b", "b2"),
+    ]
+    assert asyncio.run(grant_order(make_scheduler(), calls)) == ["a1", "b1", "c1", "a2", "b2", "a3"]
+
+def test_starved_background_work_goes_ahead():
+    scheduler = make_scheduler(starvation_after=0.05)
+
+    async def run():
+        await scheduler.acquire({"name": "holder"})
+        order = []
+
+        async def call(work, name):
+            with llm_work(work, "a"):
+                await scheduler.acquire({"name": name})
+            order.append(name)
+
+        background = asyncio.create_task(call("background", "bg"))
+        await asyncio.sleep(0.1)
+        turns = [asyncio.create_task(call("interactive", f"turn{number}")) for number in range(2)]
+        await settle()
+        for _ in range(3):
+            scheduler.release()
+            await settle()
+        await asyncio.gather(background, *turns)
+        return order
+
+    assert asyncio.run(run()) == ["bg", "turn0", "turn1"]
+    assert scheduler.stats()["classes"]["background"]["starved"] == 1
+
+def test_promoting_a_tag_moves_its_queued_calls_up():
+    tag = WorkTag("background", "a")
+
+    async def promote():
+        tag.promote("interactive")
+
+    calls = [("setup", "b", "setup"), (tag, None, "prefetch")]
+    assert asyncio.run(grant_order(make_scheduler(), calls, before_release=promote)) == ["prefetch", "setup"]
+
+def test_cancelled_waiters_leave_the_queue():
+    scheduler = make_scheduler()
+
+    async def run():
+        await scheduler.acquire({})
+        waiter = asyncio.create_task(scheduler.acquire({}))
+        await settle()
+        assert scheduler.queued == 1
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        scheduler.release()
+        return scheduler.queued, scheduler.inflight
+
+    assert asyncio.run(run()) == (0, 0)
+
+def test_llm_work_inherits_the_client_and_can_keep_an_outer_tag():
+    with llm_work("interactive", "a") as outer:
+        with llm_work("background") as inner:
+            assert inner.client_id == "a" and current_work() is inner
+        with llm_work("setup", keep_existing=True) as kept:
+            assert kept is outer
+    assert current_work() is None
+    with pytest.raises(ValueError):
+        WorkTag("urgent")
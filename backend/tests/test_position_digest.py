@@ -0,0 +1,57 @@
+from app.position_digest import PositionDigest, TokenCounter
+
+LONG = "I think it depends on context and evidence. " * 20
+
+def test_small_digests_keep_every_position_verbatim():
+    digest = PositionDigest(budget=1000)
+    digest.update("Q1?", "Yes.")
+    digest.update("Q2?", "No.")
+    assert digest.text == "Q: Q1?\nA: Yes.\n\nQ: Q2?\nA: No."
+    assert digest.tokens == sum(digest.counter.count(digest._format(q, a)) for q, a in digest.entries.items())
+
+def test_older_positions_are_shortened_before_any_are_dropped():
+    counter = TokenCounter()
+    full = counter.count(PositionDigest._format("Q0?", LONG))
+    short = counter.count(PositionDigest._format("Q0?", counter.truncate(LONG, 20)))
+    # Room for the newest position in full and the others shortened, not for two in full
+    budget = full + 2 * short
+    digest = PositionDigest(budget=budget, entry_tokens=20, counter=counter)
+    for number in range(3):
+        digest.update(f"Q{number}?", LONG)
+    assert list(digest.entries) == ["Q0?", "Q1?", "Q2?"]
+    assert digest.shortened == {"Q0?", "Q1?"}
+    assert digest.entries["Q2?"] == LONG
+    assert digest.omitted == 0
+    assert digest.tokens <= budget
+
+def test_oldest_positions_are_dropped_to_stay_within_budget():
+    digest = PositionDigest(budget=150, entry_tokens=20)
+    for number in range(10):
+        digest.update(f"Q{number}?", LONG)
+        assert digest.tokens <= digest.budget
+    assert digest.omitted == 10 - len(digest)
+    assert next(reversed(digest.entries)) == "Q9?"
+    assert digest.text.startswith(f"({digest.omitted} earlier positions omitted)")
+
+def test_latest_position_alone_over_budget_is_truncated():
+    digest = PositionDigest(budget=30)
+    digest.update("Q0?", "Short.")
+    digest.update("Q1?", LONG)
+    assert list(digest.entries) == ["Q1?"]
+    assert digest.entries["Q1?"].endswith("...")
+    assert digest.tokens <= 30
+
+def test_reanswering_moves_the_question_to_newest():
+    digest = PositionDigest(budget=1000)
+    digest.update("Q1?", "Yes.")
+    digest.update("Q2?", "No.")
+    digest.update("Q1?", "Actually, no.")
+    assert list(digest.entries.items()) == [("Q2?", "No."), ("Q1?", "Actually, no.")]
+
+def test_dict_round_trip():
+    digest = PositionDigest(budget=150, entry_tokens=20)
+    for number in range(6):
+        digest.update(f"Q{number}?", LONG)
+    restored = PositionDigest.from_dict(digest.to_dict())
+    assert restored.text == digest.text and restored.tokens == digest.tokens
+    assert restored.shortened == digest.shortened and restored.omitted == digest.omitted
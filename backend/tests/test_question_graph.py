@@ -0,0 +1,41 @@
+from app.question_graph import QuestionGraph
+
+class SmallLogGraph(QuestionGraph):
+    CHANGE_LOG_LIMIT = 4
+
+def make_graph(graph_class=QuestionGraph):
+    return graph_class("test-key", "Q0", build=False, duplicate_threshold=None)
+
+def grow(graph, count):
+    """Add `count` questions, three children per node breadth first"""
+    for number in range(len(graph.core), len(graph.core) + count):
+        graph.add_question(graph.core.texts[(number - 1) // 3], f"summary {number}", f"Q{number}")
+
+def test_changes_since_returns_the_missing_nodes():
+    graph = make_graph()
+    grow(graph, 5)
+    changes = graph.changes_since(3)
+    assert [change["version"] for change in changes] == [4, 5]
+    assert changes[0]["node"] == {"id": 4, "summary": "summary 4", "question": "Q4"}
+    assert changes[0]["edge"] == {"source": 1, "target": 4}
+    assert graph.changes_since(5) == []
+
+def test_change_log_is_capped_and_old_versions_need_a_full_sync():
+    graph = make_graph(SmallLogGraph)
+    grow(graph, 10)
+    assert len(graph.change_log) == 4
+    assert graph.log_start_version == 6
+    assert graph.changes_since(5) is None
+    assert [change["version"] for change in graph.changes_since(6)] == [7, 8, 9, 10]
+
+def test_future_versions_need_a_full_sync():
+    graph = make_graph()
+    grow(graph, 2)
+    assert graph.changes_since(3) is None
+
+def test_near_duplicate_questions_are_not_added():
+    graph = QuestionGraph("test-key", "What is knowledge?", build=False)
+    assert graph.add_question("What is knowledge?", "s", "Is knowledge justified true belief?")
+    assert graph.add_question("What is knowledge?", "s", "Is knowledge justified belief?")
+    assert not graph.add_question("What is knowledge?", "s", "Is knowledge a justified true belief?")
+    assert graph.version == 2
@@ -0,0 +1,78 @@
+import pytest
+
+from app import philosophical_discussion_bot
+from app.philosophical_discussion_bot import PhilosophicalDiscussionBot
+from app.question_graph import QuestionGraph
+from app.question_ranker import QuestionRanker
+
+CHILDREN = {
+    "Can perception give us knowledge?": "Whether the senses justify beliefs about the world",
+    "Is memory a source of knowledge?": "Whether remembered beliefs count as knowledge",
+    "What role does testimony play?": "Knowledge gained from other people's reports",
+}
+
+def test_rank_puts_the_matching_candidate_first():
+    ranking = QuestionRanker().rank("I trust what my senses and perception tell me", CHILDREN)
+    assert ranking[0][0] == "Can perception give us knowledge?"
+    assert ranking[0][1] > ranking[1][1]
+
+def test_rank_keeps_graph_order_among_ties():
+    ranking = QuestionRanker().rank("nothing relevant here", CHILDREN)
+    assert [question for question, _ in ranking] == list(CHILDREN)
+    assert all(score == 0 for _, score in ranking)
+
+@pytest.mark.parametrize("ranking, margin, expected", [
+    ([("a", 2.0), ("b", 1.0)], 0.25, "a"),   # leads by half the top score
+    ([("a", 2.0), ("b", 1.6)], 0.25, None),  # leads by a fifth
+    ([("a", 2.0), ("b", 1.5)], 0.25, "a"),   # exactly the margin
+    ([("a", 0.0), ("b", 0.0)], 0.25, None),  # nothing matched
+    ([("a", 2.0), ("b", 0.0)], None, None),  # no margin always asks the model
+    ([("a", 0.0)], 0.25, "a"),               # a single child needs no choice
+    ([], 0.25, None),
+])
+def test_decide_thresholds(ranking, margin, expected):
+    assert QuestionRanker(margin=margin).decide(ranking) == expected
+
+@pytest.mark.parametrize("answer, expected", [
+    ("Is memory a source of knowledge?", "Is memory a source of knowledge?"),
+    ('2. "is memory a source of knowledge?"\nBecause the user mentioned remembering', "Is memory a source of knowledge?"),
+    ("Next question: What role does testimony play", "What role does testimony play?"),
+    ("Can perception give knowledge?", "Can perception give us knowledge?"),
+    ("Should we trust experts?", None),
+])
+def test_resolve_maps_answers_onto_candidates(answer, expected):
+    assert QuestionRanker().resolve(answer, list(CHILDREN)) == expected
+
+@pytest.fixture
+def bot():
+    graph = QuestionGraph("test-key", "What is knowledge?", build=False, duplicate_threshold=None)
+    for question, summary in CHILDREN.items():
+        graph.add_question("What is knowledge?", summary, question)
+    return PhilosophicalDiscussionBot(graph, "test-key")
+
+def answer_with(monkeypatch, content):
+    calls = []
+
+    def fake_completion(client, cache, site, **request):
+        calls.append(site)
+        return content
+    monkeypatch.setattr(philosophical_discussion_bot, "cached_completion", fake_completion)
+    return calls
+
+def test_clear_winner_needs_no_completion(bot, monkeypatch):
+    calls = answer_with(monkeypatch, "What role does testimony play?")
+    assert bot._determine_next_question("My senses and perception are reliable") == "Can perception give us knowledge?"
+    assert calls == []
+
+def test_close_call_asks_the_model(bot, monkeypatch):
+    calls = answer_with(monkeypatch, "What role does testimony play?")
+    assert bot._determine_next_question("I am not sure") == "What role does testimony play?"
+    assert calls == ["determine_next_question"]
+
+def test_unknown_model_answer_falls_back_to_the_best_ranked(bot, monkeypatch):
+    calls = answer_with(monkeypatch, "Should we trust experts?")
+    assert bot._determine_next_question("Memory and perception both matter") == "Is memory a source of knowledge?"
+    assert calls == ["determine_next_question"]
+
+def test_fallback_without_children_stays_on_the_current_question(bot):
+    assert bot._resolve_next_question("Anything", []) == "What is knowledge?"
@@ -0,0 +1,88 @@
+import asyncio
+import time
+import types
+
+import pytest
+
+from app.response_cache import ResponseCache, async_cached_completion, cached_completion, stream_cached_completion
+
+REQUEST = {"model": "gpt-4o", "messages": [{"role": "user", "content": "What is knowledge?"}], "max_tokens": 50}
+
+class FakeClient:
+    """Sync chat client answering each call with a new numbered reply"""
+    def __init__(self):
+        self.calls = 0
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=self.create))
+
+    def reply(self):
+        self.calls += 1
+        return f"reply {self.calls}"
+
+    def create(self, **request):
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=types.SimpleNamespace(content=self.reply()))])
+
+class FakeAsyncClient(FakeClient):
+    async def create(self, stream=False, **request):
+        content = self.reply()
+        if not stream:
+            return types.SimpleNamespace(choices=[types.SimpleNamespace(message=types.SimpleNamespace(content=content))])
+
+        async def chunks():
+            for word in content.split(" "):
+                yield types.SimpleNamespace(choices=[types.SimpleNamespace(delta=types.SimpleNamespace(content=word))])
+        return chunks()
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ResponseCache(path=str(tmp_path / "responses.sqlite3"))
+    yield cache
+    cache.close()
+
+def rows(cache):
+    return cache._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+async def collect(deltas):
+    return "".join([delta async for delta in deltas])
+
+def test_repeated_requests_are_served_from_the_cache(cache):
+    client = FakeClient()
+    assert cached_completion(client, cache, "generate_question", **REQUEST) == "reply 1"
+    assert cached_completion(client, cache, "generate_question", **REQUEST) == "reply 1"
+    assert asyncio.run(async_cached_completion(FakeAsyncClient(), cache, "generate_question", **REQUEST)) == "reply 1"
+    assert client.calls == 1
+    assert (cache.hits, cache.misses) == (2, 1)
+
+@pytest.mark.parametrize("site", ["discussion_response", "fast_turn", "check_equilibrium", "get_summary"])
+def test_uncached_sites_never_read_or_write(cache, site):
+    client, async_client = FakeClient(), FakeAsyncClient()
+    assert cached_completion(client, cache, site, **REQUEST) == "reply 1"
+    assert cached_completion(client, cache, site, **REQUEST) == "reply 2"
+    assert asyncio.run(async_cached_completion(async_client, cache, site, **REQUEST)) == "reply 1"
+    assert asyncio.run(collect(stream_cached_completion(async_client, cache, site, **REQUEST))) == "reply2"
+    assert (cache.hits, cache.misses, cache.bypassed) == (0, 0, 4)
+    assert rows(cache) == 0 and not cache._memory
+
+def test_fresh_skips_the_read_but_refreshes_the_entry(cache):
+    client = FakeClient()
+    cached_completion(client, cache, "generate_question", **REQUEST)
+    assert cached_completion(client, cache, "generate_question", fresh=True, **REQUEST) == "reply 2"
+    assert asyncio.run(async_cached_completion(FakeAsyncClient(), cache, "generate_question", fresh=True, **REQUEST)) == "reply 1"
+    assert cache.hits == 0
+    # The last fresh answer replaced the entry in memory and on disk
+    assert cached_completion(client, cache, "generate_question", **REQUEST) == "reply 1"
+    cache._memory.clear()
+    assert cache.get(ResponseCache.make_key(**REQUEST)) == "reply 1"
+    assert client.calls == 2
+
+def test_expired_entries_are_removed_from_memory_and_disk(cache, monkeypatch):
+    client = FakeClient()
+    cache.ttls["generate_question"] = 60
+    cached_completion(client, cache, "generate_question", **REQUEST)
+    key = ResponseCache.make_key(**REQUEST)
+    assert key in cache._memory and rows(cache) == 1
+
+    later = time.time() + 61
+    monkeypatch.setattr("app.response_cache.time", types.SimpleNamespace(time=lambda: later))
+    assert cache.get(key) is None
+    assert key not in cache._memory and rows(cache) == 0
+    assert cached_completion(client, cache, "generate_question", **REQUEST) == "reply 2"
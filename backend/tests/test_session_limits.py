@@ -0,0 +1,76 @@
+import types
+
+import pytest
+
+from app.conversation_history import ConversationHistory
+from app.session_limits import SessionTracker
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = types.SimpleNamespace(now=1000.0)
+    clock.monotonic = lambda: clock.now
+    monkeypatch.setattr("app.session_limits.time", clock)
+    return clock
+
+def tracker_with(*client_ids, **options):
+    tracker = SessionTracker(**options)
+    for client_id in client_ids:
+        tracker.touch(client_id)
+    return tracker
+
+def test_evicts_least_recently_used_over_the_session_cap(clock):
+    tracker = tracker_with("a", "b", "c", "d", max_sessions=2)
+    tracker.touch("a")
+    assert tracker.over_limit() == ["b", "c"]
+
+def test_eviction_skips_kept_and_busy_sessions(clock):
+    tracker = tracker_with("a", "b", "c", max_sessions=1)
+    tracker.set_busy("a", True)
+    tracker.touch("b")
+    assert tracker.over_limit(keep=["c"]) == ["b"]
+    assert tracker.over_limit(keep=["b", "c"]) == []
+
+def test_evicts_until_under_the_memory_budget(clock):
+    tracker = tracker_with("a", "b", "c", max_sessions=None, memory_budget=250)
+    for client_id in ("a", "b", "c"):
+        tracker.set_size(client_id, 100)
+    assert tracker.total_bytes == 300
+    assert tracker.over_limit() == ["a"]
+    tracker.set_size("c", 200)
+    assert tracker.over_limit() == ["a", "b"]
+    tracker.discard("a")
+    assert tracker.total_bytes == 300 and len(tracker) == 2
+
+def test_idle_sessions_are_those_silent_past_the_timeout(clock):
+    tracker = tracker_with("a", "b", idle_timeout=60)
+    clock.now += 30
+    tracker.touch("c")
+    # Finishing a turn counts as activity
+    tracker.set_busy("b", False)
+    clock.now += 45
+    assert tracker.idle() == ["a"]
+    clock.now += 30
+    assert tracker.idle() == ["a", "c", "b"]
+    tracker.set_busy("a", True)
+    clock.now += 61
+    assert tracker.idle() == ["c", "b"]
+
+def test_idle_timeout_can_be_disabled(clock):
+    tracker = tracker_with("a", idle_timeout=None)
+    clock.now += 10 ** 6
+    assert tracker.idle() == []
+
+def test_history_keeps_the_last_turns():
+    history = ConversationHistory(max_turns=2, max_tokens=None)
+    for turn in range(4):
+        history.append({"role": "user", "content": f"question {turn}"})
+        history.append({"role": "assistant", "content": f"answer {turn}"})
+    assert [message["content"] for message in history] == ["answer 1", "question 2", "answer 2", "question 3", "answer 3"]
+    assert history.dropped == 3
+
+def test_history_keeps_the_latest_message_over_the_token_budget():
+    history = ConversationHistory(max_turns=None, max_tokens=5)
+    history.append({"role": "user", "content": "short"})
+    history.append({"role": "assistant", "content": "a much longer reply that alone is over the token budget"})
+    assert len(history) == 1 and history[0]["role"] == "assistant"
+    assert history.tokens == history.counter.count(history[0]["content"])
@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+from app.session_scope import ScopeCancelled, SessionScope
+
+async def hang(cancelled, started=None):
+    if started is not None:
+        started.append(True)
+    try:
+        await asyncio.Event().wait()
+    except asyncio.CancelledError:
+        cancelled.append(True)
+        raise
+
+def test_deadline_raises_timeout_and_keeps_the_scope():
+    async def run():
+        scope, cancelled = SessionScope(), []
+        with pytest.raises(asyncio.TimeoutError):
+            await scope.run(hang(cancelled), deadline=0.01)
+        assert cancelled == [True]
+        assert not scope.cancelled and not scope.tasks
+        assert await scope.run(asyncio.sleep(0, "next turn"), deadline=1) == "next turn"
+    asyncio.run(run())
+
+def test_cancel_stops_every_child():
+    async def run():
+        scope, cancelled, started = SessionScope(), [], []
+        runs = [asyncio.create_task(scope.run(hang(cancelled, started))) for _ in range(3)]
+        while len(started) < 3:
+            await asyncio.sleep(0)
+        assert len(scope.tasks) == 3
+        scope.cancel()
+        results = await asyncio.gather(*runs, return_exceptions=True)
+        assert all(isinstance(result, ScopeCancelled) for result in results)
+        assert cancelled == [True] * 3
+    asyncio.run(run())
+
+def test_no_children_are_left_after_cancel():
+    async def run():
+        scope, cancelled, started = SessionScope(), [], []
+        pending = asyncio.create_task(scope.run(hang(cancelled, started)))
+        while not started:
+            await asyncio.sleep(0)
+        children = set(scope.tasks)
+        scope.cancel()
+        with pytest.raises(ScopeCancelled):
+            await pending
+        assert not scope.tasks
+        assert all(child.done() for child in children)
+        # Work started after the scope is cancelled never runs
+        with pytest.raises(ScopeCancelled):
+            await scope.run(hang(cancelled, started))
+        assert not scope.tasks and started == [True]
+    asyncio.run(run())
+
+def test_cancelling_the_caller_cancels_the_child():
+    async def run():
+        scope, cancelled, started = SessionScope(), [], []
+        caller = asyncio.create_task(scope.run(hang(cancelled, started)))
+        while not started:
+            await asyncio.sleep(0)
+        caller.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await caller
+        await asyncio.sleep(0)
+        assert cancelled == [True] and not scope.tasks and not scope.cancelled
+    asyncio.run(run())
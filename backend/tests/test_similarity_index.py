@@ -0,0 +1,39 @@
+from app.similarity_index import QuestionSimilarityIndex
+
+def make_index(*questions):
+    index = QuestionSimilarityIndex()
+    for question in questions:
+        index.add(question)
+    return index
+
+def test_distinct_siblings_are_not_duplicates():
+    index = make_index("What is the relationship between knowledge and belief?", "Is knowledge justified true belief?")
+    assert index.find_similar("What is the relationship between knowledge and truth?") is None
+    assert index.find_similar("Is knowledge justified belief?") is None
+    assert index.find_similar("Can belief exist without knowledge?") is None
+
+def test_paraphrases_are_duplicates():
+    index = make_index("What is the nature of knowledge?", "Can we know anything for certain?", "What makes a belief justified?")
+    assert index.find_similar("What is knowledge's nature?")[0] == "What is the nature of knowledge?"
+    assert index.find_similar("Can we ever know anything for certain?")[0] == "Can we know anything for certain?"
+    assert index.find_similar("What makes beliefs justified?")[0] == "What makes a belief justified?"
+
+def test_layered_index_consults_base():
+    base = make_index("What is the nature of knowledge?")
+    index = QuestionSimilarityIndex(base=base)
+    index.add("Is knowledge justified true belief?")
+    assert len(index) == 2
+    assert index.find_similar("What is knowledge's nature?")[0] == "What is the nature of knowledge?"
+    assert index.find_similar("Is knowledge justified true belief?")[1] == 1.0
+
+def test_negations_are_not_duplicates():
+    index = make_index("Is justified true belief sufficient for knowledge?", "Can knowledge be justified?")
+    assert index.find_similar("Is justified true belief not sufficient for knowledge?") is None
+    assert index.find_similar("Isn't justified true belief sufficient for knowledge?") is None
+    assert index.find_similar("Can knowledge not be justified?") is None
+
+def test_question_words_are_not_duplicates():
+    index = make_index("Why do we value knowledge?", "Can we know anything for certain?")
+    assert index.find_similar("How do we value knowledge?") is None
+    assert index.find_similar("When do we value knowledge?") is None
+    assert index.find_similar("Should we know anything for certain?") is None
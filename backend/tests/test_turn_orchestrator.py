@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+from app.turn_orchestrator import BufferedStream, TurnOrchestrator
+
+async def deltas(*items, hang=False, fail=False):
+    for item in items:
+        await asyncio.sleep(0)
+        yield item
+    if fail:
+        raise ValueError("stream failed")
+    if hang:
+        await asyncio.Event().wait()
+
+async def collect(stream):
+    return [item async for item in stream]
+
+def test_buffered_stream_replays_items_to_late_readers():
+    async def run():
+        stream = BufferedStream(deltas("a", "b", "c"))
+        await asyncio.sleep(0.01)
+        return await collect(stream), await collect(stream)
+    assert asyncio.run(run()) == (["a", "b", "c"], ["a", "b", "c"])
+
+def test_buffered_stream_reraises_source_errors():
+    async def run():
+        stream = BufferedStream(deltas("a", fail=True))
+        await collect(stream)
+    with pytest.raises(ValueError):
+        asyncio.run(run())
+
+def test_cancelled_buffered_stream_is_a_cancelled_task():
+    async def run():
+        stream = BufferedStream(deltas("a", hang=True))
+        await asyncio.sleep(0.01)
+        stream.cancel()
+        await asyncio.gather(stream._task, return_exceptions=True)
+        assert stream._task.cancelled()
+        with pytest.raises(asyncio.CancelledError):
+            await collect(stream)
+    asyncio.run(run())
+
+def test_steps_run_after_their_dependencies():
+    order = []
+
+    async def step(name, value):
+        order.append(name)
+        return value
+
+    async def run():
+        turn = TurnOrchestrator()
+        turn.add_step("a", lambda results: step("a", 1))
+        turn.add_step("b", lambda results: step("b", results["a"] + 1), depends_on=["a"])
+        turn.add_step("c", lambda results: step("c", 0), when=lambda results: False)
+        return await turn.run()
+    results = asyncio.run(run())
+    assert results == {"a": 1, "b": 2, "c": None}
+    assert order == ["a", "b"]
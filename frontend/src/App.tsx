@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import MainLayout from './components/MainLayout';
 import LandingPage from './components/LandingPage';
 
@@ -10,8 +10,17 @@ interface Message {
 }
 
 interface WebSocketMessage {
-  type: 'message' | 'typing' | 'discussion_ended' | 'error' | 'graph_data';
+  type: 'session' | 'message' | 'message_delta' | 'message_done' | 'typing' | 'discussion_ended' | 'error' | 'graph_data' | 'graph_patch';
   message?: string;
+  resume_token?: string;
+  resumed?: boolean;
+  history?: Array<{
+    role: 'user' | 'assistant';
+    content: string;
+  }>;
+  version?: number;
+  from_version?: number;
+  delta?: string;
   typing?: boolean;
   data?: {
     nodes: Array<{
@@ -25,32 +34,125 @@ interface WebSocketMessage {
   };
 }
 
+// Survives page reloads within the tab, so a reconnect can resume the session
+const SESSION_KEYS = {
+  clientId: 'erotetic.clientId',
+  resumeToken: 'erotetic.resumeToken',
+  question: 'erotetic.question'
+};
+
+const RECONNECT_DELAY_MS = 1000;
+// Close codes for sessions the server reclaimed (evicted or idle); reconnect
+// when the user sends their next message instead of straight away
+const SESSION_RECLAIMED_CODES = [4000, 4001];
+
+const newMessageId = () => `msg-${Date.now()}-${Math.random().toString(36).substr(2, 9)}`;
+
 const App: React.FC = () => {
   const [hasInitialQuestion, setHasInitialQuestion] = useState(false);
   const [graphData, setGraphData] = useState<WebSocketMessage | null>(null);
   const [chatMessages, setChatMessages] = useState<Message[]>([]);
   const [isTyping, setIsTyping] = useState(false);
-  const [clientId] = useState(() => `client-${Math.random().toString(36).substr(2, 9)}`);
+  const [clientId] = useState(() => {
+    const saved = sessionStorage.getItem(SESSION_KEYS.clientId);
+    if (saved) return saved;
+    const id = `client-${Math.random().toString(36).substr(2, 9)}`;
+    sessionStorage.setItem(SESSION_KEYS.clientId, id);
+    return id;
+  });
   const [ws, setWs] = useState<WebSocket | null>(null);
+  // Bumped to open a new connection after the current one drops
+  const [connectionAttempt, setConnectionAttempt] = useState(0);
+  // Id of the bot message currently being streamed, if any
+  const streamingIdRef = useRef<string | null>(null);
+  // Graph version currently drawn; patches must continue from it
+  const graphVersionRef = useRef<number | null>(null);
+  // Set when the server reclaimed the session; the next message reconnects
+  const reclaimedRef = useRef(false);
+  // Message typed while reclaimed, sent once the session is resumed
+  const pendingMessageRef = useRef<string | null>(null);
 
   useEffect(() => {
     const websocket = new WebSocket(`ws://localhost:8000/ws/chat/${clientId}`);
+    let closedByCleanup = false;
+
+    websocket.onopen = () => {
+      const resumeToken = sessionStorage.getItem(SESSION_KEYS.resumeToken);
+      if (resumeToken) {
+        // The server falls back to a fresh session on the same question if the snapshot is gone
+        websocket.send(JSON.stringify({
+          type: 'init',
+          message: sessionStorage.getItem(SESSION_KEYS.question) ?? undefined,
+          resume_token: resumeToken,
+          stream: true
+        }));
+      }
+    };
     
     websocket.onmessage = (event) => {
       const data: WebSocketMessage = JSON.parse(event.data);
       console.log("Received WebSocket message:", data);
       
       switch (data.type) {
+        case 'session':
+          if (data.resume_token) {
+            sessionStorage.setItem(SESSION_KEYS.resumeToken, data.resume_token);
+          }
+          streamingIdRef.current = null;
+          if (data.resumed) {
+            // A resumed graph arrives as a full snapshot next; a fresh build
+            // has already streamed its graph_data and patches on this socket
+            graphVersionRef.current = null;
+          }
+          setChatMessages(data.resumed && data.history ? data.history.map(entry => ({
+            id: newMessageId(),
+            sender: entry.role === 'user' ? 'You' : 'Erotetic Philosophiser',
+            text: entry.content,
+            timestamp: new Date()
+          })) : []);
+          setIsTyping(false);
+          if (pendingMessageRef.current !== null) {
+            const pending = pendingMessageRef.current;
+            pendingMessageRef.current = null;
+            setChatMessages(prev => [...prev, {
+              id: newMessageId(),
+              sender: 'You',
+              text: pending,
+              timestamp: new Date()
+            }]);
+            websocket.send(JSON.stringify({ type: 'message', message: pending }));
+          }
+          break;
+
         case 'graph_data':
           console.log("Received graph data:", data);
+          graphVersionRef.current = data.version ?? null;
           setGraphData(data);
           setHasInitialQuestion(true);
           break;
 
+        case 'graph_patch':
+          if (data.data && graphVersionRef.current !== null && data.from_version === graphVersionRef.current) {
+            const patch = data.data;
+            graphVersionRef.current = data.version ?? null;
+            setGraphData(prev => prev && prev.data ? {
+              ...prev,
+              version: data.version,
+              data: {
+                nodes: [...prev.data.nodes, ...patch.nodes],
+                edges: [...prev.data.edges, ...patch.edges]
+              }
+            } : prev);
+          } else {
+            // Out of step with the server; ask for a full snapshot
+            websocket.send(JSON.stringify({ type: 'graph_sync' }));
+          }
+          break;
+
         case 'message':
           if (data.message) {
             setChatMessages(prev => [...prev, {
-              id: `msg-${Date.now()}-${Math.random().toString(36).substr(2, 9)}`,
+              id: newMessageId(),
               sender: 'Erotetic Philosophiser',
               text: data.message,
               timestamp: new Date()
@@ -58,6 +160,38 @@ const App: React.FC = () => {
           }
           break;
         
+        case 'message_delta':
+          if (data.delta) {
+            const delta = data.delta;
+            if (streamingIdRef.current === null) {
+              const id = newMessageId();
+              streamingIdRef.current = id;
+              setChatMessages(prev => [...prev, {
+                id,
+                sender: 'Erotetic Philosophiser',
+                text: delta,
+                timestamp: new Date()
+              }]);
+            } else {
+              const id = streamingIdRef.current;
+              setChatMessages(prev => prev.map(msg =>
+                msg.id === id ? { ...msg, text: msg.text + delta } : msg
+              ));
+            }
+          }
+          break;
+
+        case 'message_done':
+          if (streamingIdRef.current !== null && data.message !== undefined) {
+            const id = streamingIdRef.current;
+            const text = data.message;
+            setChatMessages(prev => prev.map(msg =>
+              msg.id === id ? { ...msg, text } : msg
+            ));
+          }
+          streamingIdRef.current = null;
+          break;
+        
         case 'typing':
           setIsTyping(data.typing || false);
           break;
@@ -68,6 +202,16 @@ const App: React.FC = () => {
         
         case 'error':
           console.error('WebSocket error:', data.message);
+          if (data.message) {
+            setChatMessages(prev => [...prev, {
+              id: newMessageId(),
+              sender: 'Erotetic Philosophiser',
+              text: data.message,
+              timestamp: new Date()
+            }]);
+          }
+          streamingIdRef.current = null;
+          setIsTyping(false);
           break;
       }
     };
@@ -76,24 +220,34 @@ const App: React.FC = () => {
       console.error('WebSocket error:', error);
     };
 
-    websocket.onclose = () => {
+    websocket.onclose = (event) => {
       console.log('WebSocket closed');
+      if (SESSION_RECLAIMED_CODES.includes(event.code)) {
+        reclaimedRef.current = true;
+        return;
+      }
+      if (!closedByCleanup && sessionStorage.getItem(SESSION_KEYS.resumeToken)) {
+        setTimeout(() => setConnectionAttempt(attempt => attempt + 1), RECONNECT_DELAY_MS);
+      }
     };
 
     setWs(websocket);
 
     return () => {
+      closedByCleanup = true;
       websocket.close();
     };
-  }, [clientId]);
+  }, [clientId, connectionAttempt]);
 
   const handleInitialQuestion = async (question: string) => {
     console.log("Received initial question:", question);
     
     if (ws && ws.readyState === WebSocket.OPEN) {
+      sessionStorage.setItem(SESSION_KEYS.question, question);
       ws.send(JSON.stringify({
         type: 'init',
-        message: question
+        message: question,
+        stream: true
       }));
     } else {
       console.error('WebSocket is not connected');
@@ -104,7 +258,7 @@ const App: React.FC = () => {
     if (ws && ws.readyState === WebSocket.OPEN) {
       // Add user message to chat with unique ID
       setChatMessages(prev => [...prev, {
-        id: `msg-${Date.now()}-${Math.random().toString(36).substr(2, 9)}`,
+        id: newMessageId(),
         sender: 'You',
         text: message,
         timestamp: new Date()
@@ -115,6 +269,17 @@ const App: React.FC = () => {
         type: 'message',
         message: message
       }));
+    } else if (reclaimedRef.current) {
+      // Resume the session first; the message goes out once it is back
+      reclaimedRef.current = false;
+      pendingMessageRef.current = message;
+      setChatMessages(prev => [...prev, {
+        id: newMessageId(),
+        sender: 'You',
+        text: message,
+        timestamp: new Date()
+      }]);
+      setConnectionAttempt(attempt => attempt + 1);
     } else {
       console.error('WebSocket is not connected');
     }